@@ -0,0 +1,69 @@
+"""
+Times synchronous AsyncEventBus posts as the number of registrants grows.
+    python benchmark/bench_eventbus.py [posts]
+Each registrant subscribes to its own event class, like the view models do, so a post reaches one handler however many
+registrants there are. The legacy column replays the old lookup that scanned every subscriber and called dir() on every
+registrant per post.
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(1, str(ROOT_DIR / "src"))
+
+REGISTRANT_COUNTS = (10, 50, 100, 500)
+
+
+def _make_registrant(bus, idx):
+    event = type("BenchEvent{}".format(idx), (), dict())
+
+    def handler(self, posted_event):
+        return idx
+
+    handler.__name__ = "handle_bench_event_{}".format(idx)
+    bus.subscribe(handler, event)
+    registrant = type("BenchRegistrant{}".format(idx), (), {handler.__name__: handler})()
+    bus.register(registrant)
+    return event
+
+
+def _legacy_post_and_get_first(bus, posted_event):
+    subscribed = {key: value for (key, value) in bus._subscribers.items() if value == posted_event.__class__}
+    for subscriber in subscribed:
+        registrants = filter(lambda r: subscriber.__name__ in dir(r), bus._registrants)
+        for registrant in registrants:
+            return subscriber(registrant, posted_event)
+    return None
+
+
+def _time_posts(post, posted_event, posts):
+    timings = list()
+    for _ in range(posts):
+        start_time = time.perf_counter()
+        post(posted_event)
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings) * 1e6
+
+
+def main(posts):
+    from gui.events.utils.eventbus import AsyncEventBus
+
+    bus = AsyncEventBus()
+    events = list()
+    print("{:>12} {:>14} {:>14}".format("registrants", "dispatch (us)", "legacy (us)"))
+    for count in REGISTRANT_COUNTS:
+        events += [_make_registrant(bus, idx) for idx in range(len(events), count)]
+        # The last registered event is the worst case for the legacy scan
+        posted_event = events[-1]()
+        assert bus.post_and_get_first(posted_event) == _legacy_post_and_get_first(bus, posted_event) == count - 1
+        print("{:>12} {:>14.2f} {:>14.2f}".format(
+            count,
+            _time_posts(bus.post_and_get_first, posted_event, posts),
+            _time_posts(lambda _: _legacy_post_and_get_first(bus, _), posted_event, max(1, posts // 100))))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,48 @@
+"""
+Times the startup cost of chart_cache_updater.update_cache_scores on the local data.
+Run from anywhere with the data directory populated:
+    python benchmark/bench_update_cache_scores.py [repeat]
+Charts already in live_detail_cache are not extracted again, so after the first run this measures the catalog build
+and the cache bookkeeping that every start pays.
+"""
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(1, str(ROOT_DIR / "src"))
+
+
+def _time(function, repeat):
+    timings = list()
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    return result, timings
+
+
+def _report(name, timings):
+    print("{:<24} min {:8.3f}s  median {:8.3f}s  max {:8.3f}s".format(
+        name, min(timings), statistics.median(timings), max(timings)))
+
+
+def main(repeat):
+    logging.basicConfig(level=logging.CRITICAL)
+    from network import chart_cache_updater
+
+    song_list, timings = _time(chart_cache_updater._get_song_list, repeat)
+    _report("_get_song_list", timings)
+    expanded_song_list, timings = _time(lambda: chart_cache_updater._expand_song_list(song_list), repeat)
+    _report("_expand_song_list", timings)
+    _, timings = _time(chart_cache_updater.update_cache_scores, repeat)
+    _report("update_cache_scores", timings)
+    print("{} songs, {} charts".format(len(song_list), len(expanded_song_list)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -3,7 +3,9 @@ from pathlib import Path
 
 ROOT_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 if __name__ == '__main__':
+    import multiprocessing
     import sys
+    multiprocessing.freeze_support()
     sys.path.insert(1, 'src')
     import main
     main.main()
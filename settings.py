@@ -7,6 +7,11 @@ UPDATE_DATE = datetime.date(2023, 10, 2)
 LOGGER_NAME = "chihiro"
 LOG_DIR = ROOT_DIR / "logs"
 MAX_WORKERS = 6  # Set this high and your PC dies
+MAX_DOWNLOAD_WORKERS = 8  # Concurrent asset downloads
+SIMULATION_WORKERS = 2  # Calculator rows simulated at once
+SIMULATION_PROCESSES = True  # Simulate calculator rows in worker processes instead of the GUI process
+DEBUG_DB_GUARD = False  # Raise on database queries while a simulation is running
+EVENTBUS_STATS_INTERVAL = 0  # Seconds between event bus stats log lines, 0 leaves the event bus uninstrumented
 
 DATA_PATH = ROOT_DIR / "data"
 BACKUP_PATH = DATA_PATH / "backup"
@@ -15,7 +20,11 @@ IMAGE_PATH = DATA_PATH / "img"
 IMAGE_PATH32 = DATA_PATH / "img32"
 IMAGE_PATH64 = DATA_PATH / "img64"
 ZIP_PATH = ROOT_DIR / "img.zip"
+ICON_MANIFEST_PATH = DATA_PATH / "icons.json"
+ATLAS_PATH = DATA_PATH / "atlas"
 MUSICSCORES_PATH = DATA_PATH / "musicscores"
+COMPILED_CHARTS_PATH = MUSICSCORES_PATH / "compiled"
+CHART_STORE_PATH = MUSICSCORES_PATH / "charts.bin"
 CACHEDB_PATH = DB_PATH / "chihiro.db"
 MANIFEST_PATH = DB_PATH / "manifest.db"
 MASTERDB_PATH = DB_PATH / "master.db"
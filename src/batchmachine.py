@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import numpy as np
+
+from logic.chart import CompiledChart
+from logic.live import BaseLive
+from logic.skill import Skill
+from static.color import Color
+from static.note_type import NoteType
+from static.song_difficulty import PERFECT_TAP_RANGE, Difficulty
+from utils.misc import get_trial_rng
+
+# Skill types whose effect on a note only depends on which activations were rolled.
+# Life dependent (sparkle, overload, spike), copying (encore, magic), cached (alternate, mutual, refrain) and
+# harmony skills need the full event loop and are left to StateMachine.
+BATCH_SKILL_TYPES = {0, 1, 2, 4, 5, 6, 7, 9, 12, 15, 17, 20, 21, 22, 23, 24, 26, 27, 28, 29, 30, 31,
+                     32, 33, 34, 35, 36, 37, 38, 43}
+
+# Upper bound of trials * notes evaluated at once, keeps every (trials x notes) array around 4MB
+CHUNK_SIZE = 500000
+
+
+class BatchSkill:
+    card_idx: int
+    unit_idx: int
+    skill: Skill
+    probability: float
+    skill_on: np.ndarray
+    skill_off: np.ndarray
+    roll_offset: int
+
+    def __init__(self, card_idx: int, unit_idx: int, skill: Skill, probability: float,
+                 skill_on: np.ndarray, skill_off: np.ndarray, roll_offset: int):
+        self.card_idx = card_idx
+        self.unit_idx = unit_idx
+        self.skill = skill
+        self.probability = probability
+        self.skill_on = skill_on
+        self.skill_off = skill_off
+        # Position of this skill's activation rolls in a trial's random stream, -1 if it never rolls
+        self.roll_offset = roll_offset
+
+
+class BatchMachine:
+    """
+    Runs all Monte Carlo trials of a perfect only simulation at once.
+    Activation rolls are drawn as a (trials x activations) matrix per skill and note bonuses are evaluated
+    with array operations instead of stepping through StateMachine for every trial.
+    """
+    grand: bool
+    difficulty: Difficulty
+    live: BaseLive
+    left_inclusive: bool
+    right_inclusive: bool
+    base_score: float
+    weights: np.ndarray
+
+    note_count: int
+    note_secs: np.ndarray
+    checkpoints: np.ndarray
+    is_flick: np.ndarray
+    is_long: np.ndarray
+    is_slide: np.ndarray
+
+    unit_offset: int
+    skills: List[BatchSkill]
+    roll_count: int
+
+    def __init__(self, grand, difficulty, live, chart: CompiledChart, left_inclusive, right_inclusive,
+                 base_score, weights):
+        self.grand = grand
+        self.difficulty = difficulty
+        self.live = live
+        self.left_inclusive = left_inclusive
+        self.right_inclusive = right_inclusive
+        self.base_score = base_score
+        self.weights = np.array(weights)
+
+        self.note_count = chart.note_count
+        self.note_secs = chart.sec
+        self.checkpoints = chart.checkpoints
+        self.is_flick = chart.is_flick
+        self.is_long = chart.is_long
+        self.is_slide = chart.is_slide
+
+        self.unit_offset = 3 if grand else 1
+        self.skills = list()
+        self.roll_count = 0
+        self._setup_skills(chart.song_duration)
+
+    def _setup_skills(self, song_duration: float):
+        for unit_idx, unit in enumerate(self.live.unit.all_units):
+            # Rolls are consumed in the same order as StateMachine.initialize_activation_arrays
+            # so that a batch trial and a StateMachine trial with the same stream agree
+            cards = list(enumerate(unit.all_cards()))
+            iterating_order = [_ for _ in cards if _[1].skill.is_magic] \
+                + [_ for _ in cards if _[1].skill.is_guard] \
+                + [_ for _ in cards if not (_[1].skill.is_magic or _[1].skill.is_guard or _[1].skill.is_alternate
+                                            or _[1].skill.is_mutual or _[1].skill.is_refrain)] \
+                + [_ for _ in cards if _[1].skill.is_alternate] \
+                + [_ for _ in cards if _[1].skill.is_mutual] \
+                + [_ for _ in cards if _[1].skill.is_refrain]
+            for card_idx, card in iterating_order:
+                skill = card.skill
+                if skill.interval == 0:
+                    continue
+                idx = unit_idx * 5 + card_idx
+                # Same activation windows as StateMachine.initialize_activation_arrays
+                total_activation = int((song_duration - 1e-8 - 3) // skill.interval)
+                skill_on = list()
+                skill_off = list()
+                for act_idx in range(skill.offset + 1, total_activation + 1, self.unit_offset):
+                    on = act_idx * skill.interval
+                    off = act_idx * skill.interval \
+                        + min(skill.interval, skill.duration) / 1.5 * (1 + (skill.skill_level - 1) / 18)
+                    skill_on.append(int(on * 1E6))
+                    skill_off.append(int(off * 1E6))
+                probability = self.live.get_probability(idx)
+                roll_offset = -1
+                if probability < 1:
+                    roll_offset = self.roll_count
+                    self.roll_count += len(skill_on)
+                self.skills.append(BatchSkill(idx, unit_idx, skill, probability,
+                                              np.array(skill_on, dtype=np.int64),
+                                              np.array(skill_off, dtype=np.int64), roll_offset))
+
+    def is_supported(self) -> bool:
+        return all(batch_skill.skill.skill_type in BATCH_SKILL_TYPES for batch_skill in self.skills)
+
+    def _can_activate(self, batch_skill: BatchSkill) -> bool:
+        # Only the static part of StateMachine._can_activate applies to supported skills
+        skill = batch_skill.skill
+        if batch_skill.probability == 0 or len(batch_skill.skill_on) == 0:
+            return False
+        cards = self.live.unit.all_units[batch_skill.unit_idx].all_cards(guest=True)
+        card_colors = [card.color for card in cards] + [card.subcolor for card in cards if card.subcolor]
+        if skill.is_focus:
+            focus_color = (Color.CUTE, Color.COOL, Color.PASSION)[skill.skill_type - 21]
+            if any(color is not focus_color for color in card_colors):
+                return False
+        if skill.is_tricolor:
+            if not all(color in card_colors for color in (Color.CUTE, Color.COOL, Color.PASSION)):
+                return False
+        if skill.song_required is not None and self.live.color != skill.song_required:
+            return False
+        return True
+
+    def simulate(self, times: int, seed: int, start: int = 0) -> np.ndarray:
+        """
+        Simulates trials start to start + times - 1 of the given seed.
+        """
+        chunk = max(1, CHUNK_SIZE // self.note_count)
+        scores = list()
+        for chunk_start in range(start, start + times, chunk):
+            scores.append(self._simulate_chunk(min(chunk, start + times - chunk_start), seed, chunk_start))
+        return np.concatenate(scores)
+
+    def _draw(self, times: int, seed: int, start: int) -> np.ndarray:
+        # Each row is one trial's stream: note timing jitter first, then the activation rolls
+        draws = np.empty((times, self.note_count + self.roll_count))
+        for row in range(times):
+            get_trial_rng(seed, start + row).random(out=draws[row])
+        return draws
+
+    def _simulate_chunk(self, times: int, seed: int, start: int) -> np.ndarray:
+        draws = self._draw(times, seed, start)
+        random_range = PERFECT_TAP_RANGE[self.difficulty] / 2E6
+        temp = self.note_secs + draws[:, :self.note_count] * 2 * random_range - random_range
+        temp = np.where(self.checkpoints, np.maximum(temp, self.note_secs), temp)
+        note_times = (temp * 1E6).astype(np.int64)
+
+        # Notes are evaluated in hit order, bonuses are stored by position like StateMachine.score_bonuses
+        order = np.argsort(note_times, axis=1, kind='stable')
+        note_times = np.take_along_axis(note_times, order, axis=1)
+        # StateMachine looks the note types up in its hit ordered list by the original index of the note hit,
+        # the same lookup keeps both engines on the same trials when jitter swaps close notes
+        type_order = np.take_along_axis(order, order, axis=1)
+        special_masks = {
+            NoteType.FLICK: self.is_flick[type_order],
+            NoteType.LONG: self.is_long[type_order],
+            NoteType.SLIDE: self.is_slide[type_order],
+        }
+
+        actives = list()
+        for batch_skill in self.skills:
+            if not self._can_activate(batch_skill):
+                continue
+            actives.append((batch_skill, self._get_active_mask(batch_skill, note_times, draws)))
+
+        max_boosts, sum_boosts = self._evaluate_boosts(actives, note_times.shape)
+
+        unit_count = len(self.live.unit.all_units)
+        unit_score_bonuses = [np.full(note_times.shape, np.nan) for _ in range(unit_count)]
+        unit_combo_bonuses = [np.full(note_times.shape, np.nan) for _ in range(unit_count)]
+        for batch_skill, active in actives:
+            skill = batch_skill.skill
+            if skill.boost:
+                continue
+            v0, v2 = self._get_skill_values(batch_skill, special_masks)
+            resonance = self.live.unit.all_units[batch_skill.unit_idx].resonance
+            boost_dict = sum_boosts if resonance else max_boosts
+            color = int(self.live.unit.get_card(batch_skill.card_idx).color.value)
+            for value, attr, unit_bonuses in ((v0, 0, unit_score_bonuses), (v2, 2, unit_combo_bonuses)):
+                if np.all(value == 0):
+                    continue
+                boosted = np.where(value > 0, np.ceil(value * boost_dict[color][attr]), value)
+                boosted = np.where(active & (value != 0), boosted, np.nan)
+                unit_bonuses[batch_skill.unit_idx] = self._aggregate(unit_bonuses[batch_skill.unit_idx],
+                                                                     boosted, resonance)
+
+        score_bonuses = np.nan_to_num(np.fmax.reduce(unit_score_bonuses), nan=0)
+        combo_bonuses = np.nan_to_num(np.fmax.reduce(unit_combo_bonuses), nan=0)
+
+        final_bonus = 1 + score_bonuses / 100
+        final_bonus[:, 1:] *= 1 + combo_bonuses[:, 1:] / 100
+
+        # Combo of a note is its position in hit order
+        weights = self.weights[np.argsort(order, axis=1)]
+        note_scores = np.round(self.base_score * weights * final_bonus)
+        return note_scores.sum(axis=1).astype(np.int64)
+
+    def _get_active_mask(self, batch_skill: BatchSkill, note_times: np.ndarray, draws: np.ndarray) -> np.ndarray:
+        skill_on = batch_skill.skill_on
+        skill_off = batch_skill.skill_off
+        if batch_skill.roll_offset >= 0:
+            roll_start = self.note_count + batch_skill.roll_offset
+            rolls = draws[:, roll_start:roll_start + len(skill_on)] <= batch_skill.probability
+        else:
+            rolls = np.ones((len(draws), len(skill_on)), dtype=bool)
+
+        side = 'right' if self.left_inclusive else 'left'
+        candidates = np.searchsorted(skill_on, note_times, side=side) - 1
+        active = np.zeros(note_times.shape, dtype=bool)
+        # A note exactly on the boundary of two consecutive windows can belong to the previous one
+        for candidate in (candidates, candidates - 1):
+            valid = candidate >= 0
+            candidate = np.where(valid, candidate, 0)
+            off = skill_off[candidate]
+            inside = note_times < off
+            if self.right_inclusive:
+                inside |= note_times == off
+            active |= valid & inside & np.take_along_axis(rolls, candidate, axis=1)
+        return active
+
+    def _evaluate_boosts(self, actives: List[Tuple[BatchSkill, np.ndarray]], shape: Tuple[int, int]):
+        max_boosts = [[np.full(shape, 1000) for _ in range(3)] for _ in range(3)]
+        sum_boosts = [[np.full(shape, 1000) for _ in range(3)] for _ in range(3)]
+        for batch_skill, active in actives:
+            skill = batch_skill.skill
+            if not skill.boost:
+                continue
+            for target in skill.targets:
+                for attr in (0, 2):
+                    value = skill.values[attr]
+                    if value == 0 or value == 1000:
+                        continue
+                    max_boosts[target][attr] = np.maximum(max_boosts[target][attr], np.where(active, value, 1000))
+                    sum_boosts[target][attr] = sum_boosts[target][attr] + np.where(active, value - 1000, 0)
+        for target in range(3):
+            for attr in (0, 2):
+                max_boosts[target][attr] = max_boosts[target][attr] / 1000
+                sum_boosts[target][attr] = sum_boosts[target][attr] / 1000
+        return max_boosts, sum_boosts
+
+    def _get_skill_values(self, batch_skill: BatchSkill, special_masks) -> Tuple[np.ndarray, np.ndarray]:
+        skill = batch_skill.skill
+        if skill.act is not None:
+            v0 = np.where(special_masks[skill.act], skill.values[1], skill.values[0])
+        elif skill.is_motif:
+            v0 = np.array(self.live.unit.all_units[batch_skill.unit_idx].convert_motif(skill.skill_type, self.grand))
+        else:
+            v0 = np.array(skill.values[0])
+        v2 = np.array(skill.values[2])
+        v0 = np.where(v0 > 0, v0 - 100, v0)
+        v2 = np.where(v2 > 0, v2 - 100, v2)
+        return v0, v2
+
+    @staticmethod
+    def _aggregate(current: np.ndarray, value: np.ndarray, resonance: bool) -> np.ndarray:
+        # NaN stands for no bonus, which is different from a bonus of 0
+        if not resonance:
+            return np.fmax(current, value)
+        return np.where(np.isnan(current), value, current + np.nan_to_num(value, nan=0))
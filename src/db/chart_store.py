@@ -0,0 +1,222 @@
+"""
+All charts in one memory-mapped columnar file: magic | header length | JSON header | columns | index.
+Each index row points to a slice of every column and has a bitmask of the columns the chart CSV had.
+"""
+import io
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Optional, Union, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import customlogger as logger
+from db import db
+from settings import MUSICSCORES_PATH, CHART_STORE_PATH
+from static.song_difficulty import Difficulty
+from utils import storage
+
+CHART_STORE_MAGIC = b"CHRTSTOR"
+CHART_STORE_VERSION = 1
+_ALIGNMENT = 64
+_INDEX_DTYPE = np.dtype([("score_id", "<i4"), ("difficulty", "<i4"), ("start", "<i8"), ("count", "<i8"),
+                         ("columns", "<u8")])
+_BLOB_NAME = re.compile(r"musicscores/m\d+/(\d+)_(\d+)\.csv")
+# Every column a chart CSV may have in file order, visible is float because only some notes of a chart set it
+CHART_COLUMNS = {
+    "id": np.dtype("<i8"),
+    "sec": np.dtype("<f8"),
+    "type": np.dtype("<i8"),
+    "startPos": np.dtype("<i8"),
+    "finishPos": np.dtype("<i8"),
+    "status": np.dtype("<i8"),
+    "sync": np.dtype("<i8"),
+    "groupId": np.dtype("<i8"),
+    "visible": np.dtype("<f8"),
+}
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class ChartStore:
+    path: Path
+    columns: Dict[str, np.ndarray]
+    index: Dict[Tuple[int, int], Tuple[int, int, int]]
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._buffer[:8]) != CHART_STORE_MAGIC:
+            raise ValueError("{} is not a chart store".format(path))
+        header_length = int(self._buffer[8:16].view("<u8")[0])
+        header = json.loads(bytes(self._buffer[16:16 + header_length]).decode())
+        if header["version"] != CHART_STORE_VERSION:
+            raise ValueError("Chart store version {} is not supported".format(header["version"]))
+        data_start = _align(16 + header_length)
+
+        def get_view(offset: int, dtype: np.dtype, count: int) -> np.ndarray:
+            start = data_start + offset
+            return self._buffer[start:start + count * dtype.itemsize].view(dtype)
+
+        rows = header["rows"]
+        self.columns = dict()
+        for name, dtype, offset in header["columns"]:
+            self.columns[name] = get_view(offset, np.dtype(dtype), rows)
+        index = get_view(header["index_offset"], _INDEX_DTYPE, header["charts"])
+        self.index = {
+            (score_id, difficulty): (start, count, columns)
+            for score_id, difficulty, start, count, columns in index.tolist()
+        }
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        return key in self.index
+
+    def load_chart(self, score_id: int, difficulty: Union[int, Difficulty]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Get the raw CSV columns of a chart as read-only views into the store, None if the chart is not stored.
+        """
+        if isinstance(difficulty, Difficulty):
+            difficulty = difficulty.value
+        key = (score_id, difficulty)
+        if key not in self.index:
+            return None
+        start, count, column_mask = self.index[key]
+        return {
+            name: column[start:start + count]
+            for bit, (name, column) in enumerate(self.columns.items())
+            if column_mask >> bit & 1
+        }
+
+    def close(self):
+        self.columns = dict()
+        self.index = dict()
+        self._buffer = None
+
+
+def _to_chart_columns(notes_data: pd.DataFrame, name: str) -> pd.DataFrame:
+    for column, dtype in notes_data.dtypes.items():
+        if column not in CHART_COLUMNS:
+            raise ValueError("Unexpected column {} in chart {}".format(column, name))
+        if np.issubdtype(CHART_COLUMNS[column], np.integer):
+            valid = pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)
+        else:
+            valid = pd.api.types.is_numeric_dtype(dtype)
+        if not valid:
+            raise ValueError("Unexpected type {} of column {} in chart {}".format(dtype, column, name))
+    return notes_data.astype({column: CHART_COLUMNS[column] for column in notes_data.columns})
+
+
+def _read_musicscore_charts(score_path: Path) -> List[Tuple[int, int, pd.DataFrame]]:
+    charts = list()
+    with db.CustomDB(score_path) as score_conn:
+        blobs = score_conn.execute_and_fetchall("""
+            SELECT * FROM blobs WHERE name LIKE "musicscores/m%.csv"
+        """)
+    for blob in blobs:
+        match = _BLOB_NAME.fullmatch(blob[0])
+        if match is None:
+            continue
+        notes_data = pd.read_csv(io.StringIO(blob[1].decode()))
+        charts.append((int(match.group(1)), int(match.group(2)), _to_chart_columns(notes_data, blob[0])))
+    return charts
+
+
+def build_chart_store(path: Path = CHART_STORE_PATH, musicscores_path: Path = MUSICSCORES_PATH):
+    logger.debug("Building chart store from {}".format(musicscores_path))
+    charts = list()
+    for score_path in sorted(musicscores_path.glob("musicscores_m*.db")):
+        charts.extend(_read_musicscore_charts(score_path))
+
+    present = set()
+    for _, _, notes_data in charts:
+        present.update(notes_data.columns)
+    column_names = [name for name in CHART_COLUMNS if name in present]
+    rows = sum(len(notes_data) for _, _, notes_data in charts)
+    columns = {
+        name: np.zeros(rows, dtype=CHART_COLUMNS[name]) if np.issubdtype(CHART_COLUMNS[name], np.integer)
+        else np.full(rows, np.nan, dtype=CHART_COLUMNS[name])
+        for name in column_names
+    }
+
+    index = np.zeros(len(charts), dtype=_INDEX_DTYPE)
+    start = 0
+    for chart_idx, (score_id, difficulty, notes_data) in enumerate(charts):
+        count = len(notes_data)
+        column_mask = 0
+        for name in notes_data.columns:
+            columns[name][start:start + count] = notes_data[name].to_numpy()
+            column_mask |= 1 << column_names.index(name)
+        index[chart_idx] = (score_id, difficulty, start, count, column_mask)
+        start += count
+
+    offset = 0
+    column_headers = list()
+    for name in column_names:
+        column_headers.append((name, columns[name].dtype.str, offset))
+        offset = _align(offset + columns[name].nbytes)
+    header = json.dumps({
+        "version": CHART_STORE_VERSION,
+        "rows": rows,
+        "charts": len(charts),
+        "columns": column_headers,
+        "index_offset": offset,
+    }).encode()
+    data_start = _align(16 + len(header))
+
+    # Write next to the old store first, the old one may still be mapped by this process
+    temp_path = path.parent / "{}.{}.tmp".format(path.name, os.getpid())
+    with storage.get_writer(temp_path, 'wb') as fwb:
+        fwb.write(CHART_STORE_MAGIC)
+        fwb.write(np.uint64(len(header)).tobytes())
+        fwb.write(header)
+        for (name, _, column_offset) in column_headers:
+            fwb.seek(data_start + column_offset)
+            fwb.write(columns[name].tobytes())
+        fwb.seek(data_start + offset)
+        fwb.write(index.tobytes())
+    close_chart_store()
+    os.replace(temp_path, path)
+    logger.info("Chart store built with {} charts".format(len(charts)))
+
+
+_store: Optional[ChartStore] = None
+_store_lock = threading.Lock()
+
+
+def get_chart_store() -> Optional[ChartStore]:
+    global _store
+    with _store_lock:
+        if _store is None and CHART_STORE_PATH.exists():
+            try:
+                _store = ChartStore(CHART_STORE_PATH)
+            except (OSError, ValueError, KeyError) as e:
+                logger.debug("Failed to open chart store: {}".format(e))
+        return _store
+
+
+def close_chart_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
+
+
+def load_chart(score_id: int, difficulty: Union[int, Difficulty]) -> Optional[Dict[str, np.ndarray]]:
+    store = get_chart_store()
+    if store is None:
+        return None
+    return store.load_chart(score_id, difficulty)
+
+
+def load_chart_dataframe(score_id: int, difficulty: Union[int, Difficulty]) -> Optional[pd.DataFrame]:
+    # Copy out of the mapping so the store can be rebuilt while charts are in use
+    columns = load_chart(score_id, difficulty)
+    if columns is None:
+        return None
+    return pd.DataFrame(columns, copy=True)
@@ -1,71 +1,197 @@
+import itertools
 import sqlite3
 import threading
+import weakref
 from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
 
+from exceptions import QueryInSimulation
 from network import meta_updater
 
-mutex = threading.Lock()
+_query_guard = threading.local()
+
+MMAP_SIZE = 256 * 1024 * 1024
+BUSY_TIMEOUT = 30
+
+
+@contextmanager
+def forbid_queries():
+    """
+    Any query on this thread raises QueryInSimulation until the block exits.
+    """
+    depth = getattr(_query_guard, "depth", 0)
+    _query_guard.depth = depth + 1
+    try:
+        yield
+    finally:
+        _query_guard.depth = depth
+
+
+class _ThreadConnection:
+    """
+    Only referenced from the thread local storage, so it is collected when the owning thread's storage is,
+    including threads Python did not start.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
 
 
 class CustomDB(object):
-    def __init__(self, path):
-        self._db_connection = sqlite3.connect(path, check_same_thread=False)
-        self._db_cur = self._db_connection.cursor()
+    """
+    Every thread gets its own connection so readers never wait on each other, SQLite serializes the writes.
+    A read only database is opened immutable and memory mapped, and reopened if the file is replaced.
+    A connection is closed once its thread has ended.
+    """
+
+    def __init__(self, path, read_only: bool = False, wal: bool = False):
+        self.path = Path(path)
+        self.read_only = read_only
+        self.wal = wal
+        self._local = threading.local()
+        self._connections = dict()
+        self._connections_lock = threading.Lock()
+        self._keys = itertools.count()
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
-        self._db_connection.rollback()
-        self._db_cur.close()
-        self._db_connection.close()
+        self.close()
+
+    def _get_signature(self):
+        stat = self.path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            uri = "{}?mode=ro&immutable=1".format(self.path.resolve().as_uri())
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            connection.execute("PRAGMA mmap_size = {}".format(MMAP_SIZE))
+        else:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            if self.wal:
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def _forget_connection(self, key: int):
+        # Runs when the owning thread's storage is collected
+        with self._connections_lock:
+            connection = self._connections.pop(key, None)
+        if connection is not None:
+            connection.close()
+
+    def _get_thread_connection(self) -> _ThreadConnection:
+        local = self._local
+        # Immutable connections would keep reading the old pages after the file is rewritten
+        if self.read_only and getattr(local, "thread_connection", None) is not None \
+                and local.signature != self._get_signature():
+            self._close_thread_connection()
+        if getattr(local, "thread_connection", None) is None:
+            local.signature = self._get_signature() if self.read_only else None
+            connection = self._connect()
+            key = next(self._keys)
+            with self._connections_lock:
+                self._connections[key] = connection
+            local.thread_connection = _ThreadConnection(connection)
+            local.finalizer = weakref.finalize(local.thread_connection, self._forget_connection, key)
+        return local.thread_connection
+
+    def _get_cursor(self) -> sqlite3.Cursor:
+        return self._get_thread_connection().cursor
+
+    def _close_thread_connection(self):
+        local = self._local
+        local.thread_connection.cursor.close()
+        local.thread_connection = None
+        local.finalizer()
 
     def execute_and_fetchone(self, query: str, params: list = None, out_dict: bool = False):
-        self.execute(query, params, let_me_unlock=True)
-        result = self._db_cur.fetchone()
+        cursor = self.execute(query, params)
+        result = cursor.fetchone()
         if out_dict:
-            description = self._db_cur.description
+            description = cursor.description
             if result is None:
                 res = None
             else:
                 res = OrderedDict({key[0]: value for key, value in zip(description, result)})
         else:
             res = result
-        mutex.release()
         return res
 
     def execute_and_fetchall(self, query: str, params: list = None, out_dict: bool = False):
-        self.execute(query, params, let_me_unlock=True)
-        result = self._db_cur.fetchall()
+        cursor = self.execute(query, params)
+        result = cursor.fetchall()
         if out_dict:
-            description = self._db_cur.description
+            description = cursor.description
             res = [OrderedDict({key[0]: value for key, value in zip(description, _)}) for _ in result]
         else:
             res = result
-        mutex.release()
         return res
 
-    def execute(self, query: str, params: list = None, let_me_unlock: bool = False):
-        mutex.acquire()
+    def execute(self, query: str, params: list = None) -> sqlite3.Cursor:
+        if getattr(_query_guard, "depth", 0):
+            raise QueryInSimulation("Query during simulation: {}".format(query.strip()))
+        cursor = self._get_cursor()
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        return cursor
+
+    def executemany(self, query: str, params_list) -> sqlite3.Cursor:
+        if getattr(_query_guard, "depth", 0):
+            raise QueryInSimulation("Query during simulation: {}".format(query.strip()))
+        cursor = self._get_cursor()
+        cursor.executemany(query, params_list)
+        return cursor
+
+    @contextmanager
+    def transaction(self):
+        """
+        Everything executed on this thread inside the block is committed once at the end, or rolled back on error.
+        commit() does nothing inside the block, so helpers that commit can be grouped into one transaction.
+        """
+        connection = self.get_connection()
+        depth = getattr(self._local, "transaction_depth", 0)
+        if depth == 0 and not connection.in_transaction:
+            # sqlite3 only opens a transaction before DML, DDL would autocommit without this
+            connection.execute("BEGIN")
+        self._local.transaction_depth = depth + 1
         try:
-            if params is None:
-                self._db_cur.execute(query)
-            else:
-                self._db_cur.execute(query, params)
-        except sqlite3.OperationalError as e:
-            mutex.release()
-            raise e
-        if not let_me_unlock:
-            mutex.release()
+            yield self
+        except BaseException:
+            self._local.transaction_depth = depth
+            if depth == 0:
+                connection.rollback()
+            raise
+        self._local.transaction_depth = depth
+        if depth == 0:
+            connection.commit()
 
     def commit(self):
-        mutex.acquire()
-        self._db_connection.commit()
-        mutex.release()
+        """
+        Commits what this thread executed, other threads commit their own connections.
+        """
+        if getattr(self._local, "transaction_depth", 0):
+            return
+        self.get_connection().commit()
+
+    def get_connection(self) -> sqlite3.Connection:
+        return self._get_thread_connection().connection
 
-    def get_connection(self):
-        return self._db_connection
+    def close(self):
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.rollback()
+            connection.close()
+        self._local = threading.local()
 
 
-masterdb = CustomDB(meta_updater.get_masterdb_path())
-cachedb = CustomDB(meta_updater.get_cachedb_path())
+masterdb = CustomDB(meta_updater.get_masterdb_path(), read_only=True)
+cachedb = CustomDB(meta_updater.get_cachedb_path(), wal=True)
@@ -0,0 +1,144 @@
+"""
+master.db tables used to build cards, skills, leaders and units, read once into memory.
+The snapshot is reloaded when master.db is replaced, its version increases with every reload.
+"""
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+import customlogger as logger
+from db import db
+from settings import MASTERDB_PATH
+
+POTENTIAL_KEYS = ("vo", "vi", "da", "li", "sk")
+
+
+class MasterSnapshot:
+    version: int
+    signature: Tuple[int, int]
+
+    card_data: Dict[int, Dict[str, Any]]
+    card_subattributes: Dict[int, int]
+    skill_data: Dict[int, Dict[str, Any]]
+    skill_triggers: Dict[int, Tuple[int, int]]
+    probability_max: Dict[int, int]
+    available_time_max: Dict[int, int]
+    boost_values: Dict[Tuple[int, int], Tuple[int, int, int]]
+    leader_skill_data: Dict[int, Dict[str, Any]]
+    # Potential level x rarity, only odd rarities have values
+    potential_values: Dict[str, np.ndarray]
+    motif_values: List[int]
+    motif_values_grand: List[int]
+    harmony_values: Dict[Tuple[int, int], Tuple[int, int]]
+
+    def __init__(self, version: int, signature: Tuple[int, int]):
+        self.version = version
+        self.signature = signature
+
+        cards = db.masterdb.execute_and_fetchall("SELECT * FROM card_data", out_dict=True)
+        self.card_data = {card['id']: card for card in cards}
+        self.card_subattributes = dict(db.masterdb.execute_and_fetchall(
+            "SELECT card_data_id, sub_attribute FROM card_subtype"))
+
+        self.probability_max = dict(db.masterdb.execute_and_fetchall(
+            "SELECT probability_type, probability_max FROM probability_type"))
+        self.available_time_max = dict(db.masterdb.execute_and_fetchall(
+            "SELECT available_time_type, available_time_max FROM available_time_type"))
+        # Skills take the attribute of the first card that has them
+        skill_attributes = dict()
+        for card in cards:
+            skill_attributes.setdefault(card['skill_id'], card['attribute'])
+        self.skill_data = dict()
+        self.skill_triggers = dict()
+        for skill in db.masterdb.execute_and_fetchall("SELECT * FROM skill_data", out_dict=True):
+            self.skill_triggers.setdefault(skill['skill_type'],
+                                           (skill['skill_trigger_type'], skill['skill_trigger_value']))
+            if skill['id'] not in skill_attributes:
+                continue
+            skill['attribute'] = skill_attributes[skill['id']]
+            skill['probability_max'] = self.probability_max[skill['probability_type']]
+            skill['available_time_max'] = self.available_time_max[skill['available_time_type']]
+            self.skill_data[skill['id']] = skill
+        self.boost_values = {
+            (skill_value, target_type): (value_1, value_2, value_3)
+            for skill_value, target_type, value_1, value_2, value_3 in db.masterdb.execute_and_fetchall("""
+                SELECT skill_value, target_type, boost_value_1, boost_value_2, boost_value_3 FROM skill_boost_type
+            """)
+        }
+
+        self.leader_skill_data = {
+            leader['id']: leader
+            for leader in db.masterdb.execute_and_fetchall("SELECT * FROM leader_skill_data", out_dict=True)
+        }
+
+        self.potential_values = dict()
+        for key in POTENTIAL_KEYS:
+            rows = db.masterdb.execute_and_fetchall("SELECT * FROM potential_value_{}".format(key), out_dict=True)
+            values = np.zeros((max(row['potential_level'] for row in rows) + 1, 9), dtype=int)
+            for row in rows:
+                for rarity in range(1, 9, 2):
+                    values[row['potential_level'], rarity] = row['value_rare_{}'.format(rarity)]
+            values.setflags(write=False)
+            self.potential_values[key] = values
+
+        self.motif_values = [
+            _[0] for _ in db.masterdb.execute_and_fetchall("SELECT type_01_value FROM skill_motif_value")]
+        self.motif_values_grand = [
+            _[0] for _ in db.masterdb.execute_and_fetchall("SELECT type_01_value FROM skill_motif_value_grand")]
+        self.harmony_values = {
+            (member_count, match_count): (score_value, combo_value)
+            for member_count, match_count, score_value, combo_value in db.masterdb.execute_and_fetchall("""
+                SELECT all_member_count_with_guest, attribute_match_count,
+                    first_efficacy_value_main_attribute, second_efficacy_value_main_attribute
+                FROM skill_dual_type_balance
+            """)
+        }
+
+    def get_potential_value(self, key: str, rarity: int, potential_level: int) -> int:
+        if potential_level == 0:
+            return 0
+        # Rarities come in pairs sharing the values of the odd one, e.g. SSR and SSR+
+        return int(self.potential_values[key][potential_level, (rarity - 1) // 2 * 2 + 1])
+
+
+_snapshot: Optional[MasterSnapshot] = None
+_snapshot_lock = threading.Lock()
+_digest: Optional[Tuple[Tuple[int, int], str]] = None
+
+
+def _get_signature() -> Tuple[int, int]:
+    stat = MASTERDB_PATH.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def get_master_snapshot() -> MasterSnapshot:
+    global _snapshot
+    signature = _get_signature()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.signature == signature:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.signature != signature:
+            version = 1 if _snapshot is None else _snapshot.version + 1
+            logger.debug("Loading master data snapshot version {}".format(version))
+            _snapshot = MasterSnapshot(version, signature)
+        return _snapshot
+
+
+def get_masterdb_digest() -> str:
+    """
+    sha256 of master.db, only recomputed when its size or mtime changes.
+    """
+    global _digest
+    signature = _get_signature()
+    digest = _digest
+    if digest is not None and digest[0] == signature:
+        return digest[1]
+    sha256 = hashlib.sha256()
+    with open(MASTERDB_PATH, 'rb') as fr:
+        for chunk in iter(lambda: fr.read(1 << 20), b""):
+            sha256.update(chunk)
+    _digest = (signature, sha256.hexdigest())
+    return _digest[1]
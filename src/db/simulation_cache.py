@@ -0,0 +1,173 @@
+"""
+Content-addressed cache of simulation results in chihiro.db.
+Entries are keyed by the sha256 of everything that decides a result, evicted least recently used first
+and dropped together when master.db changes.
+"""
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+import customlogger as logger
+from db import db
+from db.master_snapshot import get_masterdb_digest
+
+# Bump when the simulator or the stored summary changes so older entries are dropped
+SIMULATION_CACHE_VERSION = 1
+MAX_ENTRIES = 2000
+MAX_BYTES = 64 * 1024 * 1024
+
+_SUMMARY_FIELDS = ("base", "delta_values", "delta_counts", "perfect_score_array",
+                   "abuse_score", "abuse_score_delta", "abuse_window_l", "abuse_window_r", "abuse_judgements")
+
+
+class SimulationSummary:
+    """
+    What a simulation result needs besides the perfect play, which is cheap to rerun.
+    Deltas are kept as a histogram so trial order is lost, statistics over them are not.
+    """
+    base: int
+    delta_values: np.ndarray
+    delta_counts: np.ndarray
+    perfect_score_array: np.ndarray
+    abuse_score: int
+    abuse_score_delta: np.ndarray
+    abuse_window_l: np.ndarray
+    abuse_window_r: np.ndarray
+    abuse_judgements: np.ndarray
+
+    def __init__(self, base: int, delta_values: np.ndarray, delta_counts: np.ndarray,
+                 perfect_score_array: np.ndarray, abuse_score: int, abuse_score_delta: np.ndarray,
+                 abuse_window_l: np.ndarray, abuse_window_r: np.ndarray, abuse_judgements: np.ndarray):
+        self.base = int(base)
+        self.delta_values = np.asarray(delta_values)
+        self.delta_counts = np.asarray(delta_counts, dtype=np.int64)
+        self.perfect_score_array = np.asarray(perfect_score_array, dtype=np.int64)
+        self.abuse_score = int(abuse_score)
+        self.abuse_score_delta = np.asarray(abuse_score_delta, dtype=np.int64)
+        self.abuse_window_l = np.asarray(abuse_window_l, dtype=np.int64)
+        self.abuse_window_r = np.asarray(abuse_window_r, dtype=np.int64)
+        self.abuse_judgements = np.asarray(abuse_judgements, dtype=np.int64)
+
+    @classmethod
+    def from_deltas(cls, base: int, deltas: np.ndarray, **kwargs) -> 'SimulationSummary':
+        delta_values, delta_counts = np.unique(deltas, return_counts=True)
+        return cls(base, delta_values, delta_counts, **kwargs)
+
+    @property
+    def deltas(self) -> np.ndarray:
+        return np.repeat(self.delta_values, self.delta_counts)
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **{field: getattr(self, field) for field in _SUMMARY_FIELDS})
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SimulationSummary':
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls(*(arrays[field] for field in _SUMMARY_FIELDS))
+
+
+def _to_json(value: Any):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if hasattr(value, "value"):
+        return value.value
+    raise TypeError("{} is not hashable into a simulation key".format(type(value)))
+
+
+def get_simulation_key(parts: Dict[str, Any]) -> str:
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=_to_json)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+_initialized_hash: Optional[str] = None
+_lock = threading.Lock()
+
+
+def get_master_hash() -> str:
+    return "{}:{}".format(SIMULATION_CACHE_VERSION, get_masterdb_digest())
+
+
+def _initialize():
+    global _initialized_hash
+    master_hash = get_master_hash()
+    if _initialized_hash == master_hash:
+        return
+    db.cachedb.execute("""
+        CREATE TABLE IF NOT EXISTS simulation_cache (
+            key TEXT PRIMARY KEY,
+            last_used REAL NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    db.cachedb.execute("""
+        CREATE TABLE IF NOT EXISTS simulation_cache_meta (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+    stored_hash = db.cachedb.execute_and_fetchone("SELECT value FROM simulation_cache_meta WHERE name = 'master'")
+    if stored_hash is None or stored_hash[0] != master_hash:
+        logger.debug("master.db changed, clearing simulation cache")
+        db.cachedb.execute("DELETE FROM simulation_cache")
+        db.cachedb.execute("INSERT OR REPLACE INTO simulation_cache_meta (name, value) VALUES ('master', ?)",
+                           [master_hash])
+    db.cachedb.commit()
+    _initialized_hash = master_hash
+
+
+def get_summary(key: str) -> Optional[SimulationSummary]:
+    with _lock:
+        try:
+            _initialize()
+            data = db.cachedb.execute_and_fetchone("SELECT data FROM simulation_cache WHERE key = ?", [key])
+            if data is None:
+                return None
+            db.cachedb.execute("UPDATE simulation_cache SET last_used = ? WHERE key = ?", [time.time(), key])
+            db.cachedb.commit()
+            return SimulationSummary.from_bytes(data[0])
+        except (OSError, sqlite3.Error, ValueError, KeyError) as e:
+            logger.debug("Failed to read simulation cache: {}".format(e))
+            return None
+
+
+def put_summary(key: str, summary: SimulationSummary):
+    data = summary.to_bytes()
+    with _lock:
+        try:
+            _initialize()
+            db.cachedb.execute("""
+                INSERT OR REPLACE INTO simulation_cache (key, last_used, size, data) VALUES (?, ?, ?, ?)
+            """, [key, time.time(), len(data), data])
+            _evict()
+            db.cachedb.commit()
+        except (OSError, sqlite3.Error) as e:
+            logger.debug("Failed to write simulation cache: {}".format(e))
+
+
+def _evict():
+    entries = db.cachedb.execute_and_fetchall("SELECT key, size FROM simulation_cache ORDER BY last_used DESC")
+    total_size = 0
+    for idx, (key, size) in enumerate(entries):
+        total_size += size
+        if idx >= MAX_ENTRIES or total_size > MAX_BYTES:
+            db.cachedb.execute("DELETE FROM simulation_cache WHERE key = ?", [key])
+
+
+def clear_simulation_cache():
+    with _lock:
+        _initialize()
+        db.cachedb.execute("DELETE FROM simulation_cache")
+        db.cachedb.commit()
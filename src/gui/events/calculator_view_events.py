@@ -108,6 +108,19 @@ class TurnOffRunningLabelFromUuidGrandEvent:
         self.uuid = uuid
 
 
+class SimulationStatusEvent:
+    def __init__(self, uuid: str, status: str, done: int, total: int):
+        self.uuid = uuid
+        self.status = status
+        self.done = done
+        self.total = total
+
+
+class CancelSimulationEvent:
+    def __init__(self, uuid: str):
+        self.uuid = uuid
+
+
 class ToggleUnitLockingOptionsVisibilityEvent:
     def __init__(self):
         pass
@@ -59,3 +59,10 @@ class CustomCardUpdatedEvent:
         self.card_id = card_id
         self.delete = delete
         self.image_changed = image_changed
+
+
+class IconsUpdatedEvent:
+    def __init__(self, card_ids: List[int], done: int, total: int):
+        self.card_ids = card_ids
+        self.done = done
+        self.total = total
@@ -1,64 +1,160 @@
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
 from PyQt5.QtCore import QRunnable, pyqtSlot
 
+from gui.events.utils.eventbus_stats import EventBusStats
 from gui.events.utils.threadpool import threadpool
 
 
+def _call_measured(stats: EventBusStats, subscriber, registrant, posted_event, asynchronous=False):
+    start_time = time.perf_counter()
+    failed = True
+    try:
+        res = subscriber(registrant, posted_event)
+        failed = False
+        return res
+    finally:
+        stats.record_handler(stats.get_key(subscriber, posted_event), time.perf_counter() - start_time, failed,
+                             asynchronous)
+
+
 class MyRunnable(QRunnable):
-    def __init__(self, subscriber, registrant, posted_event):
+    def __init__(self, subscriber, registrant, posted_event, stats: Optional[EventBusStats] = None):
         super().__init__()
         self.subscriber = subscriber
         self.registrant = registrant
         self.posted_event = posted_event
+        self.stats = stats
 
     @pyqtSlot()
     def run(self):
-        self.subscriber(self.registrant, self.posted_event)
+        if self.stats is None:
+            self.subscriber(self.registrant, self.posted_event)
+            return
+        self.stats.record_start()
+        _call_measured(self.stats, self.subscriber, self.registrant, self.posted_event, asynchronous=True)
 
 
 class AsyncEventBus:
+    """
+    Subscribers are resolved against registrants when either is added, so a post only looks up the handlers of its
+    event class. Handler tuples are replaced rather than mutated, posts from other threads never see a partial update.
+    """
     _registrants = list()
     _subscribers = dict()
+    # Attribute names of each registrant, dir() is only called once per registration
+    _registrant_names = dict()
+    # Event class -> ((subscriber, registrant), ...) in subscription order, then registration order
+    _handlers = dict()
+    _lock = threading.Lock()
+    _stats: Optional[EventBusStats] = None
 
     # Singleton it
     def __init__(self):
         pass
 
+    def _get_handlers(self, posted_event) -> Tuple[Tuple[Callable, Any], ...]:
+        return self._handlers.get(posted_event.__class__, ())
+
+    def _rebuild_handlers(self, event):
+        handlers = tuple((subscriber, registrant)
+                         for subscriber, subscribed_event in self._subscribers.items() if subscribed_event == event
+                         for registrant in self._registrants
+                         if subscriber.__name__ in self._registrant_names[id(registrant)])
+        if handlers:
+            self._handlers[event] = handlers
+        else:
+            self._handlers.pop(event, None)
+
+    def enable_instrumentation(self, log_interval: float = 0) -> EventBusStats:
+        """
+        Start collecting handler latencies and pool counters, logged every log_interval seconds if it is set.
+        """
+        if AsyncEventBus._stats is None:
+            AsyncEventBus._stats = EventBusStats()
+        if log_interval:
+            AsyncEventBus._stats.start_logging(log_interval, threadpool)
+        return AsyncEventBus._stats
+
+    def disable_instrumentation(self):
+        if AsyncEventBus._stats is not None:
+            AsyncEventBus._stats.stop_logging()
+        AsyncEventBus._stats = None
+
+    def get_stats(self) -> Optional[dict]:
+        stats = self._stats
+        return None if stats is None else stats.snapshot()
+
+    def _post_measured(self, stats: EventBusStats, posted_event, high_priority, asynchronous):
+        for subscriber, registrant in self._get_handlers(posted_event):
+            if not asynchronous:
+                _call_measured(stats, subscriber, registrant, posted_event)
+                continue
+            occupancy = stats.sample_pool(threadpool)
+            runnable = MyRunnable(subscriber, registrant, posted_event, stats)
+            # Counted before starting so the runnable never finishes before it is pending
+            stats.record_submit(high_priority, occupancy)
+            if high_priority:
+                threadpool.start(runnable)
+            elif not threadpool.tryStart(runnable):
+                stats.record_drop()
+
     def post(self, posted_event, high_priority=False, asynchronous=False):
-        subscribed = {key: value for (key, value) in self._subscribers.items() if value == posted_event.__class__}
-        for subscriber in subscribed:
-            registrants = filter(lambda r: subscriber.__name__ in dir(r), self._registrants)
-            for registrant in registrants:
-                # Just outright drop it if full and not high priority
-                if asynchronous:
-                    if high_priority:
-                        threadpool.start(MyRunnable(subscriber, registrant, posted_event))
-                    else:
-                        threadpool.tryStart(MyRunnable(subscriber, registrant, posted_event))
+        stats = self._stats
+        if stats is not None:
+            self._post_measured(stats, posted_event, high_priority, asynchronous)
+            return
+        for subscriber, registrant in self._get_handlers(posted_event):
+            # Just outright drop it if full and not high priority
+            if asynchronous:
+                if high_priority:
+                    threadpool.start(MyRunnable(subscriber, registrant, posted_event))
                 else:
-                    subscriber(registrant, posted_event)
+                    threadpool.tryStart(MyRunnable(subscriber, registrant, posted_event))
+            else:
+                subscriber(registrant, posted_event)
 
     # Only synchronous, for small operations
     def post_and_get_first(self, posted_event, required_non_none=False):
-        subscribed = {key: value for (key, value) in self._subscribers.items() if value == posted_event.__class__}
-        for subscriber in subscribed:
-            registrants = filter(lambda r: subscriber.__name__ in dir(r), self._registrants)
-            for registrant in registrants:
+        stats = self._stats
+        for subscriber, registrant in self._get_handlers(posted_event):
+            if stats is None:
                 res = subscriber(registrant, posted_event)
-                if required_non_none and res is not None or not required_non_none:
-                    return res
+            else:
+                res = _call_measured(stats, subscriber, registrant, posted_event)
+            if required_non_none and res is not None or not required_non_none:
+                return res
         return None
 
     def register(self, registrant):
-        self._registrants.append(registrant)
+        with self._lock:
+            self._registrants.append(registrant)
+            names = set(dir(registrant))
+            self._registrant_names[id(registrant)] = names
+            for event in {event for subscriber, event in self._subscribers.items() if subscriber.__name__ in names}:
+                self._rebuild_handlers(event)
 
     def unregister(self, registrant):
-        try:
-            self._registrants.remove(registrant)
-        except ValueError:
-            pass
+        with self._lock:
+            try:
+                self._registrants.remove(registrant)
+            except ValueError:
+                return
+            if registrant not in self._registrants:
+                self._registrant_names.pop(id(registrant), None)
+            for event in {event for event, handlers in self._handlers.items()
+                          if any(handler_registrant is registrant for _, handler_registrant in handlers)}:
+                self._rebuild_handlers(event)
 
     def subscribe(self, subscriber, event):
-        self._subscribers[subscriber] = event
+        with self._lock:
+            previous_event = self._subscribers.get(subscriber)
+            self._subscribers[subscriber] = event
+            if previous_event is not None and previous_event != event:
+                self._rebuild_handlers(previous_event)
+            self._rebuild_handlers(event)
 
 
 eventbus = AsyncEventBus()
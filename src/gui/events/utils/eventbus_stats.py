@@ -0,0 +1,155 @@
+"""
+Counters for AsyncEventBus, only collected once the bus is instrumented.
+"""
+import threading
+from typing import Dict, List, Optional
+
+import customlogger as logger
+
+# Upper bounds in milliseconds, the last bucket counts everything slower
+LATENCY_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+# Handlers listed in the periodic log line, slowest total first
+TOP_HANDLERS = 5
+
+
+class HandlerStats:
+    count: int
+    errors: int
+    total: float
+    max: float
+    buckets: List[int]
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, elapsed: float, failed: bool):
+        self.count += 1
+        self.errors += failed
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        elapsed_ms = elapsed * 1000
+        for idx, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed_ms <= bound:
+                self.buckets[idx] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0,
+            "max_ms": self.max * 1000,
+            "buckets": dict(zip([str(_) for _ in LATENCY_BUCKETS] + ["inf"], self.buckets)),
+        }
+
+
+class EventBusStats:
+    """
+    Handler latencies are keyed by event class and handler. Asynchronous posts count submissions, low priority events
+    the pool dropped because it was full, and high priority events that had to queue for a thread.
+    Pending is the number of accepted runnables that have not started yet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, HandlerStats] = dict()
+        self.submitted = 0
+        self.dropped = 0
+        self.queued = 0
+        self.pending = 0
+        self.max_pending = 0
+        self.running = 0
+        self._occupancy_total = 0
+        self._occupancy_max = 0
+        self._occupancy_samples = 0
+        self._logger_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def get_key(subscriber, posted_event) -> str:
+        return "{}:{}".format(posted_event.__class__.__name__, subscriber.__qualname__)
+
+    def sample_pool(self, pool):
+        occupancy = pool.activeThreadCount() / max(1, pool.maxThreadCount())
+        with self._lock:
+            self._occupancy_total += occupancy
+            self._occupancy_max = max(self._occupancy_max, occupancy)
+            self._occupancy_samples += 1
+        return occupancy
+
+    def record_submit(self, high_priority: bool, occupancy: float):
+        with self._lock:
+            self.submitted += 1
+            if high_priority and occupancy >= 1:
+                self.queued += 1
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+            self.pending -= 1
+
+    def record_start(self):
+        with self._lock:
+            self.pending -= 1
+            self.running += 1
+
+    def record_handler(self, key: str, elapsed: float, failed: bool, asynchronous: bool):
+        with self._lock:
+            if asynchronous:
+                self.running -= 1
+            if key not in self._handlers:
+                self._handlers[key] = HandlerStats()
+            self._handlers[key].add(elapsed, failed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "queued": self.queued,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "running": self.running,
+                "occupancy_mean": self._occupancy_total / self._occupancy_samples if self._occupancy_samples else 0,
+                "occupancy_max": self._occupancy_max,
+                "handlers": {key: value.to_dict() for key, value in self._handlers.items()},
+            }
+
+    def format(self, snapshot: dict = None) -> str:
+        if snapshot is None:
+            snapshot = self.snapshot()
+        slowest = sorted(snapshot["handlers"].items(), key=lambda item: -item[1]["total_ms"])[:TOP_HANDLERS]
+        handlers = ", ".join("{} {}x {:.1f}ms mean {:.1f}ms max".format(key, value["count"], value["mean_ms"],
+                                                                         value["max_ms"])
+                             for key, value in slowest)
+        return "Event bus: {} async submitted, {} dropped, {} queued, {} pending (max {}), " \
+               "pool {:.0%} mean {:.0%} max | {}".format(snapshot["submitted"], snapshot["dropped"],
+                                                         snapshot["queued"], snapshot["pending"],
+                                                         snapshot["max_pending"], snapshot["occupancy_mean"],
+                                                         snapshot["occupancy_max"], handlers)
+
+    def _log_periodically(self, interval: float, pool):
+        while not self._stop.wait(interval):
+            if pool is not None:
+                self.sample_pool(pool)
+            logger.info(self.format())
+
+    def start_logging(self, interval: float, pool=None):
+        if self._logger_thread is not None:
+            return
+        self._stop.clear()
+        self._logger_thread = threading.Thread(target=self._log_periodically, args=(interval, pool),
+                                               name="eventbus-stats", daemon=True)
+        self._logger_thread.start()
+
+    def stop_logging(self):
+        self._stop.set()
+        self._logger_thread = None
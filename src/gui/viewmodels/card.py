@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-from pathlib import Path
 from typing import cast, Any, Optional, Dict, List
 
-from PyQt5.QtCore import QSize, QMimeData, Qt, QPoint
+from PyQt5.QtCore import QSize, QMimeData, Qt, QPoint, QObject, pyqtSignal
 from PyQt5.QtGui import QDrag, QPixmap, QPainter, QColor
 from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QComboBox, QAbstractItemView, QApplication, QWidget, \
     QHeaderView
@@ -12,15 +11,14 @@ import customlogger as logger
 from db import db
 from gui.events.calculator_view_events import PushCardEvent
 from gui.events.quicksearch_events import PushCardIndexEvent
-from gui.events.state_change_events import PotentialUpdatedEvent
+from gui.events.state_change_events import PotentialUpdatedEvent, IconsUpdatedEvent
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
 from gui.viewmodels.mime_headers import CARD
-from gui.viewmodels.utils import ImageWidget, NumericalTableWidgetItem
+from gui.viewmodels.utils import ImageWidget, NumericalTableWidgetItem, get_icon_pixmap
 from logic.live import Live
 from logic.profile import card_storage
 from network import meta_updater
-from settings import IMAGE_PATH64, IMAGE_PATH, IMAGE_PATH32
 from static.color import CARD_GUI_COLORS
 from static.skill import SKILL_COLOR_BY_NAME
 
@@ -165,58 +163,71 @@ class CardView:
                 self.widget.setRowHidden(r_idx, True)
         self.refresh_spacing()
 
-    def draw_icons(self, icons: Optional[Dict[str, Path]], size: Optional[int]):
+    def draw_icons(self, size: Optional[int]):
         if size is None:
             self.size = 20
         else:
             self.size = size
         for r_idx in range(self.widget.rowCount()):
-            if icons:
-                card_id = self.widget.item(r_idx, 2).text()
-                cast(ImageWidget, self.widget.cellWidget(r_idx, 1)).set_path(icons[card_id])
+            if size is not None:
+                card_id = int(self.widget.item(r_idx, 2).text())
+                cast(ImageWidget, self.widget.cellWidget(r_idx, 1)).set_pixmap(get_icon_pixmap(card_id, size))
             else:
-                cast(ImageWidget, self.widget.cellWidget(r_idx, 1)).set_path(None)
+                cast(ImageWidget, self.widget.cellWidget(r_idx, 1)).set_pixmap(None)
         self.refresh_spacing()
 
+    def update_icons(self, card_ids: List[int], size: int):
+        card_ids = set(card_ids)
+        for r_idx in range(self.widget.rowCount()):
+            card_id = int(self.widget.item(r_idx, 2).text())
+            if card_id in card_ids:
+                image = cast(ImageWidget, self.widget.cellWidget(r_idx, 1))
+                image.set_pixmap(get_icon_pixmap(card_id, size))
+                image.update()
+
     def refresh_spacing(self):
         self.widget.verticalHeader().setDefaultSectionSize(self.size + 10)
         self.widget.horizontalHeader().setSectionResizeMode(1, QHeaderView.Fixed)
         self.widget.setColumnWidth(1, self.size + 10)
 
 
+class IconSignals(QObject):
+    icons_updated = pyqtSignal(list)
+
+
 class CardModel:
     view: CardView
-    images: Dict[str, Path]
     owned: Dict[int, int]
     model_id: int
     potential: bool
+    size: Optional[int]
 
     def __init__(self, view: CardView, model_id: int):
         assert isinstance(view, CardView)
         self.view = view
-        self.images = dict()
         self.owned = dict()
         self.model_id = model_id
         self.potential = False
+        self.size = None
+        # Icons arrive on the icon sync thread, the signal hands them to the GUI thread
+        self.signals = IconSignals()
+        self.signals.icons_updated.connect(lambda card_ids: self.add_images(card_ids))
         eventbus.eventbus.register(self)
 
     def load_images(self, size: int = None):
         logger.info("Card list thumbnail size: {}".format(size))
-        if size is None:
-            self.images = dict()
-            self.view.draw_icons(None, size)
+        assert size is None or size == 32 or size == 64 or size == 124
+        self.size = size
+        self.view.draw_icons(size)
+
+    @subscribe(IconsUpdatedEvent)
+    def icons_updated_from_event(self, event: IconsUpdatedEvent):
+        self.signals.icons_updated.emit(event.card_ids)
+
+    def add_images(self, card_ids: List[int]):
+        if self.size is None:
             return
-        if size is not None:
-            assert size == 32 or size == 64 or size == 124
-            if size == 32:
-                path = IMAGE_PATH32
-            elif size == 64:
-                path = IMAGE_PATH64
-            else:
-                path = IMAGE_PATH
-            for image_path in path.iterdir():
-                self.images[image_path.name.split(".")[0]] = image_path
-            self.view.draw_icons(self.images, size)
+        self.view.update_icons(card_ids, self.size)
 
     def set_potential_inclusion(self, potential: bool):
         self.potential = potential
@@ -11,6 +11,7 @@ from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QScrollArea, QStackedW
 
 from chart_pic_generator import BaseChartPicGenerator, WINDOW_WIDTH, SCROLL_WIDTH
 from db import db
+from db.master_snapshot import get_master_snapshot
 from gui.events.calculator_view_events import SimulationEvent, CacheSimulationEvent, CustomSimulationEvent, \
     CustomSimulationResultEvent
 from gui.events.chart_viewer_events import SendMusicEvent, HookAbuseToChartViewerEvent, HookUnitToChartViewerEvent, \
@@ -535,8 +536,8 @@ class ChartViewer:
         appeal = int(self.info_widget.subwidgets['detail_skill_detail_motif_appeal'].textbox[0].text())
 
         grand = len(self.cards) > 6
-        query = "SELECT type_01_value FROM skill_motif_value{}".format("_grand" if grand else "")
-        motif_values = [_[0] for _ in db.masterdb.execute_and_fetchall(query)]
+        snapshot = get_master_snapshot()
+        motif_values = snapshot.motif_values_grand if grand else snapshot.motif_values
 
         appeal_trimmed = min(appeal // 1000, len(motif_values) - 1)
         value = motif_values[int(appeal_trimmed)]
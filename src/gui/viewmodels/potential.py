@@ -10,9 +10,8 @@ import customlogger as logger
 from db import db
 from gui.events.state_change_events import PotentialUpdatedEvent
 from gui.events.utils import eventbus
-from gui.viewmodels.utils import NumericalTableWidgetItem, ImageWidget
+from gui.viewmodels.utils import NumericalTableWidgetItem, ImageWidget, get_icon_pixmap
 from logic.profile import potential
-from settings import IMAGE_PATH64
 
 
 class PotentialView:
@@ -52,7 +51,7 @@ class PotentialView:
             for c_idx, (key, value) in enumerate(character.items()):
                 if c_idx == 1:
                     item = ImageWidget(None, self.widget)
-                    item.set_path(str(IMAGE_PATH64 / "{:06d}.jpg".format(value)))
+                    item.set_pixmap(get_icon_pixmap(value, 64))
                     self.widget.setCellWidget(r_idx, c_idx, item)
                     continue
                 elif isinstance(value, int):
@@ -15,7 +15,8 @@ from PyQt5.QtWidgets import QHBoxLayout, QAbstractItemView, QTableWidget, QAppli
 import customlogger as logger
 from gui.events.calculator_view_events import GetAllCardsEvent, DisplaySimulationResultEvent, \
     AddEmptyUnitEvent, SetSupportCardsEvent, RequestSupportTeamEvent, ContextAwarePushCardEvent, \
-    TurnOffRunningLabelFromUuidEvent, ToggleUnitLockingOptionsVisibilityEvent
+    TurnOffRunningLabelFromUuidEvent, ToggleUnitLockingOptionsVisibilityEvent, SimulationStatusEvent, \
+    CancelSimulationEvent
 from gui.events.chart_viewer_events import HookUnitToChartViewerEvent
 from gui.events.song_view_events import GetSongDetailsEvent
 from gui.events.state_change_events import AutoFlagChangeEvent, ShutdownTriggeredEvent, CustomCardUpdatedEvent
@@ -32,6 +33,7 @@ from logic.card import Card
 from settings import BACKUP_PATH
 from simulator import SimulationResult, AutoSimulationResult
 from static.color import Color
+from utils import job_scheduler
 from utils.storage import get_writer, get_reader
 
 if TYPE_CHECKING:
@@ -245,6 +247,7 @@ class CalculatorUnitWidgetWithExtraData(UnitWidget):
         self.checkbox_container_widget.setVisible(state)
 
     def toggle_running_simulation(self, running: bool = False):
+        self.running_label.setText("Running...")
         self.running_label.setVisible(running)
         self.running_simulation = running
 
@@ -286,6 +289,12 @@ class CalculatorUnitWidget(CalculatorUnitWidgetWithExtraData, UniversalUniqueIde
         if type(self.unit_view) == UnitView:
             cast(self.unit_view, UnitView).handle_lost_mime(mime_text)
 
+    def set_card(self, idx: int, card: Union[int, Card, None]):
+        super().set_card(idx, card)
+        if self.running_simulation:
+            # A result for the old unit is not worth waiting for
+            eventbus.eventbus.post(CancelSimulationEvent(self.get_uuid()))
+
     def create_card_layout(self):
         self.card_widget = QWidget(self)
         self.card_layout = QHBoxLayout()
@@ -442,6 +451,7 @@ class CalculatorView:
         if len(self.widget.selectionModel().selectedRows()) == 0:
             return
         selected_row = self.widget.selectionModel().selectedRows()[0].row()
+        eventbus.eventbus.post(CancelSimulationEvent(self.widget.cellWidget(selected_row, 0).get_uuid()))
         self.widget.removeRow(selected_row)
 
     def duplicate_unit(self, custom_card_data: bool = False):
@@ -620,9 +630,9 @@ class CalculatorModel:
         for r_idx in rows_to_search:
             unit_widget = self.view.widget.cellWidget(r_idx, 0)
             if unit_widget.running_simulation:
+                # Submitted again, the scheduler drops the old request unless the inputs are the same
                 logger.info("Simulation already running: {}".format(
                     unit_widget.get_uuid()))
-                continue
             unit_widget.toggle_running_simulation(True)
             res.append(self.view.widget.cellWidget(r_idx, 0).extended_cards_data)
         return res
@@ -657,6 +667,20 @@ class CalculatorModel:
                 break
         return row_to_change
 
+    @subscribe(SimulationStatusEvent)
+    def display_simulation_status(self, event: SimulationStatusEvent):
+        row_to_change = self.get_row_from_uuid(event.uuid)
+        if row_to_change == -1:
+            return
+        unit_widget = self.view.widget.cellWidget(row_to_change, 0)
+        if event.status == job_scheduler.QUEUED:
+            unit_widget.toggle_running_simulation(True)
+            unit_widget.running_label.setText("Queued... {}/{}".format(event.done, event.total))
+        elif event.status == job_scheduler.RUNNING:
+            unit_widget.toggle_running_simulation(True)
+        elif event.status in (job_scheduler.CANCELLED, job_scheduler.FAILED):
+            unit_widget.toggle_running_simulation(False)
+
     @subscribe(TurnOffRunningLabelFromUuidEvent)
     def turn_off_running_label_from_uuid(self, event: TurnOffRunningLabelFromUuidEvent):
         row_to_change = self.get_row_from_uuid(event.uuid)
@@ -16,7 +16,6 @@ from gui.viewmodels.simulator.calculator import CalculatorView, CalculatorModel,
 from gui.viewmodels.unit import UnitCard
 from gui.viewmodels.utils import UniversalUniqueIdentifiable
 from logic.card import Card
-from settings import IMAGE_PATH32
 
 if TYPE_CHECKING:
     from gui.viewmodels.simulator.wide_smart import MainView
@@ -43,7 +42,6 @@ class GrandCalculatorUnitWidget(CalculatorUnitWidgetWithExtraData, UniversalUniq
                 color = 'black'
             card = UnitCard(unit_widget=self, card_idx=idx, size=self.icon_size, color=color)
             self.cards.append(card)
-        self.path = IMAGE_PATH32
 
         self.vertical_layout = QVBoxLayout()
         self.card_layouts = [QHBoxLayout(), QHBoxLayout(), QHBoxLayout()]
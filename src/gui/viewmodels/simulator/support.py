@@ -12,13 +12,12 @@ from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
 from gui.events.value_accessor_events import GetCustomPotsEvent, GetCustomBonusEvent, GetGrooveSongColor
 from gui.viewmodels.simulator.calculator import CardsWithUnitUuidAndExtraData
-from gui.viewmodels.utils import NumericalTableWidgetItem, ImageWidget
+from gui.viewmodels.utils import NumericalTableWidgetItem, ImageWidget, get_icon_pixmap
 from logic.card import Card
 from logic.grandlive import GrandLive
 from logic.grandunit import GrandUnit
 from logic.live import Live
 from logic.unit import Unit
-from settings import IMAGE_PATH64
 from static.song_difficulty import Difficulty
 
 
@@ -48,7 +47,8 @@ class SupportView:
         support[:, [2, 3]] = support[:, [3, 2]]
         for r in range(len(support)):
             card_id = support[r][0]
-            image = ImageWidget(str(IMAGE_PATH64 / "{:06d}.jpg".format(card_id)), self.widget)
+            image = ImageWidget(None, self.widget)
+            image.set_pixmap(get_icon_pixmap(int(card_id), 64))
             self.widget.setCellWidget(r, 0, image)
             for c in range(1, 5):
                 self.widget.setItem(r, c, NumericalTableWidgetItem(support[r][c]))
@@ -3,7 +3,7 @@ from __future__ import annotations
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QAbstractItemView, QTableWidgetItem, QHeaderView
 
-from db import db
+from db.master_snapshot import get_master_snapshot
 from gui.events.unit_details_events import HookUnitToUnitDetailsEvent, GetSupportLiveObjectEvent
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
@@ -73,11 +73,9 @@ class UnitDetailsModel:
 
         for c_idx, unit in enumerate(self.live.unit.all_units):
             if grand:
-                motif_values = [_[0] for _ in
-                                db.masterdb.execute_and_fetchall("SELECT type_01_value FROM skill_motif_value_grand")]
+                motif_values = get_master_snapshot().motif_values_grand
             else:
-                motif_values = [_[0] for _ in
-                                db.masterdb.execute_and_fetchall("SELECT type_01_value FROM skill_motif_value")]
+                motif_values = get_master_snapshot().motif_values
             vo = int(unit.base_attributes[:5, 0, :].sum())
             vi = int(unit.base_attributes[:5, 1, :].sum())
             da = int(unit.base_attributes[:5, 2, :].sum())
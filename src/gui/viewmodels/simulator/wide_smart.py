@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import partial
 from typing import Optional, List
 
 from PyQt5 import QtWidgets
@@ -8,13 +9,16 @@ from PyQt5.QtGui import QIntValidator, QFontMetrics
 from numpy import ndarray
 
 import customlogger as logger
+from db.simulation_cache import get_simulation_key
 from exceptions import InvalidUnit
 from gui.events.calculator_view_events import GetAllCardsEvent, SimulationEvent, DisplaySimulationResultEvent, \
     AddEmptyUnitEvent, YoinkUnitEvent, PushCardEvent, ContextAwarePushCardEvent, TurnOffRunningLabelFromUuidEvent, \
-    TurnOffRunningLabelFromUuidGrandEvent, CacheSimulationEvent, CustomSimulationEvent, CustomSimulationResultEvent
+    TurnOffRunningLabelFromUuidGrandEvent, CacheSimulationEvent, CustomSimulationEvent, CustomSimulationResultEvent, \
+    SimulationStatusEvent, CancelSimulationEvent
 from gui.events.chart_viewer_events import HookAbuseToChartViewerEvent, HookSimResultToChartViewerEvent
 from gui.events.song_view_events import GetSongDetailsEvent
-from gui.events.state_change_events import PostYoinkEvent, InjectTextEvent, YoinkCustomCardEvent
+from gui.events.state_change_events import PostYoinkEvent, InjectTextEvent, YoinkCustomCardEvent, \
+    ShutdownTriggeredEvent
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
 from gui.events.utils.wrappers import BaseSimulationResultWithUuid, YoinkResults
@@ -29,12 +33,19 @@ from gui.viewmodels.simulator.edit_card import EditCardView, EditCardModel
 from gui.viewmodels.simulator.grandcalculator import GrandCalculatorView, GrandCalculatorModel
 from gui.viewmodels.simulator.support import SupportView, SupportModel
 from gui.viewmodels.simulator.unit_details import UnitDetailsView, UnitDetailsModel
+from logic.card import Card
 from logic.grandlive import GrandLive
 from logic.grandunit import GrandUnit
 from logic.live import Live
 from logic.unit import Unit
 from network.api_client import get_top_build
-from simulator import Simulator, SimulationResult
+from settings import SIMULATION_WORKERS, SIMULATION_PROCESSES
+from simulation_worker import SimulationJob, SimulationWorkerPool, get_card_spec
+from simulator import Simulator, SimulationResult, describe_card
+from utils.job_scheduler import JobScheduler
+
+# Rows simulated on their own, by double clicking, skip ahead of a full calculator run
+CLICKED_ROW_PRIORITY = 1
 
 
 class MainView:
@@ -223,22 +234,63 @@ class MainView:
         )
 
 
+def _get_unit_cards(event: SimulationEvent) -> List[Card]:
+    return event.unit.all_cards(guest=True) if isinstance(event.unit, Unit) else event.unit.all_cards()
+
+
+def _get_simulation_key(event: SimulationEvent) -> str:
+    cards = _get_unit_cards(event)
+    return get_simulation_key({
+        "cards": [describe_card(card) if card is not None else None for card in cards],
+        "chart": [event.live.score_id, event.live.difficulty, event.live.color],
+        "bonus": [event.appeals, event.support, event.extra_bonus, event.special_option, event.special_value],
+        "flags": [event.autoplay, event.autoplay_offset, event.doublelife, event.mirror, event.perfect_play,
+                  event.left_inclusive, event.right_inclusive, event.force_encore_amr_cache_to_encore_unit,
+                  event.force_encore_magic_to_encore_unit, event.allow_encore_magic_to_escape_max_agg,
+                  event.allow_great],
+        # Jobs drop abuse data nobody asked for, so a request wanting it cannot share a run with one that does not
+        "abuse_load": event.abuse_load,
+        "times": event.times,
+    })
+
+
+def _get_simulation_job(event: SimulationEvent, trial_workers: int) -> SimulationJob:
+    return SimulationJob(
+        cards=[get_card_spec(card) for card in _get_unit_cards(event)],
+        score_id=event.live.score_id, difficulty=event.live.difficulty.value, color=event.live.color.value,
+        appeals=event.appeals, support=event.support, extra_bonus=event.extra_bonus,
+        special_option=event.special_option, special_value=event.special_value, times=event.times,
+        autoplay=event.autoplay, autoplay_offset=event.autoplay_offset, doublelife=event.doublelife,
+        mirror=event.mirror, perfect_play=event.perfect_play, allow_great=event.allow_great,
+        left_inclusive=event.left_inclusive, right_inclusive=event.right_inclusive,
+        force_encore_amr_cache_to_encore_unit=event.force_encore_amr_cache_to_encore_unit,
+        force_encore_magic_to_encore_unit=event.force_encore_magic_to_encore_unit,
+        allow_encore_magic_to_escape_max_agg=event.allow_encore_magic_to_escape_max_agg,
+        abuse_load=event.abuse_load, trial_workers=trial_workers)
+
+
 class MainModel(QObject):
     view: MainView
 
     process_simulation_results_signal = pyqtSignal(BaseSimulationResultWithUuid)
     process_yoink_results_signal = pyqtSignal(YoinkResults)
+    simulation_status_signal = pyqtSignal(str, str, int, int)
 
     def __init__(self, view: MainView, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.view = view
+        self.scheduler = JobScheduler(SIMULATION_WORKERS, "simulation")
+        # Scheduler threads only wait on the worker processes
+        self.worker_pool = SimulationWorkerPool(SIMULATION_WORKERS) if SIMULATION_PROCESSES else None
         eventbus.eventbus.register(self)
         self.process_simulation_results_signal.connect(lambda payload: self.process_results(payload))
         self.process_yoink_results_signal.connect(lambda payload: self._handle_yoink_done_signal(payload))
+        self.simulation_status_signal.connect(
+            lambda uuid, status, done, total: eventbus.eventbus.post(SimulationStatusEvent(uuid, status, done, total)))
 
-    @staticmethod
-    def simulate_internal(perfect_play: bool, left_inclusive: bool, right_inclusive: bool, score_id: int, diff_id: int,
-                          times: int, all_cards: List[CardsWithUnitUuidAndExtraData], custom_pots: Optional[List[int]],
+    def simulate_internal(self, perfect_play: bool, left_inclusive: bool, right_inclusive: bool, score_id: int,
+                          diff_id: int, times: int, all_cards: List[CardsWithUnitUuidAndExtraData],
+                          custom_pots: Optional[List[int]],
                           appeals: Optional[int], support: Optional[int], extra_bonus: Optional[ndarray],
                           special_option: Optional[int], special_value: Optional[int],
                           mirror: bool, autoplay: bool, autoplay_offset: int, doublelife: bool,
@@ -270,6 +322,7 @@ class MainModel(QObject):
             if extended_cards_data.lock_chart:
                 if extended_cards_data.score_id is None:
                     # Lock chart but no music found
+                    self.scheduler.cancel(extended_cards_data.uuid)
                     if is_grand:
                         eventbus.eventbus.post_and_get_first(
                             TurnOffRunningLabelFromUuidGrandEvent(extended_cards_data.uuid))
@@ -289,6 +342,7 @@ class MainModel(QObject):
                 else:
                     live.set_loaded_music(score_id, diff_id, notes, color, level, duration)
             else:
+                self.scheduler.cancel(extended_cards_data.uuid)
                 if is_grand:
                     eventbus.eventbus.post_and_get_first(
                         TurnOffRunningLabelFromUuidGrandEvent(extended_cards_data.uuid))
@@ -320,17 +374,48 @@ class MainModel(QObject):
                     unit = Unit.from_list(cards, inner_custom_pots)
             except InvalidUnit:
                 logger.info("Invalid unit: {}".format(cards))
+                self.scheduler.cancel(extended_cards_data.uuid)
                 eventbus.eventbus.post_and_get_first(TurnOffRunningLabelFromUuidEvent(extended_cards_data.uuid))
                 continue
 
-            eventbus.eventbus.post(
+            self.schedule_simulation(
                 SimulationEvent(extended_cards_data.uuid, extended_cards_data.short_uuid,
                                 row is not None, appeals, autoplay, autoplay_offset,
                                 doublelife, inner_extra_bonus, live, mirror, perfect_play, inner_special_option,
                                 inner_special_value, support, times, unit, left_inclusive, right_inclusive,
                                 force_encore_amr_cache_to_encore_unit, force_encore_magic_to_encore_unit,
                                 allow_encore_magic_to_escape_max_agg, allow_great),
-                high_priority=True, asynchronous=True)
+                CLICKED_ROW_PRIORITY if row is not None else 0)
+
+    def schedule_simulation(self, event: SimulationEvent, priority: int = 0):
+        """
+        Rows with identical inputs share one run, and a row submitted again drops its stale request.
+        """
+        def on_done(result):
+            self.process_simulation_results_signal.emit(
+                BaseSimulationResultWithUuid(event.uuid, event.unit.all_cards(), result, event.abuse_load, event.live))
+
+        def on_status(status, done, total):
+            self.simulation_status_signal.emit(event.uuid, status, done, total)
+
+        if self.worker_pool is None:
+            function = partial(self._run_simulation, event)
+        else:
+            eventbus.eventbus.post(CacheSimulationEvent(event))
+            job = _get_simulation_job(event, self.worker_pool.trial_workers)
+            function = partial(self.worker_pool.run, job)
+        self.scheduler.submit(_get_simulation_key(event), function, on_done,
+                              group=event.uuid, priority=priority, on_status=on_status)
+
+    @subscribe(CancelSimulationEvent)
+    def cancel_simulation(self, event: CancelSimulationEvent):
+        self.scheduler.cancel(event.uuid)
+
+    @subscribe(ShutdownTriggeredEvent)
+    def shutdown_simulations(self, event):
+        self.scheduler.cancel_all()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
 
     @pyqtSlot(BaseSimulationResultWithUuid)
     def process_results(self, payload: BaseSimulationResultWithUuid):
@@ -345,8 +430,8 @@ class MainModel(QObject):
                                                                payload.cards, payload.results.abuse_data),
                                    asynchronous=False)
 
-    @subscribe(SimulationEvent)
-    def handle_simulation_request(self, event: SimulationEvent):
+    @staticmethod
+    def _run_simulation(event: SimulationEvent):
         eventbus.eventbus.post(CacheSimulationEvent(event))
         event.live.set_unit(event.unit)
         if event.autoplay:
@@ -371,9 +456,8 @@ class MainModel(QObject):
             result = sim.simulate(times=event.times, appeals=event.appeals, extra_bonus=event.extra_bonus,
                                   support=event.support, perfect_play=event.perfect_play,
                                   special_option=event.special_option, special_value=event.special_value,
-                                  doublelife=event.doublelife, perfect_only=not event.allow_great)
-        self.process_simulation_results_signal.emit(
-            BaseSimulationResultWithUuid(event.uuid, event.unit.all_cards(), result, event.abuse_load, event.live))
+                                  doublelife=event.doublelife, perfect_only=not event.allow_great, cache=True)
+        return result
 
     @subscribe(CustomSimulationEvent)
     def handle_custom_simulation(self, custom_event: CustomSimulationEvent):
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import ast
-from pathlib import Path
 from typing import Optional, Union, cast, TYPE_CHECKING, List, Tuple
 
 from PyQt5.QtCore import QSize, Qt, QMimeData, QPoint
@@ -15,10 +14,9 @@ from gui.events.state_change_events import UnitStorageUpdatedEvent, CustomCardUp
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
 from gui.viewmodels.mime_headers import CARD, CALCULATOR_UNIT, UNIT_EDITOR_UNIT, CALCULATOR_GRANDUNIT
-from gui.viewmodels.utils import ImageWidget
+from gui.viewmodels.utils import ImageWidget, get_icon_pixmap
 from logic.card import Card
 from logic.profile import unit_storage
-from settings import IMAGE_PATH64, IMAGE_PATH32, IMAGE_PATH
 
 if TYPE_CHECKING:
     from gui.viewmodels.simulator.calculator import CalculatorView
@@ -64,7 +62,6 @@ class UnitWidget(QWidget):
     cards_internal: List[Optional[Card]]
     unit_name: QLineEdit
     icon_size: int
-    path: Path
 
     def __init__(self, unit_view: UnitView, parent: QWidget = None, size: int = 64):
         super(UnitWidget, self).__init__(parent)
@@ -86,12 +83,6 @@ class UnitWidget(QWidget):
         self.unit_name.setMaximumSize(QSize(16777215, 25))
         self.unit_name.setMaxLength(80)
         self.icon_size = size
-        if self.icon_size == 32:
-            self.path = IMAGE_PATH32
-        elif self.icon_size == 64:
-            self.path = IMAGE_PATH64
-        elif self.icon_size == 124:
-            self.path = IMAGE_PATH
 
     def clone_internal(self) -> List[Card]:
         res = list()
@@ -126,13 +117,13 @@ class UnitWidget(QWidget):
                 custom_pots = None
             self.cards_internal[idx] = Card.from_id(card, custom_pots)
         if card is None:
-            self.cards[idx].set_path(None)
+            self.cards[idx].set_pixmap(None)
         else:
             if isinstance(card, Card):
                 card_id = card.card_id
             else:
                 card_id = card
-            self.cards[idx].set_path(str(self.path / "{:06d}.jpg".format(card_id)))
+            self.cards[idx].set_pixmap(get_icon_pixmap(card_id, self.icon_size))
         self.cards[idx].repaint()
         if type(self) == SmallUnitWidget:
             self.update_unit()
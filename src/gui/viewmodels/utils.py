@@ -1,12 +1,63 @@
 import uuid
 from pathlib import Path
-from typing import Any, Callable, Union
+from typing import Any, Callable, Union, Optional, Dict, Tuple
 
 from PyQt5.QtCore import QRectF, Qt
 from PyQt5.QtGui import QPixmap, QPainter, QColor, QPen, QPainterPath
 from PyQt5.QtWidgets import QWidget, QTableWidgetItem
 from numpy import int32
 
+from settings import ATLAS_PATH
+from utils import icon_atlas
+
+
+class IconAtlas:
+    """
+    Sprite sheets of one icon size, each sheet is read once on first use.
+    """
+
+    def __init__(self, index: dict):
+        self.size = index["size"]
+        self.icons = index["icons"]
+        self.sheet_paths = [ATLAS_PATH / _ for _ in index["sheets"]]
+        self.sheets = [None] * len(self.sheet_paths)
+
+    def get(self, card_id: int) -> Optional[QPixmap]:
+        position = self.icons.get(str(card_id))
+        if position is None:
+            return None
+        sheet_idx, x, y = position
+        if self.sheets[sheet_idx] is None:
+            self.sheets[sheet_idx] = QPixmap(str(self.sheet_paths[sheet_idx]))
+        return self.sheets[sheet_idx].copy(x, y, self.size, self.size)
+
+
+_atlases: Dict[int, Tuple[int, Optional[IconAtlas]]] = dict()
+
+
+def _get_icon_atlas(size: int) -> Optional[IconAtlas]:
+    try:
+        mtime = icon_atlas.get_index_path(size).stat().st_mtime_ns
+    except OSError:
+        return None
+    if size not in _atlases or _atlases[size][0] != mtime:
+        index = icon_atlas.load_index(size)
+        _atlases[size] = (mtime, IconAtlas(index) if index is not None else None)
+    return _atlases[size][1]
+
+
+def get_icon_pixmap(card_id: int, size: int) -> QPixmap:
+    """
+    Icon of a card sliced from the atlas, read from its own file if the atlas does not have it yet.
+    """
+    atlas = _get_icon_atlas(size)
+    if atlas is not None:
+        pixmap = atlas.get(card_id)
+        if pixmap is not None:
+            return pixmap
+    icon_dir, extension = icon_atlas.ICON_DIRS[size]
+    return QPixmap(str(icon_dir / "{:06d}.{}".format(card_id, extension)))
+
 
 class ImageWidget(QWidget):
     picture: QPixmap
@@ -31,6 +82,12 @@ class ImageWidget(QWidget):
         else:
             self.picture = QPixmap(str(path))
 
+    def set_pixmap(self, pixmap: Optional[QPixmap]):
+        if pixmap is None:
+            self.picture = QPixmap(0, 0)
+        else:
+            self.picture = pixmap
+
     def toggle_border(self, value: bool = False, border_length: int = 0):
         self.border = value
         self.border_length = border_length + 1
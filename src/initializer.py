@@ -1,44 +1,137 @@
 """
 Import all modules in the correct order
 """
+import threading
+from typing import Optional
+
+import customlogger as logger
 from settings import MANIFEST_PATH, MASTERDB_PATH
 from utils import storage
+from utils.task_graph import Task, TaskGraph
+
+_graph: Optional[TaskGraph] = None
 
 
 def load_static():
+    # The static modules only declare data, their chihiro.db tables are rebuilt here so that importing them, e.g. in
+    # a spawned worker process, never touches the database
     from static import color, leader, probability_type, rarity, skill, song_difficulty
 
-    assert color
-    assert leader
-    assert probability_type
-    assert rarity
-    assert skill
-    assert song_difficulty
+    color.create_color_text()
+    leader.create_leader_keywords()
+    probability_type.create_probability_keywords()
+    rarity.create_rarity_text()
+    skill.create_skill_keywords()
+    song_difficulty.create_difficulty_text()
 
 
-def setup(update=False):
-    load_static()
-    if not (storage.exists(MANIFEST_PATH) and storage.exists(MASTERDB_PATH)):
-        update = True
+def _update_database(update):
     from db import db
     assert db
     from network import meta_updater
     if update:
         meta_updater.update_database()
+
+
+def _load_card_query():
     from logic.search import card_query
-    assert card_query
+    card_query.generate_short_names()
+
+
+def _update_musicscores():
     from network import music_updater
     music_updater.update_musicscores()
+
+
+def _update_cache_scores():
     from network import chart_cache_updater
     chart_cache_updater.update_cache_scores()
+
+
+def _post_icon_progress(card_ids, done, total):
+    from gui.events.state_change_events import IconsUpdatedEvent
+    from gui.events.utils import eventbus
+    logger.debug("Card icons {}/{}".format(done, total))
+    eventbus.eventbus.post(IconsUpdatedEvent(card_ids, done, total))
+
+
+def _prepare_images():
+    from network import image_updater
+    image_updater.prepare_icon_directories()
+
+
+def _update_images():
     from network import image_updater
-    assert image_updater
+    image_updater.sync_icons(on_progress=_post_icon_progress)
+
+
+def _load_profile():
     from logic.profile import profile_manager
     assert profile_manager
+
+
+def _load_search():
     from logic.search import indexer, search_engine
     assert indexer
     assert search_engine
 
 
+def load_cache_tables():
+    """
+    Build the chihiro.db tables the static data and card names need, for scripts and tests that skip setup().
+    """
+    load_static()
+    _load_card_query()
+
+
+def get_startup_graph(update=False) -> TaskGraph:
+    """
+    Everything the GUI needs before its window can show, icons only fill in afterwards.
+    """
+    return TaskGraph([
+        Task("static", load_static),
+        Task("database", lambda: _update_database(update), ["static"]),
+        # Creates chara_cache from kirara, the song catalog reads the performers from it
+        Task("card_query", _load_card_query, ["database"]),
+        Task("musicscores", _update_musicscores, ["database"]),
+        Task("chart_cache", _update_cache_scores, ["musicscores", "card_query"]),
+        # Custom card icons are written into the icon directories when the profile loads
+        Task("icon_directories", _prepare_images, ["card_query"]),
+        # Loads custom cards through the GUI view model
+        Task("profile", _load_profile, ["card_query", "icon_directories"], main_thread=True),
+        # The card index needs the owned cards and the song index needs the chart cache
+        Task("search", _load_search, ["profile", "chart_cache"]),
+        Task("images", _update_images, ["profile"], deferred=True),
+    ])
+
+
+def setup(update=False):
+    """
+    Call from the main thread, the profile task runs on the calling thread.
+    """
+    global _graph
+    if not (storage.exists(MANIFEST_PATH) and storage.exists(MASTERDB_PATH)):
+        update = True
+    _graph = get_startup_graph(update)
+    _graph.run()
+
+
+def _run_deferred():
+    try:
+        _graph.run_deferred()
+    except Exception as e:
+        logger.error("Deferred startup failed: {}".format(e))
+
+
+def run_deferred() -> threading.Thread:
+    """
+    Run what setup() left out in the background, call it once the window is up.
+    """
+    thread = threading.Thread(target=_run_deferred, name="deferred-startup", daemon=True)
+    thread.start()
+    return thread
+
+
 if __name__ == '__main__':
     setup(False)
+    run_deferred().join()
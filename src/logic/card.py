@@ -5,6 +5,7 @@ from typing import Union, Optional, List
 import pyximport
 
 from db import db
+from db.master_snapshot import get_master_snapshot, POTENTIAL_KEYS
 from logic.leader import Leader
 from logic.search import card_query
 from logic.skill import Skill
@@ -59,10 +60,10 @@ class Card:
 
         not_custom = card_id < 500000
         custom_card_id = int(str(card_id)[1:]) if not not_custom else 0
+        snapshot = get_master_snapshot()
 
         if not_custom:
-            card_data = db.masterdb.execute_and_fetchone("SELECT * FROM card_data WHERE id = ?",
-                                                         params=[card_id], out_dict=True)
+            card_data = snapshot.card_data[card_id]
 
             vocal = card_data['vocal_max']
             visual = card_data['visual_max']
@@ -75,10 +76,9 @@ class Card:
             bonuses = [card_data['bonus_vocal'], card_data['bonus_visual'], card_data['bonus_dance'],
                        card_data['bonus_hp'], 0]
 
-            subattr = db.masterdb.execute_and_fetchone("SELECT sub_attribute FROM card_subtype WHERE card_data_id = ?",
-                                                       params=[card_id])
+            subattr = snapshot.card_subattributes.get(card_id)
             if subattr is not None:
-                subattr = Color(subattr[0] - 1)
+                subattr = Color(subattr - 1)
 
             owned = db.cachedb.execute_and_fetchall("SELECT number FROM owned_card WHERE card_id = ?", [card_id])[0][0]
             if owned == 0:
@@ -94,16 +94,14 @@ class Card:
             dance = card_data['dance']
             life = card_data['life']
 
-            chara_id, attribute = db.masterdb.execute_and_fetchone("""
-                SELECT chara_id, attribute FROM card_data WHERE id = ?
-                """, [card_data['image_id']])
+            image_data = snapshot.card_data[card_data['image_id']]
+            chara_id, attribute = image_data['chara_id'], image_data['attribute']
 
             bonuses = [0, 0, 0, 0, 0]
 
-            subattr = db.masterdb.execute_and_fetchone("SELECT sub_attribute FROM card_subtype WHERE card_data_id = ?",
-                                                       params=[card_data['image_id']])
+            subattr = snapshot.card_subattributes.get(card_data['image_id'])
             if subattr is not None:
-                subattr = Color(subattr[0] - 1)
+                subattr = Color(subattr - 1)
 
             owned = 1
 
@@ -114,14 +112,8 @@ class Card:
                 = db.cachedb.execute_and_fetchall("SELECT vo,vi,da,li,sk FROM potential_cache WHERE chara_id = ?",
                                                   params=[chara_id])[0]
 
-        rarity = card_data['rarity'] if card_data['rarity'] % 2 == 1 else card_data['rarity'] - 1
-        attributes = ['vo', 'vi', 'da', 'li', 'sk']
-        for idx, key in enumerate(attributes):
-            if potentials[idx] == 0:
-                continue
-            bonuses[idx] += db.masterdb.execute_and_fetchone("""
-                SELECT value_rare_{} FROM potential_value_{} WHERE potential_level = ?
-                """.format(rarity, key), [potentials[idx]])[0]
+        for idx, key in enumerate(POTENTIAL_KEYS):
+            bonuses[idx] += snapshot.get_potential_value(key, card_data['rarity'], potentials[idx])
 
         skill_id = card_data['skill_id'] if not_custom else card_id
         skill = Skill.from_id(skill_id, bonuses[4])
@@ -170,9 +162,9 @@ class Card:
     def refresh_values(self):
         self.is_refreshed = True
 
+        snapshot = get_master_snapshot()
         if not self.custom:
-            card_data = db.masterdb.execute_and_fetchone("SELECT * FROM card_data WHERE id = ?",
-                                                         params=[self.card_id], out_dict=True)
+            card_data = snapshot.card_data[self.card_id]
             bonuses = [card_data['bonus_vocal'], card_data['bonus_visual'], card_data['bonus_dance'],
                        card_data['bonus_hp'], 0]
         else:
@@ -180,15 +172,9 @@ class Card:
                                                         params=[int(str(self.card_id)[1:])], out_dict=True)
             bonuses = [0, 0, 0, 0, 0]
 
-        rarity = card_data['rarity'] if card_data['rarity'] % 2 == 1 else card_data['rarity'] - 1
-        attributes = ['vo', 'vi', 'da', 'li', 'sk']
         potentials = [self.vo_pots, self.vi_pots, self.da_pots, self.li_pots, self.sk_pots]
-        for idx, key in enumerate(attributes):
-            if potentials[idx] == 0:
-                continue
-            bonuses[idx] += db.masterdb.execute_and_fetchone("""
-                            SELECT value_rare_{} FROM potential_value_{} WHERE potential_level = ?
-                        """.format(rarity, key), [potentials[idx]])[0]
+        for idx, key in enumerate(POTENTIAL_KEYS):
+            bonuses[idx] += snapshot.get_potential_value(key, card_data['rarity'], potentials[idx])
 
         self.vo = self.base_vo + bonuses[0]
         self.vi = self.base_vi + bonuses[1]
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union, List, Tuple, Dict
+
+import numpy as np
+import pandas as pd
+
+import customlogger as logger
+from settings import MUSICSCORES_PATH, COMPILED_CHARTS_PATH
+from static.live_values import WEIGHT_RANGE
+from static.note_type import NoteType
+from static.song_difficulty import Difficulty
+from utils import storage
+
+# Bump when the compile rules change so charts persisted by an older version are rebuilt
+COMPILED_CHART_VERSION = 1
+CACHE_SIZE = 32
+
+_FIELDS = ("sec", "note_type", "lane", "status", "group_id",
+           "is_flick", "is_long", "is_slide", "checkpoints", "weights")
+
+
+def _mark_long_ends(note_types: List[int], lanes: List[int], mask: np.ndarray, is_long: np.ndarray) -> np.ndarray:
+    # A note closing a long note on the same lane is treated as long too, even if it is a flick
+    is_long = is_long.copy()
+    held_lanes = set()
+    for idx in np.flatnonzero(mask).tolist():
+        lane = lanes[idx]
+        if note_types[idx] == NoteType.LONG.value and lane not in held_lanes:
+            held_lanes.add(lane)
+        elif lane in held_lanes:
+            held_lanes.remove(lane)
+            is_long[idx] = True
+    return is_long
+
+
+def _mark_slide_checkpoints(note_type: np.ndarray, group_id: np.ndarray) -> np.ndarray:
+    # Slide notes are checkpoints, except the first and last note of their group
+    is_slide = note_type == NoteType.SLIDE.value
+    checkpoints = is_slide.copy()
+    for slide_group in np.unique(group_id[is_slide]):
+        group = np.flatnonzero(group_id == slide_group)
+        checkpoints[group[0]] = False
+        checkpoints[group[-1]] = False
+    return checkpoints
+
+
+def _get_weights(note_count: int) -> np.ndarray:
+    weights = np.zeros(note_count)
+    bounds = np.trunc(WEIGHT_RANGE[:, 0] / 100 * note_count - 1).astype(int)
+    for idx, (bound_l, bound_r) in enumerate(zip(bounds[:-1], bounds[1:])):
+        weights[max(bound_l, 0):bound_r + 1] = WEIGHT_RANGE[idx][1]
+    return weights
+
+
+class CompiledChart:
+    """
+    Read-only note arrays of a chart with everything the simulator derives from the raw notes.
+    Shared between simulations, do not mutate.
+    """
+    score_id: Optional[int]
+    difficulty: Difficulty
+    mirror: bool
+
+    sec: np.ndarray
+    note_type: np.ndarray
+    lane: np.ndarray
+    status: np.ndarray
+    group_id: np.ndarray
+    is_flick: np.ndarray
+    is_long: np.ndarray
+    is_slide: np.ndarray
+    checkpoints: np.ndarray
+    weights: np.ndarray
+
+    note_types: List[NoteType]
+    special_note_types: List[List[NoteType]]
+
+    def __init__(self, score_id: Optional[int], difficulty: Difficulty, mirror: bool, sec: np.ndarray,
+                 note_type: np.ndarray, lane: np.ndarray, status: np.ndarray, group_id: np.ndarray,
+                 is_flick: np.ndarray, is_long: np.ndarray, is_slide: np.ndarray, checkpoints: np.ndarray,
+                 weights: np.ndarray):
+        self.score_id = score_id
+        self.difficulty = difficulty
+        self.mirror = mirror
+        self.sec = sec.astype(np.float64)
+        self.note_type = note_type.astype(np.int8)
+        self.lane = lane.astype(np.int64)
+        self.status = status.astype(np.int64)
+        self.group_id = group_id.astype(np.int64)
+        self.is_flick = is_flick.astype(bool)
+        self.is_long = is_long.astype(bool)
+        self.is_slide = is_slide.astype(bool)
+        self.checkpoints = checkpoints.astype(bool)
+        self.weights = weights.astype(np.float64)
+        for field in _FIELDS:
+            getattr(self, field).setflags(write=False)
+
+        self.note_types = [NoteType(_) for _ in self.note_type.tolist()]
+        self.special_note_types = list()
+        for flick, long, slide in zip(self.is_flick.tolist(), self.is_long.tolist(), self.is_slide.tolist()):
+            temp = list()
+            if flick:
+                temp.append(NoteType.FLICK)
+            if long:
+                temp.append(NoteType.LONG)
+            if slide:
+                temp.append(NoteType.SLIDE)
+            self.special_note_types.append(temp)
+
+    @property
+    def note_count(self) -> int:
+        return len(self.sec)
+
+    @property
+    def song_duration(self) -> float:
+        return float(self.sec[-1])
+
+    def get_digest(self) -> str:
+        digest = hashlib.sha256()
+        for field in ("sec", "note_type", "lane", "status", "group_id"):
+            digest.update(getattr(self, field).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def compile(cls, score_id: Optional[int], difficulty: Difficulty, notes: pd.DataFrame,
+                mirror: bool = False) -> 'CompiledChart':
+        sec = notes['sec'].to_numpy(dtype=np.float64)
+        note_type = np.array([_.value for _ in notes['note_type']], dtype=np.int8)
+        raw_type = notes['type'].to_numpy(dtype=np.int64)
+        lane = notes['finishPos'].to_numpy(dtype=np.int64)
+        status = notes['status'].to_numpy(dtype=np.int64)
+        group_id = notes['groupId'].to_numpy(dtype=np.int64)
+
+        if mirror:
+            lane = 16 - (lane + status - 1)
+
+        is_flick = note_type == NoteType.FLICK.value
+        is_long = note_type == NoteType.LONG.value
+        is_slide = note_type == NoteType.SLIDE.value
+        is_slide |= (raw_type == 3) & is_flick
+        is_slide |= ((raw_type == 6) | (raw_type == 7)) & (group_id != 0)
+        is_long = _mark_long_ends(note_type.tolist(), lane.tolist(), is_long | is_flick, is_long)
+        checkpoints = _mark_slide_checkpoints(note_type, group_id)
+        weights = _get_weights(len(sec))
+
+        return cls(score_id, difficulty, mirror, sec, note_type, lane, status, group_id,
+                   is_flick, is_long, is_slide, checkpoints, weights)
+
+    def save(self, path: Path):
+        # Write to a temporary file first so other processes never read a partial chart
+        temp_path = path.parent / "{}.{}.tmp".format(path.name, os.getpid())
+        with storage.get_writer(temp_path, 'wb') as fwb:
+            np.savez(fwb, version=COMPILED_CHART_VERSION, **{field: getattr(self, field) for field in _FIELDS})
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, score_id: int, difficulty: Difficulty, mirror: bool) -> Optional['CompiledChart']:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != COMPILED_CHART_VERSION:
+                return None
+            return cls(score_id, difficulty, mirror, *(data[field] for field in _FIELDS))
+
+
+_cache: Dict[Tuple[int, Difficulty, bool], Tuple[float, CompiledChart]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _get_source_mtime(score_id: int) -> Optional[float]:
+    try:
+        return (MUSICSCORES_PATH / "musicscores_m{:03d}.db".format(score_id)).stat().st_mtime
+    except OSError:
+        return None
+
+
+def get_compiled_chart_path(score_id: int, difficulty: Difficulty, mirror: bool) -> Path:
+    return COMPILED_CHARTS_PATH / "m{:03d}_{:d}{}.npz".format(score_id, difficulty.value, "_mirror" if mirror else "")
+
+
+def get_compiled_chart(score_id: Optional[int], difficulty: Union[int, Difficulty], notes: pd.DataFrame,
+                       mirror: bool = False, persist: bool = True) -> CompiledChart:
+    """
+    Get the compiled chart of (score_id, difficulty, mirror), notes are only read on a cache miss.
+    Compiled charts are kept in memory and, if persist, next to the musicscores until the musicscore changes.
+    """
+    if isinstance(difficulty, int):
+        difficulty = Difficulty(difficulty)
+    mirror = mirror and (difficulty == Difficulty.PIANO or difficulty == Difficulty.FORTE)
+    if score_id is None:
+        return CompiledChart.compile(score_id, difficulty, notes, mirror)
+
+    key = (score_id, difficulty, mirror)
+    source_mtime = _get_source_mtime(score_id)
+    with _cache_lock:
+        if key in _cache and _cache[key][0] == source_mtime:
+            _cache.move_to_end(key)
+            return _cache[key][1]
+
+    chart = None
+    path = get_compiled_chart_path(score_id, difficulty, mirror)
+    if persist and source_mtime is not None and path.exists() and path.stat().st_mtime >= source_mtime:
+        try:
+            chart = CompiledChart.load(path, score_id, difficulty, mirror)
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug("Failed to load compiled chart {}: {}".format(path, e))
+    if chart is None:
+        chart = CompiledChart.compile(score_id, difficulty, notes, mirror)
+        if persist and source_mtime is not None:
+            try:
+                chart.save(path)
+            except OSError as e:
+                logger.debug("Failed to save compiled chart {}: {}".format(path, e))
+
+    with _cache_lock:
+        _cache[key] = (source_mtime, chart)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return chart
+
+
+def clear_compiled_chart_cache():
+    with _cache_lock:
+        _cache.clear()
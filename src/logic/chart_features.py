@@ -0,0 +1,85 @@
+"""
+Features of a chart cached in live_detail_cache. The chart cache updater runs them in worker processes, which import
+this module again when started with spawn, so importing it must not touch chihiro.db.
+"""
+from io import StringIO
+from typing import cast
+
+import numpy as np
+import pandas as pd
+
+from db import db, chart_store
+from settings import MUSICSCORES_PATH
+from static.live_values import WEIGHT_RANGE
+from static.note_type import NoteType
+
+COMMON_TIMERS = [(7, 4.5, 'h'), (9, 6, 'h'), (11, 7.5, 'h'), (12, 7.5, 'm'),
+                 (6, 4.5, 'm'), (7, 6, 'm'), (9, 7.5, 'm'), (11, 9, 'm'), (13, 9, 'h')]
+
+
+def classify_note_vectorized(row: pd.DataFrame) -> pd.Series:
+    rowtype = row.type.astype(np.int32)  # to prevent crashing in 32-bit python
+    res = np.choose(rowtype - 3, [np.choose(row.status == 0, [NoteType.FLICK, np.choose(rowtype - 1,
+                                                                                        [NoteType.TAP, NoteType.LONG,
+                                                                                         NoteType.SLIDE],
+                                                                                        mode="clip")]),
+                                  NoteType.TAP, NoteType.SLIDE, NoteType.FLICK, NoteType.FLICK], mode="clip")
+    return cast(pd.Series, res)
+
+
+def _is_active(time, interval, duration, last_note):
+    return (time > interval) & (time % interval > 0) & (time % interval <= duration) \
+           & (time // interval * interval <= last_note - 3)
+
+
+def _load_notes(live_id, difficulty):
+    notes_data = chart_store.load_chart_dataframe(live_id, difficulty)
+    if notes_data is not None:
+        return notes_data
+    score_path = MUSICSCORES_PATH / "musicscores_m{:03d}.db".format(live_id)
+    if not score_path.exists():
+        return None
+    with db.CustomDB(score_path) as score_conn:
+        score = score_conn.execute_and_fetchone(
+            """
+            SELECT * FROM blobs WHERE name LIKE "musicscores/m{:03d}/{:d}_{:d}.csv"
+            """.format(live_id, live_id, difficulty)
+        )
+    if score is None:
+        return None
+    return pd.read_csv(StringIO(score[1].decode()))
+
+
+def extract_chart_features(live_id, difficulty):
+    """
+    Duration, note counts and timer coverage of a chart, None if the chart does not exist.
+    """
+    notes_data = _load_notes(live_id, difficulty)
+    if notes_data is None:
+        return None
+    features = dict()
+    features['duration'] = notes_data.iloc[-1]['sec']
+    if difficulty == 6:
+        notes_data = notes_data[(notes_data['type'] < 8) &
+                                ((notes_data['visible'].isna()) | (notes_data['visible'] >= 0))
+                                ].reset_index(drop=True)
+    else:
+        notes_data = notes_data[notes_data["type"] < 8].reset_index(drop=True)
+    notes_data['note_type'] = classify_note_vectorized(notes_data)
+    note_count = dict(notes_data['note_type'].value_counts())
+    for note_type in NoteType:
+        key_str = note_type.name.capitalize()
+        if note_type in note_count:
+            features[key_str] = int(note_count[note_type])
+        else:
+            features[key_str] = 0
+    total_notes = len(notes_data)
+    combo_thresholds = (total_notes * WEIGHT_RANGE[:, 0] / 100).astype(int)
+    # Correct for deresute's rounding method
+    combo_thresholds[1:-1] -= 1
+    multipliers = np.repeat(WEIGHT_RANGE[:-1, 1], combo_thresholds[1:] - combo_thresholds[:-1])
+    for timer in COMMON_TIMERS:
+        features['Timer_{}{}'.format(timer[0], timer[2])] = float(multipliers[
+            _is_active(notes_data['sec'], timer[0], timer[1], notes_data.iloc[-1]['sec'])
+        ].sum() / multipliers.sum())
+    return features
@@ -23,21 +23,27 @@ class GrandLive(BaseLive):
             self.unit_lives.append(dummy_live)
         super().__init__(music_name, difficulty, unit)
 
-    def initialize_music(self, music_name: str = None, difficulty: Union[int, Difficulty] = None,
-                         unit: GrandUnit = None):
-        super().initialize_music(music_name, difficulty, unit)
-        for i in range(3):
-            self.unit_lives[i].initialize_music(music_name, difficulty, unit)
-
     def set_music(self, music_name: str = None, score_id: int = None, difficulty: Union[int, Difficulty] = None,
                   event: bool = None, skip_load_notes: bool = False, output: bool = False) \
             -> Tuple[pd.DataFrame, Color, int, int]:
         super().set_music(music_name, score_id, difficulty, event, skip_load_notes)
-        for i in range(3):
-            self.unit_lives[i].set_music(music_name, score_id, difficulty, event, skip_load_notes)
+        self._share_music_with_unit_lives()
         if output:
             return self.notes, self.color, self.level, self.duration
 
+    def set_loaded_music(self, score_id: int, difficulty: Union[int, Difficulty], notes: pd.DataFrame,
+                         color: Color, level: int, duration: int):
+        super().set_loaded_music(score_id, difficulty, notes, color, level, duration)
+        self._share_music_with_unit_lives()
+
+    def _share_music_with_unit_lives(self):
+        # Unit lives only need the song for their bonuses, they share the chart loaded by the grand live
+        for unit_live in self.unit_lives:
+            unit_live.set_loaded_music(self.score_id, self.difficulty, self.notes, self.color, self.level,
+                                       self.duration)
+            unit_live.music_name = self.music_name
+            unit_live.reset_attributes(hard_reset=False)
+
     def set_chara_bonus(self, chara_bonus_set: set, chara_bonus_value: int):
         super().set_chara_bonus(chara_bonus_set, chara_bonus_value)
         for i in range(3):
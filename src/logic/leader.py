@@ -5,7 +5,7 @@ from typing import Union
 import numpy as np
 import pyximport
 
-from db import db
+from db.master_snapshot import get_master_snapshot
 
 pyximport.install(language_level=3)
 
@@ -43,14 +43,7 @@ class Leader:
     def from_id(cls, leader_id: int) -> Leader:
         if leader_id == 0:
             return cls()  # Default leader with 0 bonus
-        leader_data = db.masterdb.execute_and_fetchone(
-            """
-            SELECT leader_skill_data.*
-            FROM leader_skill_data
-            WHERE id = ?
-            """,
-            params=[leader_id],
-            out_dict=True)
+        leader_data = get_master_snapshot().leader_skill_data[leader_id]
 
         bonuses = np.zeros((5, 3))
         for i in range(2):
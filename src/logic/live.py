@@ -1,14 +1,15 @@
 import io
 from abc import ABC, abstractmethod
 from collections import OrderedDict
-from typing import Optional, cast, Union, List, Set, Tuple
+from typing import Optional, Union, List, Set, Tuple
 
 import numpy as np
 import pandas as pd
 import pyximport
 
 import customlogger as logger
-from db import db
+from db import db, chart_store
+from db.master_snapshot import get_master_snapshot
 from exceptions import NoLiveFoundException
 from logic.grandunit import GrandUnit
 from logic.search import card_query
@@ -41,16 +42,6 @@ def classify_note(row: pd.Series) -> NoteType:
         return NoteType.SLIDE
 
 
-def classify_note_vectorized(row: pd.DataFrame) -> pd.Series:
-    rowtype = row.type.astype(np.int32)  # to prevent crashing in 32-bit python
-    res = np.choose(rowtype - 3, [np.choose(row.status == 0, [NoteType.FLICK, np.choose(rowtype - 1,
-                                                                                        [NoteType.TAP, NoteType.LONG,
-                                                                                         NoteType.SLIDE],
-                                                                                        mode="clip")]),
-                                  NoteType.TAP, NoteType.SLIDE, NoteType.FLICK, NoteType.FLICK], mode="clip")
-    return cast(pd.Series, res)
-
-
 def get_score_color(score_id: int) -> Color:
     color = db.masterdb.execute_and_fetchall("SELECT live_data.type FROM live_data WHERE live_data.id = ?",
                                              [score_id])
@@ -96,7 +87,14 @@ def fetch_chart(base_music_name: Optional[str], base_score_id: int, base_difficu
             )
 
     color, level = 1, 1
+    notes_data = None
+    store = chart_store.get_chart_store()
     for score_id, color, level in score_ids:
+        if store is not None and (score_id, difficulty) in store:
+            flag = True
+            if not skip_load_notes:
+                notes_data = chart_store.load_chart_dataframe(score_id, difficulty)
+            break
         flag = False
         with db.CustomDB(MUSICSCORES_PATH / "musicscores_m{:03d}.db".format(score_id)) as score_conn:
             row_data = score_conn.execute_and_fetchone(
@@ -114,7 +112,8 @@ def fetch_chart(base_music_name: Optional[str], base_score_id: int, base_difficu
                                                                              str(base_difficulty)))
     if skip_load_notes:
         return None, Color(color - 1), level, None
-    notes_data = pd.read_csv(io.StringIO(row_data[1].decode()))
+    if notes_data is None:
+        notes_data = pd.read_csv(io.StringIO(row_data[1].decode()))
     duration = notes_data.iloc[-1]['sec']
     if difficulty == 6:
         if skip_damage_notes:
@@ -468,13 +467,9 @@ class Live(BaseLive):
     def get_probability(self, idx: int = None) -> Union[np.ndarray, float]:
         if self.probabilities is None:
             card_probabilities = np.zeros((5, 3))
+            snapshot = get_master_snapshot()
             for card_idx, card in enumerate(self.unit.all_cards()):
-                if card.sk_pots == 0:
-                    pot_bonus = 0
-                else:
-                    pot_bonus = db.masterdb.execute_and_fetchone("""
-                            SELECT value_rare_{} FROM potential_value_sk WHERE potential_level = ?
-                        """.format((card.ra - 1) // 2 * 2 + 1), [card.sk_pots])[0]
+                pot_bonus = snapshot.get_potential_value("sk", card.ra, card.sk_pots)
                 card_probabilities[card_idx, card.color.value] \
                     = (card.skill.probability - pot_bonus) / 1.5 * (1 + (card.skill.skill_level - 1) / 18) + pot_bonus
             self.get_bonuses()
@@ -22,12 +22,11 @@ def update_owned_cards(card_ids: Union[int, List[int]], numbers: Union[int, List
         card_ids = [card_ids]
         numbers = [numbers]
     assert len(card_ids) == len(numbers)
-    for card_id, number in zip(card_ids, numbers):
-        db.cachedb.execute("""
+    with db.cachedb.transaction():
+        db.cachedb.executemany("""
             INSERT OR REPLACE INTO owned_card (card_id, number)
             VALUES (?,?)
-        """, [card_id, number])
-    db.cachedb.commit()
+        """, list(zip(card_ids, numbers)))
     from logic.search import indexer, search_engine
     indexer.im.initialize_index_db(card_ids)
     indexer.im.reindex(card_ids)
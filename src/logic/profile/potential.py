@@ -62,8 +62,9 @@ def copy_card_data_from_master(update_all: bool = True, chara_id: int = None):
     if update_all:
         card_df.to_sql('card_data_cache', db.cachedb.get_connection(), index=False)
     else:
-        for index, row in card_df.iterrows():
-            db.cachedb.execute("""
+        columns = ['bonus_hp', 'bonus_vocal', 'bonus_dance', 'bonus_visual', 'bonus_skill', 'id']
+        with db.cachedb.transaction():
+            db.cachedb.executemany("""
                 UPDATE card_data_cache
                 SET bonus_hp = ?,
                     bonus_vocal = ?,
@@ -71,8 +72,7 @@ def copy_card_data_from_master(update_all: bool = True, chara_id: int = None):
                     bonus_visual = ?,
                     bonus_skill = ?
                 WHERE id = ?
-            """, [row['bonus_hp'], row['bonus_vocal'], row['bonus_dance'],
-                  row['bonus_visual'], row['bonus_skill'], row['id']])
+            """, card_df[columns].astype(object).values.tolist())
     db.cachedb.commit()
 
 
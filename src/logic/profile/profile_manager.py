@@ -23,9 +23,9 @@ custom_keys = ["id", "rarity", "image_id", "vocal", "dance", "visual", "life",
 def import_from_gameid(game_id: str, option: int) -> List[int]:
     try:
         owned_cards = [_[0] for _ in db.cachedb.execute_and_fetchall("SELECT card_id FROM owned_card WHERE number > 0")]
-        db.cachedb.execute("UPDATE owned_card SET number = 0")
-        db.cachedb.commit()
         if option == 6:  # Clear
+            with db.cachedb.transaction():
+                db.cachedb.execute("UPDATE owned_card SET number = 0")
             return owned_cards
 
         assert len(str(game_id)) == 9
@@ -61,13 +61,13 @@ def import_from_gameid(game_id: str, option: int) -> List[int]:
                         if card_data[0] < 500000]
             for card in owned_rn:
                 card_dict[card] += 1
-        for card_id, number in card_dict.items():
-            db.cachedb.execute("""
+        # Owned cards are only reset once the import succeeded, together with writing the imported ones
+        with db.cachedb.transaction():
+            db.cachedb.execute("UPDATE owned_card SET number = 0")
+            db.cachedb.executemany("""
                 INSERT OR REPLACE INTO owned_card (card_id, number)
                 VALUES (?,?)
-            """, [card_id, number])
-
-        db.cachedb.commit()
+            """, list(card_dict.items()))
         logger.info("Imported {} cards successfully".format(len(card_dict)))
         return list(card_dict.keys())
 
@@ -115,6 +115,3 @@ def convert_id_to_short_name(query: Union[List[str], str]) -> List[str]:
         query_res = query_res[0] if query_res is not None else "MyCard"
         results.append(query_res)
     return results
-
-
-generate_short_names()
@@ -1,4 +1,6 @@
 import ast
+import hashlib
+import json
 import shutil
 from typing import Optional, List
 
@@ -8,23 +10,57 @@ from whoosh.index import create_in, open_dir, FileIndex
 
 import customlogger as logger
 from db import db
+from db.master_snapshot import get_masterdb_digest
 from logic.live import Live
 from network.meta_updater import get_masterdb_path
 from settings import INDEX_PATH
 from static.color import Color
 from static.song_difficulty import Difficulty
-from utils.misc import is_debug_mode
+
+# Bump when the index schemas or the indexed fields change so indices built by an older version are rebuilt
+INDEX_SCHEMA_VERSION = 1
+STAMP_PATH = INDEX_PATH / "stamp"
 
 KEYWORD_KEYS_STR_ONLY = ["short", "chara", "rarity", "color", "skill", "leader", "time_prob_key", "normal", "limited",
                          "fes", "noir", "blanc", "carnival", "main_attribute", "main_attribute_2"]
 KEYWORD_KEYS = KEYWORD_KEYS_STR_ONLY + ["owned", "idolized"]
 
 
+# cachedb tables initialize_index_db reads besides owned_card
+INDEX_SOURCE_TABLES = ["card_data_cache", "card_name_cache", "chara_cache", "rarity_text", "color_text",
+                       "probability_keywords", "skill_keywords", "leader_keywords"]
+
+
+def _get_table_digest(table: str) -> Optional[str]:
+    exists = db.cachedb.execute_and_fetchone(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", [table])[0]
+    if not exists:
+        return None
+    rows = db.cachedb.execute_and_fetchall("SELECT * FROM {} ORDER BY 1".format(table))
+    return hashlib.sha256(json.dumps(rows, default=str).encode()).hexdigest()
+
+
+def get_index_stamp() -> str:
+    """
+    Digest of everything the indices are built from: master.db, the owned cards, the cached card, idol and keyword
+    tables, the carnival idols, the chart cache and the schema.
+    """
+    owned_cards = db.cachedb.execute_and_fetchall("SELECT card_id, number FROM owned_card ORDER BY card_id")
+    charts = db.cachedb.execute_and_fetchall(
+        "SELECT live_detail_id, performers, special_keys, jp_name, name, level, color, difficulty "
+        "FROM live_detail_cache ORDER BY live_detail_id")
+    # The quicksearch keywords live in chihiro.db, a new chihiro.db needs them rebuilt even if nothing else changed
+    has_keywords = db.cachedb.execute_and_fetchone(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'card_index_keywords'")[0]
+    tables = [_get_table_digest(table) for table in INDEX_SOURCE_TABLES]
+    carnival_idols = sorted(Live.static_get_chara_bonus_set(get_name=False))
+    stamp = json.dumps([INDEX_SCHEMA_VERSION, get_masterdb_digest(), has_keywords, tables, carnival_idols,
+                        owned_cards, charts])
+    return hashlib.sha256(stamp.encode()).hexdigest()
+
+
 class IndexManager:
     def __init__(self):
-        # Skip cleanup in debug
-        if not is_debug_mode() and self.cleanup():
-            INDEX_PATH.mkdir()
         self.index: Optional[FileIndex] = None
         self.song_index: Optional[FileIndex] = None
 
@@ -131,22 +167,20 @@ class IndexManager:
             data = db.cachedb.execute_and_fetchall(query, card_list, out_dict=True)
         else:
             data = db.cachedb.execute_and_fetchall(query, out_dict=True)
-            db.cachedb.execute("DROP TABLE IF EXISTS card_index_keywords")
-            db.cachedb.execute("""
-                CREATE TABLE IF NOT EXISTS card_index_keywords (
-                    "card_id" INTEGER UNIQUE PRIMARY KEY,
-                    "fields" BLOB
-                )
-            """)
         logger.debug("Initializing quicksearch db for {} cards".format(len(data)))
-        for card in data:
-            card_id = card['id']
-            fields = {_: card[_] for _ in KEYWORD_KEYS}
-            db.cachedb.execute("""
+        with db.cachedb.transaction():
+            if card_list is None:
+                db.cachedb.execute("DROP TABLE IF EXISTS card_index_keywords")
+                db.cachedb.execute("""
+                    CREATE TABLE IF NOT EXISTS card_index_keywords (
+                        "card_id" INTEGER UNIQUE PRIMARY KEY,
+                        "fields" BLOB
+                    )
+                """)
+            db.cachedb.executemany("""
                     INSERT OR REPLACE INTO card_index_keywords ("card_id", "fields")
                     VALUES (?,?)
-                """, [card_id, str(fields)])
-        db.cachedb.commit()
+                """, [(card['id'], str({_: card[_] for _ in KEYWORD_KEYS})) for card in data])
         logger.debug("Quicksearch db transaction for {} cards completed".format(len(data)))
         db.cachedb.execute("DETACH DATABASE masterdb")
 
@@ -246,12 +280,38 @@ class IndexManager:
                                 content=content,
                                 **fields)
         writer.commit()
+        # The owned cards changed, the stamp follows so the updated index is kept on the next start
+        self.write_stamp()
+
+    def is_up_to_date(self, stamp: str) -> bool:
+        try:
+            return STAMP_PATH.read_text() == stamp
+        except OSError:
+            return False
+
+    def write_stamp(self, stamp: str = None):
+        if stamp is None:
+            stamp = get_index_stamp()
+        STAMP_PATH.write_text(stamp)
 
     def get_index(self, song_index: bool = False) -> FileIndex:
-        if not is_debug_mode() and self.index is None:
-            im.initialize_index_db()
-            im.initialize_index()
-            im.initialize_chart_index()
+        if self.index is None:
+            stamp = get_index_stamp()
+            if self.is_up_to_date(stamp):
+                logger.debug("Quicksearch indices are up to date, loading them")
+                try:
+                    im.load_indices()
+                except Exception as e:
+                    logger.debug("Failed to load quicksearch indices: {}".format(e))
+                    self.index = None
+            if self.index is None:
+                self.cleanup()
+                INDEX_PATH.mkdir(parents=True, exist_ok=True)
+                im.initialize_index_db()
+                im.initialize_index()
+                im.initialize_chart_index()
+                # Written last so an interrupted build is redone on the next start
+                self.write_stamp(stamp)
         else:
             im.load_indices()
         if song_index:
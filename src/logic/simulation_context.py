@@ -0,0 +1,51 @@
+from typing import List, Dict, Tuple
+
+from logic.live import BaseLive
+from static.skill import get_sparkle_bonus
+
+MOTIF_TYPES = (35, 36, 37)
+
+
+class SimulationContext:
+    """
+    Values a simulation derives from master data, resolved once before any trial runs.
+    Trials only read from here so the event loop never touches the database.
+    """
+    card_count: int
+    unit_count: int
+    probabilities: List[float]
+    motif_values: List[Dict[int, int]]
+    harmony_values: List[Dict[Tuple[int, int], Tuple[int, int]]]
+    sparkle_bonus_ssr: List[int]
+    sparkle_bonus_sr: List[int]
+    start_life: int
+    max_life: int
+
+    def __init__(self, live: BaseLive, grand: bool, doublelife: bool):
+        units = live.unit.all_units
+        cards = live.unit.all_cards()
+        self.card_count = len(cards)
+        self.unit_count = len(units)
+
+        self.probabilities = [
+            live.get_probability(unit_idx * 5 + card_idx)
+            for unit_idx, unit in enumerate(units)
+            for card_idx in range(len(unit.all_cards()))
+        ]
+
+        # Encore and magic can copy a motif or harmony skill into any unit, so every unit gets every value
+        harmony_targets = {tuple(card.skill.targets_harmony) for card in cards if card.skill.is_harmony}
+        self.motif_values = [
+            {skill_type: unit.convert_motif(skill_type, grand) for skill_type in MOTIF_TYPES}
+            for unit in units
+        ]
+        self.harmony_values = [
+            {targets: unit.convert_harmony(*targets) for targets in harmony_targets}
+            for unit in units
+        ]
+
+        self.sparkle_bonus_ssr = get_sparkle_bonus(8, grand)
+        self.sparkle_bonus_sr = get_sparkle_bonus(6, grand)
+
+        self.start_life = live.get_start_life(doublelife=doublelife)
+        self.max_life = live.get_start_life(doublelife=True)
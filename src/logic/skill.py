@@ -6,6 +6,7 @@ import numpy as np
 import pyximport
 
 from db import db
+from db.master_snapshot import get_master_snapshot
 from static.color import Color
 from static.note_type import NoteType
 from static.skill import SKILL_BASE, SKILL_DESCRIPTION
@@ -17,10 +18,6 @@ HARMONY_TYPES = {45, 46, 47, 48, 49, 50}
 COLOR_TARGETS = {21, 22, 23, 32, 33, 34, 45, 46, 47, 48, 49, 50}
 ACT_TYPES = {28: NoteType.LONG, 29: NoteType.FLICK, 30: NoteType.SLIDE}
 SUPPORT_TYPES = {5, 6, 7}
-COMMON_TIMERS = [(7, 4.5, 'h'), (9, 6, 'h'), (11, 7.5, 'h'), (12, 7.5, 'm'),
-                 (6, 4.5, 'm'), (7, 6, 'm'), (9, 7.5, 'm'), (11, 9, 'm'), (13, 9, 'h')]
-
-
 class Skill:
     def __init__(self, color: Color = Color.CUTE, duration: int = 0, probability: int = 0, interval: int = 999,
                  values: List[int] = None, v0: int = 0, v1: int = 0, v2: int = 0, v3: int = 0, v4: int = 0,
@@ -180,36 +177,12 @@ class Skill:
 
     @classmethod
     def _fetch_skill_data_from_db(cls, skill_id: int) -> Dict[str, Any]:
-        return db.masterdb.execute_and_fetchone("""
-            SELECT skill_data.*,
-                card_data.attribute,
-                probability_type.probability_max,
-                available_time_type.available_time_max
-            FROM card_data, skill_data, probability_type, available_time_type
-            WHERE skill_data.id = ?
-                AND card_data.skill_id = ?
-                AND probability_type.probability_type = skill_data.probability_type
-                AND available_time_type.available_time_type = skill_data.available_time_type
-            """, params=[skill_id, skill_id], out_dict=True)
+        return get_master_snapshot().skill_data[skill_id]
 
     @classmethod
     def _fetch_boost_value_from_db(cls, skill_value: int) -> List[int]:
-        values = db.masterdb.execute_and_fetchone(
-            """
-            SELECT  sbt1.boost_value_1 as v0,
-                    sbt1.boost_value_2 as v1,
-                    sbt1.boost_value_3 as v2,
-                    sbt2.boost_value_2 as v3
-            FROM    skill_boost_type as sbt1,
-                    skill_boost_type as sbt2
-            WHERE   sbt1.skill_value = ?
-            AND     sbt1.target_type = 26
-            AND     sbt2.skill_value = ?
-            AND     sbt2.target_type = 31
-            """,
-            params=[skill_value, skill_value],
-            out_dict=True)
-        values = [values["v{}".format(_)] for _ in range(4)]
+        boost_values = get_master_snapshot().boost_values
+        values = list(boost_values[(skill_value, 26)]) + [boost_values[(skill_value, 31)][1]]
         values.insert(1, values[0])
         return values
 
@@ -228,17 +201,11 @@ class Skill:
             """, params=[custom_card_id], out_dict=True)
         if values['skill_type'] == 0:
             return
-        values['attribute'] = db.masterdb.execute_and_fetchone("SELECT attribute FROM card_data WHERE id = ?",
-                                                               [values['image_id']])[0]
-        values['available_time_max'] = db.masterdb.execute_and_fetchone("""
-            SELECT available_time_max FROM available_time_type WHERE available_time_type = ?
-            """, [values['available_time_type']])[0]
-        values['probability_max'] = db.masterdb.execute_and_fetchone("""
-            SELECT probability_max FROM probability_type WHERE probability_type = ?
-            """, [values['probability_type']])[0]
-        values['skill_trigger_type'], values['skill_trigger_value'] = db.masterdb.execute_and_fetchone("""
-            SELECT  skill_trigger_type, skill_trigger_value FROM skill_data WHERE skill_type = ?
-            """, params=[values['skill_type']])
+        snapshot = get_master_snapshot()
+        values['attribute'] = snapshot.card_data[values['image_id']]['attribute']
+        values['available_time_max'] = snapshot.available_time_max[values['available_time_type']]
+        values['probability_max'] = snapshot.probability_max[values['probability_type']]
+        values['skill_trigger_type'], values['skill_trigger_value'] = snapshot.skill_triggers[values['skill_type']]
         return values
 
     @classmethod
@@ -6,7 +6,7 @@ from typing import Union, Optional, List, Tuple
 import numpy as np
 import pyximport
 
-from db import db
+from db.master_snapshot import get_master_snapshot
 from exceptions import InvalidUnit
 from logic.card import Card
 from logic.search import card_query
@@ -237,11 +237,9 @@ class Unit(BaseUnit):
         self.motif_visual = self._get_motif_visual()
         self.motif_visual_trimmed = self.motif_visual // 1000
 
-        self._motif_values_wide = [_[0] for _ in
-                                   db.masterdb.execute_and_fetchall(
-                                       "SELECT type_01_value FROM skill_motif_value_grand")]
-        self._motif_values_grand = [_[0] for _ in
-                                    db.masterdb.execute_and_fetchall("SELECT type_01_value FROM skill_motif_value")]
+        snapshot = get_master_snapshot()
+        self._motif_values_wide = snapshot.motif_values_grand
+        self._motif_values_grand = snapshot.motif_values
 
         if self.motif_vocal_trimmed >= len(self._motif_values_wide):
             self.motif_vocal_trimmed = len(self._motif_values_wide) - 1
@@ -290,19 +288,9 @@ class Unit(BaseUnit):
             if card.subcolor is not None:
                 colors[card.subcolor.value] += 1
 
-        score_boost = db.masterdb.execute_and_fetchone("""
-            SELECT first_efficacy_value_main_attribute
-            FROM skill_dual_type_balance
-            WHERE all_member_count_with_guest = ?
-            AND attribute_match_count = ?
-            """, params=[member_count, colors[score_target]])[0]
-
-        combo_boost = db.masterdb.execute_and_fetchone("""
-            SELECT second_efficacy_value_main_attribute
-            FROM skill_dual_type_balance
-            WHERE all_member_count_with_guest = ?
-            AND attribute_match_count = ?
-            """, params=[member_count, colors[combo_target]])[0]
+        harmony_values = get_master_snapshot().harmony_values
+        score_boost = harmony_values[(member_count, colors[score_target])][0]
+        combo_boost = harmony_values[(member_count, colors[combo_target])][1]
 
         return score_boost, combo_boost
 
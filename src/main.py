@@ -7,6 +7,7 @@ from PyQt5.QtWidgets import QApplication
 
 import customlogger as logger
 import initializer
+from settings import EVENTBUS_STATS_INTERVAL
 
 logger.log_to_file()
 
@@ -35,9 +36,13 @@ def main():
     set_debug_flag()
 
     sys.excepthook = excepthook
+    if EVENTBUS_STATS_INTERVAL:
+        from gui.events.utils import eventbus
+        eventbus.eventbus.enable_instrumentation(EVENTBUS_STATS_INTERVAL)
     initializer.setup(True)
     from gui.main import setup_gui
 
     app, main = setup_gui(sys.argv)
     main.showMaximized()
+    initializer.run_deferred()
     app.exec_()
@@ -1,24 +1,67 @@
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from settings import MAX_DOWNLOAD_WORKERS
+from utils import storage
+
+ASSET_URL = "https://asset-starlight-stage.akamaized.net/dl"
+TIMEOUT = 60
+CHUNK_SIZE = 1 << 20
 
 _headers = {
     'X-Unity-Version': '2018.3.8f1',
     'Accept-Encoding': 'gzip',
 }
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
 
-def get_resources(data_type, resource_hash):
-    return requests.get(
-        "https://asset-starlight-stage.akamaized.net/dl/resources/{}/{}/{}".format(data_type, resource_hash[:2],
-                                                                                   resource_hash), headers=_headers)
+def get_session() -> requests.Session:
+    """
+    One session for all asset downloads so concurrent downloads reuse their connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(_headers)
+            adapter = HTTPAdapter(pool_connections=MAX_DOWNLOAD_WORKERS, pool_maxsize=MAX_DOWNLOAD_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
 
 
-def get_manifests():
+def get_resources(data_type, resource_hash, asset_url=ASSET_URL, stream=False):
+    return get_session().get(
+        "{}/resources/{}/{}/{}".format(asset_url, data_type, resource_hash[:2], resource_hash), timeout=TIMEOUT,
+        stream=stream)
+
+
+def get_manifests(stream=False):
     from network import kirara_query
     truth_version = kirara_query.get_truth_version()
-    return requests.get(
-        "https://asset-starlight-stage.akamaized.net/dl/{}/manifests/Android_AHigh_SHigh".format(truth_version),
-        headers=_headers)
+    return get_session().get("{}/{}/manifests/Android_AHigh_SHigh".format(ASSET_URL, truth_version), timeout=TIMEOUT,
+                             stream=stream)
+
+
+def get_db(resource_hash, asset_url=ASSET_URL, stream=False):
+    return get_resources('Generic', resource_hash, asset_url, stream)
 
 
-def get_db(resource_hash):
-    return get_resources('Generic', resource_hash)
+def save_response(response, path: Path) -> str:
+    """
+    Write the body of a streamed response to path chunk by chunk and return its md5.
+    """
+    response.raise_for_status()
+    digest = hashlib.md5()
+    with response, storage.get_writer(path, 'wb') as fwb:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            digest.update(chunk)
+            fwb.write(chunk)
+    return digest.hexdigest()
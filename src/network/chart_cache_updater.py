@@ -1,22 +1,24 @@
 import logging
+import os
 import sqlite3
+import time
 from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import StringIO
 
-import numpy as np
 import pandas as pd
 import requests
 
 import customlogger as logger
 from db import db
-from logic.live import classify_note_vectorized
-from logic.skill import COMMON_TIMERS
+from logic.chart_features import extract_chart_features
 from network import meta_updater
-from settings import REMOTE_TRANSLATED_SONG_URL, MUSICSCORES_PATH
-from static.live_values import WEIGHT_RANGE
-from static.note_type import NoteType
+from settings import REMOTE_TRANSLATED_SONG_URL, MAX_WORKERS
 
 BLACKLIST = "1901,1902,1903,1904,90001"
+# Process startup is not worth it for fewer charts
+MIN_CHARTS_PER_POOL = 16
 
 
 def _check_remote_cache(url):
@@ -27,9 +29,8 @@ def _check_remote_cache(url):
         return
     df = pd.read_csv(StringIO(response.content.decode("utf-8")))
     logger.debug("Remote live detail cache found at {}, {} rows".format(url, len(df)))
-    for _, row in df.iterrows():
-        _insert_into_live_detail_cache(row)
-    db.cachedb.commit()
+    with db.cachedb.transaction():
+        _insert_into_live_detail_cache(df[LIVE_DETAIL_CACHE_COLUMNS].astype(object).to_dict("records"))
 
 
 def _get_translated_name_df():
@@ -40,67 +41,68 @@ def _get_translated_name_df():
     }
 
 
+LIVE_DIFFICULTY_KEYS = ["d1", "d2", "d3", "d4", "d5", "d6", "d11", "d12", "d21", "d22", "d101"]
+
+
 def _get_song_list():
     translated_names = _get_translated_name_df()
 
     db.masterdb.execute("""ATTACH DATABASE "{}" AS cachedb""".format(meta_updater.get_cachedb_path()))
     db.masterdb.commit()
 
-    res = db.masterdb.execute_and_fetchall("SELECT id, name FROM music_data WHERE id NOT IN ({})".format(BLACKLIST))
-    song_dict = OrderedDict()
-    for song_id, song_name in res:
-        song_name = song_name.replace("\\n", "")
-        if song_name not in song_dict:
-            song_dict[song_name] = {
-                'song_id_list': list()
-            }
-        song_dict[song_name]['song_id_list'].append(song_id)
+    lives = pd.DataFrame(db.masterdb.execute_and_fetchall("""
+                    SELECT
+                        music_data.id AS song_id,
+                        music_data.name AS song_name,
+                        live_data.id AS id,
+                        difficulty_1    AS d1,
+                        difficulty_2    AS d2,
+                        difficulty_3    AS d3,
+                        difficulty_4    AS d4,
+                        difficulty_5    AS d5,
+                        difficulty_6    AS d6,
+                        difficulty_11   AS d11,
+                        difficulty_12   AS d12,
+                        difficulty_21   AS d21,
+                        difficulty_22   AS d22,
+                        difficulty_101  AS d101,
+                        CASE
+                            WHEN event_type == 1
+                            THEN "Atapon"
+                            WHEN event_type == 3
+                            THEN "Groove"
+                            WHEN event_type == 5
+                            THEN "Parade"
+                            WHEN event_type == 7
+                            THEN "Carnival"
+                            ELSE ""
+                        END event_type,
+                        live_data.type AS color
+                    FROM music_data
+                    INNER JOIN live_data ON live_data.music_data_id = music_data.id
+                    WHERE music_data.id NOT IN ({})
+                    ORDER BY music_data.id, live_data.id
+                """.format(BLACKLIST), out_dict=True))
+    lives['song_name'] = lives['song_name'].str.replace("\\n", "", regex=False)
+    performers = defaultdict(list)
+    for song_id, full_name in db.masterdb.execute_and_fetchall("""
+                    SELECT
+                        music_vocalist.music_data_id,
+                        cc.full_name
+                    FROM music_vocalist
+                    LEFT JOIN cachedb.chara_cache cc ON cc.chara_id = music_vocalist.chara_id
+                """):
+        performers[song_id].append(full_name)
     carnival_set_list = _get_carnival_set_list()
-    for song_name, value in song_dict.items():
-        live_list = list()
-        for song_id in value['song_id_list']:
-            query_res = db.masterdb.execute_and_fetchall("""
-                            SELECT
-                                id AS id,
-                                difficulty_1    AS d1,
-                                difficulty_2    AS d2,
-                                difficulty_3    AS d3,
-                                difficulty_4    AS d4,
-                                difficulty_5    AS d5,
-                                difficulty_6    AS d6,
-                                difficulty_11   AS d11,
-                                difficulty_12   AS d12,
-                                difficulty_21   AS d21,
-                                difficulty_22   AS d22,
-                                difficulty_101  AS d101,
-                                CASE
-                                    WHEN event_type == 1
-                                    THEN "Atapon"
-                                    WHEN event_type == 3
-                                    THEN "Groove"
-                                    WHEN event_type == 5
-                                    THEN "Parade"
-                                    WHEN event_type == 7
-                                    THEN "Carnival"
-                                    ELSE ""
-                                END event_type,
-                                type AS color
-                                FROM live_data
-                                WHERE music_data_id = ?
-                        """, (song_id,), out_dict=True)
-            live_list.extend(query_res)
-        live_dict = _merge_live_list(live_list)
-        for k, v in live_dict.items():
-            value[k] = v
-        value['sort'] = min(value.pop('song_id_list'))
-        performers = db.masterdb.execute_and_fetchall("""
-                        SELECT
-                            cc.full_name
-                        FROM music_vocalist
-                        LEFT JOIN cachedb.chara_cache cc ON cc.chara_id = music_vocalist.chara_id
-                        WHERE music_data_id = ?
-                    """, (value['sort'],))
-        value['performers'] = ", ".join([_[0] for _ in performers])
+
+    song_dict = OrderedDict()
+    live_columns = ["id"] + LIVE_DIFFICULTY_KEYS + ["event_type", "color"]
+    for song_name, song_lives in lives.groupby("song_name", sort=False):
+        # Lives of every music_data sharing the name, in music_data order, so index 0 is from the first release
+        live_list = song_lives[live_columns].astype(object).to_dict("records")
+        value = _merge_live_list(live_list)
+        value['sort'] = int(song_lives['song_id'].min())
+        value['performers'] = ", ".join(performers[value['sort']])
         value['special_keys'] = _get_special_keys(value['sort'])
         for live_id in [_['id'] for _ in live_list]:
             if live_id in carnival_set_list.keys():
@@ -113,6 +115,7 @@ def _get_song_list():
             value['name'] = translated_names[value['sort']]
         else:
             value['name'] = song_name
+        song_dict[song_name] = value
     db.masterdb.execute("DETACH DATABASE cachedb")
     db.masterdb.commit()
     return song_dict
@@ -178,7 +181,7 @@ def _merge_live_list(live_list):
             event = live_list[0]
     res_dict = OrderedDict()
     res_dict['diff'] = list()
-    for diff in ["d1", "d2", "d3", "d4", "d5", "d6", "d11", "d12", "d21", "d22", "d101"]:
+    for diff in LIVE_DIFFICULTY_KEYS:
         if release[diff] == 0:
             live_detail_id = event[diff]
             live_id = event['id']
@@ -192,6 +195,7 @@ def _merge_live_list(live_list):
 
 
 def _expand_song_list(song_list):
+    levels = dict(db.masterdb.execute_and_fetchall("SELECT id, level_vocal FROM live_detail"))
     res_dict = dict()
     for value in song_list.values():
         for diff, live_detail_id, live_id in value['diff']:
@@ -200,9 +204,7 @@ def _expand_song_list(song_list):
             res_dict[live_detail_id]['live_detail_id'] = live_detail_id
             res_dict[live_detail_id]['live_id'] = live_id
             res_dict[live_detail_id]['diff'] = int(diff[1:])
-            res_dict[live_detail_id]['level'] \
-                = db.masterdb.execute_and_fetchone("SELECT level_vocal FROM live_detail WHERE live_detail.id = ?",
-                                                   (live_detail_id,))[0]
+            res_dict[live_detail_id]['level'] = levels[live_detail_id]
     return res_dict
 
 
@@ -236,6 +238,12 @@ def initialize_score_db():
             Timer_13h REAL NOT NULL
         )
     """)
+    db.cachedb.execute("""
+        CREATE TABLE IF NOT EXISTS live_detail_chart_hash (
+            live_detail_id INTEGER UNIQUE PRIMARY KEY,
+            chart_hash TEXT NOT NULL
+        )
+    """)
     db.cachedb.commit()
 
 
@@ -248,108 +256,108 @@ def has_cached_live_details():
         return False
 
 
-def _insert_into_live_detail_cache(hashable):
-    db.cachedb.execute("""
-            INSERT OR IGNORE INTO live_detail_cache( live_detail_id, live_id, sort, color, performers, special_keys,
+LIVE_DETAIL_CACHE_COLUMNS = ["live_detail_id", "live_id", "sort", "color", "performers", "special_keys",
+                             "jp_name", "name", "difficulty", "level", "duration", "bpm", "Tap", "Long", "Flick",
+                             "Slide", "Timer_7h", "Timer_9h", "Timer_11h", "Timer_12m", "Timer_6m", "Timer_7m",
+                             "Timer_9m", "Timer_11m", "Timer_13h"]
+
+
+def _insert_into_live_detail_cache(hashables, replace=False):
+    db.cachedb.executemany("""
+            INSERT OR {} INTO live_detail_cache( live_detail_id, live_id, sort, color, performers, special_keys,
              jp_name, name, difficulty, level, duration, bpm, Tap, Long, Flick, Slide,
              Timer_7h, Timer_9h, Timer_11h, Timer_12m, Timer_6m, Timer_7m, Timer_9m, Timer_11m, Timer_13h)
             VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """, [
-        hashable['live_detail_id'],
-        hashable['live_id'],
-        hashable['sort'],
-        hashable['color'],
-        hashable['performers'],
-        hashable['special_keys'],
-        hashable['jp_name'],
-        hashable['name'],
-        hashable['difficulty'],
-        hashable['level'],
-        hashable['duration'],
-        hashable['bpm'],
-        hashable['Tap'],
-        hashable['Long'],
-        hashable['Flick'],
-        hashable['Slide'],
-        hashable['Timer_7h'],
-        hashable['Timer_9h'],
-        hashable['Timer_11h'],
-        hashable['Timer_12m'],
-        hashable['Timer_6m'],
-        hashable['Timer_7m'],
-        hashable['Timer_9m'],
-        hashable['Timer_11m'],
-        hashable['Timer_13h']
-    ])
+        """.format("REPLACE" if replace else "IGNORE"),
+        [[hashable[column] for column in LIVE_DETAIL_CACHE_COLUMNS] for hashable in hashables])
 
 
 def _overwrite_song_name(expanded_song_list):
-    for live_detail_id, song_data in expanded_song_list.items():
-        db.cachedb.execute("""
+    with db.cachedb.transaction():
+        db.cachedb.executemany("""
                     UPDATE live_detail_cache
                     SET name = ?, special_keys = ?
                     WHERE live_detail_id = ?
-                """, [song_data['name'], song_data['special_keys'], live_detail_id])
-    db.cachedb.commit()
+                """, [[song_data['name'], song_data['special_keys'], live_detail_id]
+                      for live_detail_id, song_data in expanded_song_list.items()])
 
 
-def _is_active(time, interval, duration, last_note):
-    return (time > interval) & (time % interval > 0) & (time % interval <= duration) \
-           & (time // interval * interval <= last_note - 3)
+def _extract_all_chart_features(charts):
+    """
+    Features of every (live_id, difficulty) in charts, in the same order, split over a process pool.
+    """
+    if len(charts) < MIN_CHARTS_PER_POOL:
+        return [extract_chart_features(*chart) for chart in charts]
+    workers = max(1, min(MAX_WORKERS, os.cpu_count() or 1))
+    live_ids, difficulties = zip(*charts)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(extract_chart_features, live_ids, difficulties,
+                                 chunksize=max(1, len(charts) // (workers * 4))))
+    except (BrokenProcessPool, OSError) as e:
+        logger.info("Process pool unavailable, extracting chart features in this process: {}".format(e))
+        return [extract_chart_features(*chart) for chart in charts]
+
+
+def _get_chart_hashes():
+    # A chart changes only with its musicscore, so the musicscore hash stands in for the chart's
+    try:
+        score_hashes = db.cachedb.execute_and_fetchall("SELECT score_id, score_hash FROM score_cache")
+    except sqlite3.OperationalError:
+        return dict()
+    return {int(score_id[len("musicscores_m"):]): score_hash for score_id, score_hash in score_hashes}
 
 
 def update_cache_scores():
-    if not has_cached_live_details():
-        initialize_score_db()
+    start_time = time.perf_counter()
+    initialize_score_db()
     song_list = _get_song_list()
     expanded_song_list = _expand_song_list(song_list)
-    cached_live_detail_ids = {_[0] for _ in
-                              db.cachedb.execute_and_fetchall("SELECT live_detail_id FROM live_detail_cache")}
-    new_live_detail_ids = set(expanded_song_list.keys()).difference(cached_live_detail_ids)
+    logger.debug("Song catalog of {} songs, {} charts built in {:.3f}s".format(
+        len(song_list), len(expanded_song_list), time.perf_counter() - start_time))
+    chart_hashes = _get_chart_hashes()
+    cached_hashes = dict(db.cachedb.execute_and_fetchall("""
+        SELECT live_detail_cache.live_detail_id, live_detail_chart_hash.chart_hash
+        FROM live_detail_cache
+        LEFT JOIN live_detail_chart_hash ON live_detail_chart_hash.live_detail_id = live_detail_cache.live_detail_id
+    """))
+    new_live_detail_ids = set(expanded_song_list.keys()).difference(cached_hashes.keys())
+    changed_live_detail_ids = {
+        ldid for ldid, cached_hash in cached_hashes.items()
+        if ldid in expanded_song_list and cached_hash is not None
+        and chart_hashes.get(expanded_song_list[ldid]['live_id'], cached_hash) != cached_hash
+    }
     logger.debug("Uncached live detail IDs: {}".format(new_live_detail_ids))
-    for ldid in new_live_detail_ids:
+    logger.debug("Live detail IDs with changed charts: {}".format(changed_live_detail_ids))
+
+    stale_live_detail_ids = sorted(new_live_detail_ids.union(changed_live_detail_ids))
+    bpms = dict(db.masterdb.execute_and_fetchall("SELECT id, bpm FROM music_data"))
+    all_features = _extract_all_chart_features([
+        (expanded_song_list[ldid]['live_id'], expanded_song_list[ldid]['diff']) for ldid in stale_live_detail_ids
+    ])
+    new_live_details = list()
+    for ldid, features in zip(stale_live_detail_ids, all_features):
         live_data = expanded_song_list[ldid]
-        with db.CustomDB(MUSICSCORES_PATH / "musicscores_m{:03d}.db".format(live_data['live_id'])) as score_conn:
-            try:
-                score = score_conn.execute_and_fetchone(
-                    """
-                    SELECT * FROM blobs WHERE name LIKE "musicscores/m{:03d}/{:d}_{:d}.csv"
-                    """.format(live_data['live_id'], live_data['live_id'], live_data['diff'])
-                )[1]
-            except TypeError:
-                logger.debug("Cannot find chart for live detail ID {} difficulty {}".format(ldid, live_data["diff"]))
-                continue
-        notes_data = pd.read_csv(StringIO(score.decode()))
-        live_data['duration'] = notes_data.iloc[-1]['sec']
-        live_data['bpm'] = db.masterdb.execute_and_fetchall("SELECT bpm FROM music_data WHERE id = ?",
-                                                            [live_data['sort']])[0][0]
-        if live_data['diff'] == 6:
-            notes_data = notes_data[(notes_data['type'] < 8) &
-                                    ((notes_data['visible'].isna()) | (notes_data['visible'] >= 0))
-                                    ].reset_index(drop=True)
-        else:
-            notes_data = notes_data[notes_data["type"] < 8].reset_index(drop=True)
-        notes_data['note_type'] = classify_note_vectorized(notes_data)
-        note_count = dict(notes_data['note_type'].value_counts())
-        for note_type in NoteType:
-            key_str = note_type.name.capitalize()
-            if note_type in note_count:
-                live_data[key_str] = int(note_count[note_type])
-            else:
-                live_data[key_str] = 0
+        if features is None:
+            logger.debug("Cannot find chart for live detail ID {} difficulty {}".format(ldid, live_data["diff"]))
+            continue
+        live_data.update(features)
+        live_data['bpm'] = bpms[live_data['sort']]
         live_data['difficulty'] = live_data['diff']
-        total_notes = len(notes_data)
-        combo_thresholds = (total_notes * WEIGHT_RANGE[:, 0] / 100).astype(int)
-        # Correct for deresute's rounding method
-        combo_thresholds[1:-1] -= 1
-        multipliers = np.repeat(WEIGHT_RANGE[:-1, 1], combo_thresholds[1:] - combo_thresholds[:-1])
-        for timer in COMMON_TIMERS:
-            live_data['Timer_{}{}'.format(timer[0], timer[2])] = multipliers[
-                _is_active(notes_data['sec'], timer[0], timer[1], notes_data.iloc[-1]['sec'])
-            ].sum() / multipliers.sum()
-        _insert_into_live_detail_cache(live_data)
-    _overwrite_song_name(expanded_song_list)
-    db.cachedb.commit()
+        new_live_details.append(live_data)
+
+    # Rows without a hash came from the remote cache, they are trusted to match the current charts
+    hashed_live_detail_ids = [live_data['live_detail_id'] for live_data in new_live_details]
+    hashed_live_detail_ids += [ldid for ldid, cached_hash in cached_hashes.items()
+                               if cached_hash is None and ldid in expanded_song_list]
+    with db.cachedb.transaction():
+        _insert_into_live_detail_cache(new_live_details, replace=True)
+        db.cachedb.executemany("""
+            INSERT OR REPLACE INTO live_detail_chart_hash (live_detail_id, chart_hash) VALUES (?,?)
+        """, [(ldid, chart_hashes[expanded_song_list[ldid]['live_id']]) for ldid in hashed_live_detail_ids
+              if expanded_song_list[ldid]['live_id'] in chart_hashes])
+        _overwrite_song_name(expanded_song_list)
+    logger.debug("Live detail cache updated in {:.3f}s".format(time.perf_counter() - start_time))
 
 
 if __name__ == '__main__':
@@ -1,52 +1,174 @@
+import json
 import os
 import time
 import zipfile
-from concurrent.futures.thread import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, List, Optional, Set
 
 import requests
 from PIL import Image
 
 import customlogger as logger
+from db import db
 from network.kirara_query import _base_query
-from settings import IMAGE_PATH, IMAGE_PATH32, IMAGE_PATH64, ZIP_PATH, MAX_WORKERS
-from utils import storage
+from settings import IMAGE_PATH, IMAGE_PATH32, IMAGE_PATH64, ZIP_PATH, ICON_MANIFEST_PATH, MAX_WORKERS, \
+    MAX_DOWNLOAD_WORKERS
+from utils import storage, icon_atlas
 
 FORMAT = "https://hidamarirhodonite.kirara.ca/icon_card/{:06d}.png"
+# Icons completed between two progress callbacks and manifest saves
+PROGRESS_BATCH = 50
+
+
+def _get_paths(card_id):
+    return (IMAGE_PATH / "{:06d}.png".format(card_id),
+            IMAGE_PATH32 / "{:06d}.jpg".format(card_id),
+            IMAGE_PATH64 / "{:06d}.jpg".format(card_id))
+
+
+def _download_icon(card_id, sleep=0.1) -> bool:
+    path, _, _ = _get_paths(card_id)
+    if path.exists():
+        return True
+    time.sleep(sleep)
+    r = requests.get(FORMAT.format(card_id), stream=True)
+    if r.status_code != 200:
+        return False
+    temp_path = path.parent / "{}.part".format(path.name)
+    with storage.get_writer(temp_path, 'wb') as fwb:
+        for chunk in r.iter_content(1 << 16):
+            fwb.write(chunk)
+    os.replace(temp_path, path)
+    return True
+
+
+def _resize_icon(card_id):
+    # Runs in worker processes
+    path, path32, path64 = _get_paths(card_id)
+    img = Image.open(str(path)).convert('RGB')
+    if not path32.exists():
+        img.resize((32, 32), Image.LANCZOS).save(str(path32), format='JPEG')
+    if not path64.exists():
+        img.resize((64, 64), Image.LANCZOS).save(str(path64), format='JPEG')
 
 
 def update_image(card_id, sleep=0.1):
-    path = IMAGE_PATH / "{:06d}.png".format(card_id)
-    path32 = IMAGE_PATH32 / "{:06d}.jpg".format(card_id)
-    path64 = IMAGE_PATH64 / "{:06d}.jpg".format(card_id)
-    if not storage.exists(path):
-        time.sleep(sleep)
-        r = requests.get(FORMAT.format(card_id))
-        if r.status_code == 200:
-            with storage.get_writer(path, 'wb') as fwb:
-                for chunk in r:
-                    fwb.write(chunk)
-    if not path64.exists() and not path32.exists():
-        img = Image.open(str(path)).convert('RGB')
-        if not path32.exists():
-            img.resize((32, 32), Image.ANTIALIAS).save(str(path32), format='JPEG')
-        if not path64.exists():
-            img.resize((64, 64), Image.ANTIALIAS).save(str(path64), format='JPEG')
+    if _download_icon(card_id, sleep):
+        _resize_icon(card_id)
+
+
+def _load_manifest() -> Set[int]:
+    """
+    Card IDs whose icons are complete in every size. Built once from the icon directories if there is no manifest.
+    """
+    try:
+        with storage.get_reader(ICON_MANIFEST_PATH, 'r') as fr:
+            return set(json.load(fr)['icons'])
+    except (OSError, ValueError, KeyError):
+        pass
+    names = [{int(_.split(".")[0]) for _ in os.listdir(path) if _.split(".")[0].isdigit()} if path.exists() else set()
+             for path in (IMAGE_PATH, IMAGE_PATH32, IMAGE_PATH64)]
+    return names[0] & names[1] & names[2]
+
+
+def _save_manifest(icons: Set[int]):
+    temp_path = ICON_MANIFEST_PATH.parent / "{}.part".format(ICON_MANIFEST_PATH.name)
+    with storage.get_writer(temp_path, 'w') as fw:
+        json.dump({'icons': sorted(icons)}, fw)
+    os.replace(temp_path, ICON_MANIFEST_PATH)
+
+
+def _get_priority_card_ids() -> Set[int]:
+    try:
+        return {_[0] for _ in db.cachedb.execute_and_fetchall("SELECT card_id FROM owned_card WHERE number > 0")}
+    except Exception as e:
+        logger.debug("Failed to read owned cards for icon priority: {}".format(e))
+        return set()
+
+
+def sync_icons(on_progress: Callable[[List[int], int, int], None] = None, sleep=0.1,
+               card_ids: Optional[Iterable[int]] = None):
+    """
+    Download and resize the icons missing from the manifest, owned cards first.
+    Downloads run on threads and resizing on a process pool. on_progress(card_ids, done, total) is called from this
+    thread with the icons completed since the last call.
+    """
+    prepare_icon_directories()
+    if card_ids is None:
+        card_data = _base_query("list/card_t")['result']
+        card_ids = [int(card['id']) for card in card_data]
+        card_ids += [_ + 1 for _ in card_ids]
+    icons = _load_manifest()
+    priority = _get_priority_card_ids()
+    missing = sorted(set(card_ids).difference(icons), key=lambda card_id: (card_id not in priority, card_id))
+    logger.info("{} of {} card icons are missing".format(len(missing), len(set(card_ids))))
+    if not missing:
+        _save_manifest(icons)
+        icon_atlas.build_atlases()
+        return
+
+    total = len(set(card_ids))
+    done_count = total - len(missing)
+    completed = list()
+
+    def publish():
+        _save_manifest(icons)
+        if on_progress is not None:
+            on_progress(list(completed), done_count, total)
+        completed.clear()
+
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as downloader, \
+            ProcessPoolExecutor(max_workers=max(1, min(MAX_WORKERS, os.cpu_count() or 1))) as resizer:
+        # Submission order is priority order, both executors start work first in first out
+        futures = {downloader.submit(_download_icon, card_id, sleep): ("download", card_id) for card_id in missing}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, card_id = futures.pop(future)
+                try:
+                    if stage == "download" and future.result():
+                        resize_future = resizer.submit(_resize_icon, card_id)
+                        futures[resize_future] = ("resize", card_id)
+                        pending.add(resize_future)
+                        continue
+                    if stage == "resize":
+                        future.result()
+                        icons.add(card_id)
+                        completed.append(card_id)
+                    else:
+                        logger.debug("No icon for card {}".format(card_id))
+                except BrokenProcessPool:
+                    logger.debug("Process pool unavailable, resizing icon {} in this process".format(card_id))
+                    try:
+                        _resize_icon(card_id)
+                        icons.add(card_id)
+                        completed.append(card_id)
+                    except Exception as e:
+                        logger.debug("Failed to get icon {}: {}".format(card_id, e))
+                except Exception as e:
+                    logger.debug("Failed to get icon {}: {}".format(card_id, e))
+                done_count += 1
+                if len(completed) >= PROGRESS_BATCH:
+                    publish()
+    publish()
+    icon_atlas.build_atlases()
+    logger.info("Card icons updated")
+
+
+def prepare_icon_directories():
+    """
+    Extract the bundled icons and create the icon directories, the profile lists them before icons are synced.
+    """
+    _try_extract_cache()
+    for path in (IMAGE_PATH, IMAGE_PATH32, IMAGE_PATH64):
+        path.mkdir(parents=True, exist_ok=True)
 
 
 def update_all(sleep=0.1):
     logger.info("Updating images, please wait...")
-    _try_extract_cache()
-    if not IMAGE_PATH64.exists():
-        IMAGE_PATH64.mkdir()
-    if not IMAGE_PATH32.exists():
-        IMAGE_PATH32.mkdir()
-    card_data = _base_query("list/card_t")['result']
-    logger.debug("Getting icons for {} cards".format(len(card_data)))
-    card_ids = [int(card['id']) for card in card_data]
-    card_ids_plus = [_ + 1 for _ in card_ids]
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        for card_id in card_ids + card_ids_plus:
-            executor.submit(update_image, card_id, sleep)
+    sync_icons(sleep=sleep)
 
 
 def _try_extract_cache():
@@ -54,6 +176,3 @@ def _try_extract_cache():
         with zipfile.ZipFile(ZIP_PATH, 'r') as zip_ref:
             zip_ref.extractall(IMAGE_PATH)
         os.remove(ZIP_PATH)
-
-
-update_all(0.1)
@@ -5,15 +5,22 @@ import customlogger as logger
 from network import cgss_query
 from settings import *
 from utils import storage
-from utils.misc import decompress
+from utils.misc import decompress_file
+
+
+def _download_and_decompress(response, path):
+    # The old file stays usable until the new one is fully written and swapped in
+    compressed_path = path.parent / "{}.lz4.part".format(path.name)
+    try:
+        cgss_query.save_response(response, compressed_path)
+        decompress_file(compressed_path, path)
+    finally:
+        compressed_path.unlink(missing_ok=True)
 
 
 def _update_manifest():
     logger.debug("Updating manifest.db")
-    manifest_response = cgss_query.get_manifests()
-
-    with storage.get_writer(MANIFEST_PATH, 'wb') as fwb:
-        fwb.write(decompress(manifest_response.content))
+    _download_and_decompress(cgss_query.get_manifests(stream=True), MANIFEST_PATH)
     logger.info("manifest.db updated")
 
 
@@ -24,12 +31,9 @@ def _update_masterdb():
 
     manifest_c.execute('SELECT hash FROM manifests WHERE name="master.mdb"')
     master_hash = manifest_c.fetchone()[0]
-    master_response = cgss_query.get_db(master_hash)
-
-    with storage.get_writer(MASTERDB_PATH, 'wb') as fwb:
-        fwb.write(decompress(master_response.content))
     manifest_c.close()
     manifest_conn.close()
+    _download_and_decompress(cgss_query.get_db(master_hash, stream=True), MASTERDB_PATH)
     logger.info("master.db updated")
 
 
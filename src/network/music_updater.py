@@ -1,28 +1,78 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
 
 import customlogger as logger
-from db import db
+from db import db, chart_store
 from network import cgss_query
 from network import meta_updater
-from settings import MANIFEST_PATH, MUSICSCORES_PATH
+from settings import MANIFEST_PATH, MUSICSCORES_PATH, CHART_STORE_PATH, MAX_DOWNLOAD_WORKERS
 from utils import storage
-from utils.misc import decompress
+from utils.misc import decompress_file
 
 
-def _score_cache_db_exists():
-    return db.cachedb.execute_and_fetchone("""
-        SELECT name FROM sqlite_master WHERE type='table' AND name='score_cache'
-    """)
-
-
-def _initialize_score_cache_db():
-    db.cachedb.execute("""
+def _initialize_score_cache_db(conn: db.CustomDB):
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS score_cache (
             score_id TEXT UNIQUE PRIMARY KEY,
             score_hash TEXT NOT NULL
         ) 
     """)
-    db.cachedb.commit()
+    conn.commit()
+
+
+def _download_musicscore(musicscore_name: str, musicscore_hash: str, destination: Path, asset_url: str):
+    compressed_path = destination / "{}.bdb.part".format(musicscore_name)
+    try:
+        content_hash = cgss_query.save_response(cgss_query.get_db(musicscore_hash, asset_url, stream=True),
+                                                compressed_path)
+        # Manifest hashes are the md5 of the compressed asset
+        if content_hash != musicscore_hash:
+            raise ValueError("Hash mismatch for {}: expected {}, got {}".format(musicscore_name, musicscore_hash,
+                                                                                 content_hash))
+        # Decompressed through a temporary file so an interrupted download never leaves a truncated musicscore
+        decompress_file(compressed_path, destination / "{}.db".format(musicscore_name))
+    finally:
+        compressed_path.unlink(missing_ok=True)
+
+
+def download_musicscores(musicscores: Dict[str, str], destination: Path = MUSICSCORES_PATH,
+                         conn: db.CustomDB = None, asset_url: str = cgss_query.ASSET_URL,
+                         max_workers: int = MAX_DOWNLOAD_WORKERS) -> List[str]:
+    """
+    Download musicscores by name -> manifest hash over a shared session, at most max_workers at a time.
+    Each one is recorded in score_cache as soon as it is written, so an interrupted update resumes where it stopped.
+    Returns the names that failed, they are left for the next update.
+    """
+    if conn is None:
+        conn = db.cachedb
+    _initialize_score_cache_db(conn)
+    for temp_path in destination.glob("*.part"):
+        temp_path.unlink()
+
+    failed = list()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_download_musicscore, musicscore_name, musicscore_hash, destination, asset_url):
+                (musicscore_name, musicscore_hash)
+            for musicscore_name, musicscore_hash in musicscores.items()
+        }
+        for idx, future in enumerate(as_completed(futures)):
+            musicscore_name, musicscore_hash = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.debug("Failed to download {}: {}".format(musicscore_name, e))
+                failed.append(musicscore_name)
+                continue
+            conn.execute("""
+                INSERT OR REPLACE INTO score_cache (score_id, score_hash)
+                VALUES (?,?)
+            """, [musicscore_name, musicscore_hash])
+            conn.commit()
+            logger.debug("Downloaded {} ({}/{})".format(musicscore_name, idx + 1, len(futures)))
+    return failed
 
 
 def update_musicscores():
@@ -40,25 +90,23 @@ def update_musicscores():
             """)
         all_musicscores = {_[0].split(".")[0]: _[1] for _ in all_musicscores}
 
-    if not _score_cache_db_exists():
-        _initialize_score_cache_db()
-        new_scores = all_musicscores.keys()
-        updated_scores = set()
-    else:
-        scores_meta = db.cachedb.execute_and_fetchall("SELECT score_id, score_hash FROM score_cache")
-        scores_meta = {_: __ for _, __ in scores_meta}
-        deleted_scores = set(scores_meta.keys()).difference(all_musicscores.keys())
-        if len(deleted_scores) > 0:
-            logger.info("Found {} defunct musicscores, removing them...".format(len(deleted_scores)))
+    _initialize_score_cache_db(db.cachedb)
+    scores_meta = db.cachedb.execute_and_fetchall("SELECT score_id, score_hash FROM score_cache")
+    scores_meta = {_: __ for _, __ in scores_meta}
+    deleted_scores = set(scores_meta.keys()).difference(all_musicscores.keys())
+    if len(deleted_scores) > 0:
+        logger.info("Found {} defunct musicscores, removing them...".format(len(deleted_scores)))
+        with db.cachedb.transaction():
             for deleted_score in deleted_scores:
                 path = MUSICSCORES_PATH / "{}.db".format(deleted_score)
-                path.unlink()
-        new_scores = set(all_musicscores.keys()).difference(scores_meta.keys())
-        updated_scores = [
-            _
-            for _ in set(all_musicscores.keys()).intersection(scores_meta.keys())
-            if scores_meta[_] != all_musicscores[_]
-        ]
+                path.unlink(missing_ok=True)
+                db.cachedb.execute("DELETE FROM score_cache WHERE score_id = ?", [deleted_score])
+    new_scores = set(all_musicscores.keys()).difference(scores_meta.keys())
+    updated_scores = [
+        _
+        for _ in set(all_musicscores.keys()).intersection(scores_meta.keys())
+        if scores_meta[_] != all_musicscores[_]
+    ]
     logger.info(
         "Found {} musicscores, {} of them are new, {} are updated...".format(len(all_musicscores), len(new_scores),
                                                                              len(updated_scores)))
@@ -66,17 +114,28 @@ def update_musicscores():
     if len(new_scores) + len(updated_scores) > 50:
         logger.info("It will take some time to download, please wait...")
 
-    for musicscore_name in set(new_scores).union(set(updated_scores)):
-        musicscore_hash = all_musicscores[musicscore_name]
-        musicscore_response = cgss_query.get_db(musicscore_hash)
-        with storage.get_writer(MUSICSCORES_PATH / "{}.db".format(musicscore_name), 'wb') as fwb:
-            fwb.write(decompress(musicscore_response.content))
-        db.cachedb.execute("""
-            INSERT OR REPLACE INTO score_cache (score_id, score_hash)
-            VALUES (?,?)
-        """, [musicscore_name, musicscore_hash])
-    db.cachedb.commit()
-    logger.info("All musicscores updated")
+    failed = download_musicscores({
+        musicscore_name: all_musicscores[musicscore_name]
+        for musicscore_name in set(new_scores).union(set(updated_scores))
+    })
+    if len(failed) > 0:
+        logger.error("Failed to download {} musicscores, they will be retried on the next update".format(len(failed)))
+    else:
+        logger.info("All musicscores updated")
+
+    if len(new_scores) + len(updated_scores) > len(failed) or not storage.exists(CHART_STORE_PATH):
+        _update_chart_store()
+
+
+def _update_chart_store():
+    try:
+        chart_store.build_chart_store()
+    except Exception as e:
+        # Charts are read from the musicscores directly without a store, never keep a stale one around
+        logger.error("Failed to build chart store: {}".format(e))
+        chart_store.close_chart_store()
+        if storage.exists(CHART_STORE_PATH):
+            CHART_STORE_PATH.unlink()
 
 
 if __name__ == '__main__':
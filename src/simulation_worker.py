@@ -0,0 +1,194 @@
+"""
+Runs calculator simulations in worker processes, so rows run in parallel and the GUI process only dispatches jobs and
+renders results. Jobs and results cross the process boundary as plain data, cards are rebuilt from their IDs.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Union
+
+import numpy as np
+
+import customlogger as logger
+from logic.card import Card
+from logic.grandlive import GrandLive
+from logic.grandunit import GrandUnit
+from logic.live import Live
+from logic.unit import Unit
+from simulator import Simulator, SimulationResult, AutoSimulationResult, get_default_workers
+from static.color import Color
+
+# What the edit card tab can change on top of a card from its ID besides its colors, see Card.clone_card
+_CARD_FIELDS = ("base_vo", "base_da", "base_vi", "base_li", "vo_pots", "da_pots", "vi_pots", "li_pots", "sk_pots",
+                "star")
+_SKILL_FIELDS = ("duration", "interval", "skill_level")
+
+
+def get_card_spec(card: Optional[Card]) -> Optional[dict]:
+    if card is None:
+        return None
+    spec = {field: getattr(card, field) for field in _CARD_FIELDS}
+    spec.update({field: getattr(card.sk, field) for field in _SKILL_FIELDS})
+    spec["card_id"] = card.card_id
+    spec["color"] = card.color.value
+    spec["subcolor"] = card.subcolor.value if card.subcolor is not None else None
+    return spec
+
+
+def card_from_spec(spec: Optional[dict]) -> Optional[Card]:
+    if spec is None:
+        return None
+    card = Card.from_id(spec["card_id"])
+    for field in _CARD_FIELDS:
+        setattr(card, field, spec[field])
+    for field in _SKILL_FIELDS:
+        setattr(card.sk, field, spec[field])
+    card.color = Color(spec["color"])
+    card.sk.color = Color(spec["color"])
+    card.subcolor = Color(spec["subcolor"]) if spec["subcolor"] is not None else None
+    card.refresh_values()
+    return card
+
+
+class SimulationJob:
+    """
+    Everything a calculator row needs simulated, cards are specs from get_card_spec with potentials already applied.
+    """
+    cards: List[Optional[dict]]
+    score_id: int
+    difficulty: int
+    color: int
+    appeals: Optional[int]
+    support: Optional[int]
+    extra_bonus: Optional[np.ndarray]
+    special_option: Optional[int]
+    special_value: Optional[int]
+    times: int
+    autoplay: bool
+    autoplay_offset: int
+    doublelife: bool
+    mirror: bool
+    perfect_play: bool
+    allow_great: bool
+    left_inclusive: bool
+    right_inclusive: bool
+    force_encore_amr_cache_to_encore_unit: bool
+    force_encore_magic_to_encore_unit: bool
+    allow_encore_magic_to_escape_max_agg: bool
+    abuse_load: bool
+    trial_workers: int
+
+    def __init__(self, cards: List[Optional[dict]], score_id: int, difficulty: int, color: int,
+                 appeals: Optional[int], support: Optional[int], extra_bonus: Optional[np.ndarray],
+                 special_option: Optional[int], special_value: Optional[int], times: int, autoplay: bool,
+                 autoplay_offset: int, doublelife: bool, mirror: bool, perfect_play: bool, allow_great: bool,
+                 left_inclusive: bool, right_inclusive: bool, force_encore_amr_cache_to_encore_unit: bool,
+                 force_encore_magic_to_encore_unit: bool, allow_encore_magic_to_escape_max_agg: bool,
+                 abuse_load: bool, trial_workers: int = 1):
+        self.cards = cards
+        self.score_id = score_id
+        self.difficulty = difficulty
+        self.color = color
+        self.appeals = appeals
+        self.support = support
+        self.extra_bonus = extra_bonus
+        self.special_option = special_option
+        self.special_value = special_value
+        self.times = times
+        self.autoplay = autoplay
+        self.autoplay_offset = autoplay_offset
+        self.doublelife = doublelife
+        self.mirror = mirror
+        self.perfect_play = perfect_play
+        self.allow_great = allow_great
+        self.left_inclusive = left_inclusive
+        self.right_inclusive = right_inclusive
+        self.force_encore_amr_cache_to_encore_unit = force_encore_amr_cache_to_encore_unit
+        self.force_encore_magic_to_encore_unit = force_encore_magic_to_encore_unit
+        self.allow_encore_magic_to_escape_max_agg = allow_encore_magic_to_escape_max_agg
+        self.abuse_load = abuse_load
+        self.trial_workers = trial_workers
+
+
+def _compact(result: Union[SimulationResult, AutoSimulationResult], abuse_load: bool) \
+        -> Union[SimulationResult, AutoSimulationResult]:
+    # The calculator only reads statistics of the deltas and the chart viewer only wants abuse data it asked for
+    if isinstance(result, SimulationResult):
+        result.deltas = np.asarray(result.deltas, dtype=np.int32)
+        result.perfect_score_array = None
+        if not abuse_load:
+            result.abuse_data = None
+    return result
+
+
+def run_simulation_job(job: SimulationJob) -> Union[SimulationResult, AutoSimulationResult]:
+    """
+    Runs in the worker processes.
+    """
+    cards = [card_from_spec(spec) for spec in job.cards]
+    if len(cards) == 15:
+        live = GrandLive()
+        unit = GrandUnit.from_list(cards)
+    else:
+        live = Live()
+        unit = Unit.from_list(cards)
+    live.set_music(score_id=job.score_id, difficulty=job.difficulty)
+    live.color = Color(job.color)
+    live.set_unit(unit)
+    sim = Simulator(live, special_offset=0.075 if job.autoplay else None,
+                    left_inclusive=job.left_inclusive, right_inclusive=job.right_inclusive,
+                    force_encore_amr_cache_to_encore_unit=job.force_encore_amr_cache_to_encore_unit,
+                    force_encore_magic_to_encore_unit=job.force_encore_magic_to_encore_unit,
+                    allow_encore_magic_to_escape_max_agg=job.allow_encore_magic_to_escape_max_agg)
+    if job.autoplay:
+        result = sim.simulate(appeals=job.appeals, extra_bonus=job.extra_bonus, support=job.support,
+                              special_option=job.special_option, special_value=job.special_value,
+                              doublelife=job.doublelife, perfect_only=not job.allow_great, auto=True,
+                              mirror=job.mirror, time_offset=job.autoplay_offset)
+    else:
+        result = sim.simulate(times=job.times, appeals=job.appeals, extra_bonus=job.extra_bonus,
+                              support=job.support, perfect_play=job.perfect_play,
+                              special_option=job.special_option, special_value=job.special_value,
+                              doublelife=job.doublelife, perfect_only=not job.allow_great, cache=True,
+                              workers=job.trial_workers)
+    return _compact(result, job.abuse_load)
+
+
+class SimulationWorkerPool:
+    """
+    A process pool started on first use and restarted if a worker dies.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def trial_workers(self) -> int:
+        # Trials of a job are still split over processes when there are cores to spare
+        return max(1, get_default_workers() // self.workers)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def run(self, job: SimulationJob) -> Union[SimulationResult, AutoSimulationResult]:
+        pool = self._get_pool()
+        try:
+            return pool.submit(run_simulation_job, job).result()
+        except BrokenProcessPool:
+            logger.error("Simulation worker died, restarting the worker pool")
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -1,34 +1,61 @@
+import atexit
 import csv
+import os
+import pickle
 import time
-from typing import Optional, Union, cast, Dict, List, Set, DefaultDict, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from math import ceil
+from typing import Optional, Union, Dict, List, Set, DefaultDict, Tuple
 
 import numpy as np
-import pandas as pd
 import pyximport
 
 import customlogger as logger
+from batchmachine import BatchMachine
+from db.simulation_cache import SimulationSummary, get_simulation_key, get_summary, put_summary
+from logic.chart import CompiledChart, get_compiled_chart
 from logic.grandlive import GrandLive
 from logic.live import Live
-from settings import ABUSE_CHARTS_PATH
+from settings import ABUSE_CHARTS_PATH, MAX_WORKERS
 from statemachine import StateMachine, AbuseData, LiveDetail
-from static.live_values import WEIGHT_RANGE, DIFF_MULTIPLIERS
-from static.note_type import NoteType
+from static.judgement import Judgement
+from static.live_values import DIFF_MULTIPLIERS
+from utils.misc import get_trial_rng
 from utils.storage import get_writer
 
 pyximport.install(language_level=3)
 
+# Splitting is not worth the process overhead below this many trials per worker
+MIN_TRIALS_PER_WORKER = 500
 
-def check_long(notes_data: pd.DataFrame, mask: pd.Series):
-    stack = dict()
-    for idx, row in notes_data.iterrows():
-        if not mask[idx]:
-            continue
-        lane = row['finishPos']
-        if row['note_type'] == NoteType.LONG and lane not in stack:
-            stack[lane] = idx
-        elif lane in stack:
-            stack.pop(lane)
-            notes_data.loc[idx, 'is_long'] = True
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
+
+
+def get_default_workers() -> int:
+    return max(1, min(MAX_WORKERS, os.cpu_count() or 1))
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    # Only grows, a simulation never submits more chunks than the workers it asked for
+    global _process_pool, _process_pool_workers
+    if _process_pool is None or _process_pool_workers < workers:
+        _shutdown_process_pool()
+        _process_pool = ProcessPoolExecutor(max_workers=workers)
+        _process_pool_workers = workers
+    return _process_pool
+
+
+def _shutdown_process_pool():
+    global _process_pool, _process_pool_workers
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+    _process_pool = None
+    _process_pool_workers = 0
+
+
+atexit.register(_shutdown_process_pool)
 
 
 class BaseSimulationResult:
@@ -39,7 +66,7 @@ class BaseSimulationResult:
 class SimulationResult(BaseSimulationResult):
     def __init__(self, total_appeal: int, perfect_score: int, perfect_score_array: List[int],
                  base: int, deltas: np.ndarray, total_life: int, fans: int, full_roll_chance: float,
-                 abuse_score: int, abuse_data: AbuseData, perfect_detail: LiveDetail):
+                 abuse_score: int, abuse_data: AbuseData, perfect_detail: LiveDetail, seed: int = None):
         super().__init__()
         self.total_appeal = total_appeal
         self.perfect_score = perfect_score
@@ -52,6 +79,9 @@ class SimulationResult(BaseSimulationResult):
         self.abuse_score = abuse_score
         self.abuse_data = abuse_data
         self.perfect_detail = perfect_detail
+        # Trial i of this run can be replayed with Simulator.replay_trial(seed, i), batched or not
+        # Deltas are in trial order, unless the result was restored from the simulation cache
+        self.seed = seed
 
 
 class AutoSimulationResult(BaseSimulationResult):
@@ -87,7 +117,7 @@ class Simulator:
     helen_base_score: float
 
     note_count: int
-    notes_data: pd.DataFrame
+    chart: CompiledChart
     song_duration: float
     weight_range: List[float]
 
@@ -116,31 +146,10 @@ class Simulator:
                 assert isinstance(extra_bonus, np.ndarray) and extra_bonus.shape == (5, 3)
             self.live.set_extra_bonus(extra_bonus, special_option, special_value)
         [unit.get_base_motif_appeals() for unit in self.live.unit.all_units]
-        self.notes_data = self.live.notes
-        self.song_duration = self.notes_data.iloc[-1].sec
-        self.note_count = len(self.notes_data)
-
-        if mirror and self.live.is_grand_chart:
-            start_lanes = 16 - (self.notes_data['finishPos'] + self.notes_data['status'] - 1)
-            self.notes_data['finishPos'] = start_lanes
-
-        is_flick = self.notes_data['note_type'] == NoteType.FLICK
-        is_long = self.notes_data['note_type'] == NoteType.LONG
-        is_slide = self.notes_data['note_type'] == NoteType.SLIDE
-        is_slide = np.logical_or(is_slide, np.logical_and(self.notes_data['type'] == 3, is_flick))
-        is_slide = np.logical_or(is_slide, np.logical_and(
-            np.logical_or(self.notes_data['type'] == 6, self.notes_data['type'] == 7), self.notes_data['groupId'] != 0))
-        self.notes_data['is_flick'] = is_flick
-        self.notes_data['is_long'] = is_long
-        self.notes_data['is_slide'] = is_slide
-        check_long(self.notes_data, np.logical_or(is_long, is_flick))
-        self._helper_mark_slide_checkpoints()
-
-        weight_range = np.array(WEIGHT_RANGE)
-        weight_range[:, 0] = np.trunc(WEIGHT_RANGE[:, 0] / 100 * len(self.notes_data) - 1)
-        for idx, (bound_l, bound_r) in enumerate(zip(weight_range[:-1, 0], weight_range[1:, 0])):
-            self.notes_data.loc[int(bound_l):int(bound_r), 'weight'] = weight_range[idx][1]
-        self.weight_range = self.notes_data['weight'].to_list()
+        self.chart = get_compiled_chart(self.live.score_id, self.live.difficulty, self.live.notes, mirror=mirror)
+        self.song_duration = self.chart.song_duration
+        self.note_count = self.chart.note_count
+        self.weight_range = self.chart.weights.tolist()
 
         if support is not None:
             self.support = support
@@ -150,16 +159,8 @@ class Simulator:
             self.total_appeal = appeals
         else:
             self.total_appeal = self.live.get_appeals() + self.support
-        self.base_score = DIFF_MULTIPLIERS[self.live.level] * self.total_appeal / len(self.notes_data)
-        self.helen_base_score = DIFF_MULTIPLIERS[self.live.level] * self.total_appeal / len(self.notes_data)
-
-    def _helper_mark_slide_checkpoints(self):
-        self.notes_data['checkpoints'] = False
-        self.notes_data.loc[self.notes_data['note_type'] == NoteType.SLIDE, 'checkpoints'] = True
-        for group_id in self.notes_data[self.notes_data['note_type'] == NoteType.SLIDE].groupId.unique():
-            group = self.notes_data[(self.notes_data['groupId'] == group_id)]
-            self.notes_data.loc[group.iloc[-1].name, 'checkpoints'] = False
-            self.notes_data.loc[group.iloc[0].name, 'checkpoints'] = False
+        self.base_score = DIFF_MULTIPLIERS[self.live.level] * self.total_appeal / self.note_count
+        self.helen_base_score = DIFF_MULTIPLIERS[self.live.level] * self.total_appeal / self.note_count
 
     def simulate(self, times: int = 100, appeals: int = None,
                  extra_bonus: np.ndarray = None, support: int = None, perfect_play: bool = False,
@@ -167,7 +168,12 @@ class Simulator:
                  special_option: int = None, special_value: int = None, doublelife: bool = False,
                  perfect_only: bool = True, auto: bool = False, mirror: bool = False, time_offset: int = 0,
                  deact_skills: Dict[int, List[int]] = None, note_offsets: DefaultDict[int, int] = None,
-                 note_misses: List[int] = None) -> Union[SimulationResult, AutoSimulationResult]:
+                 note_misses: List[int] = None, batch: bool = True, workers: int = None,
+                 seed: int = None, cache: bool = False) -> Union[SimulationResult, AutoSimulationResult]:
+        """
+        If cache, identical simulations are restored from chihiro.db instead of rerun.
+        Without a seed, a cached simulation derives its seed from its arguments so that reruns can hit the cache.
+        """
         start = time.time()
         logger.debug("Unit: {}".format(self.live.unit))
         logger.debug("Song: {} - {} - Lv {}".format(self.live.music_name, self.live.difficulty, self.live.level))
@@ -180,7 +186,8 @@ class Simulator:
                                  chara_bonus_set=chara_bonus_set, chara_bonus_value=chara_bonus_value,
                                  special_option=special_option, special_value=special_value,
                                  doublelife=doublelife, perfect_only=perfect_only,
-                                 deact_skills=deact_skills, note_offsets=note_offsets, note_misses=note_misses)
+                                 deact_skills=deact_skills, note_offsets=note_offsets, note_misses=note_misses,
+                                 batch=batch, workers=workers, seed=seed, cache=cache)
             self.save_to_file(res.perfect_score_array, res.abuse_data)
         else:
             res = self._simulate_auto(appeals=appeals, extra_bonus=extra_bonus, support=support,
@@ -196,26 +203,54 @@ class Simulator:
                   special_option: int = None, special_value: int = None,
                   doublelife: bool = False, perfect_only: bool = True,
                   deact_skills: Dict[int, List[int]] = None, note_offsets: DefaultDict[int, int] = None,
-                  note_misses: List[int] = None) -> SimulationResult:
+                  note_misses: List[int] = None, batch: bool = True, workers: int = None,
+                  seed: int = None, cache: bool = False) -> SimulationResult:
         self._setup_simulator(appeals=appeals, support=support, extra_bonus=extra_bonus,
                               chara_bonus_set=chara_bonus_set, chara_bonus_value=chara_bonus_value,
                               special_option=special_option, special_value=special_value)
         grand = self.live.is_grand
 
-        results = self._simulate_internal(times=times, grand=grand, fail_simulate=not perfect_play,
-                                          doublelife=doublelife, perfect_only=perfect_only,
-                                          deact_skills=deact_skills, note_offsets=note_offsets, note_misses=note_misses)
+        cache_key = None
+        if cache and deact_skills is None and note_offsets is None and note_misses is None:
+            cache_parts = self._get_cache_parts(times, perfect_play, doublelife, perfect_only)
+            if seed is None:
+                seed = int(get_simulation_key(cache_parts)[:16], 16)
+            cache_parts["seed"] = seed
+            cache_key = get_simulation_key(cache_parts)
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+
+        results = None
+        summary = get_summary(cache_key) if cache_key is not None else None
+        if summary is not None:
+            results = self._simulate_cached(grand, doublelife, summary)
+        if results is None:
+            summary = None
+            results = self._simulate_internal(times=times, grand=grand, fail_simulate=not perfect_play,
+                                              doublelife=doublelife, perfect_only=perfect_only,
+                                              deact_skills=deact_skills, note_offsets=note_offsets,
+                                              note_misses=note_misses, batch=batch, workers=workers, seed=seed)
         perfect_score, perfect_score_array, random_simulation_results, full_roll_chance, \
             abuse_score, abuse_data, perfect_detail = results
 
         if perfect_play:
             base = perfect_score
             deltas = np.zeros(1)
+        elif summary is not None:
+            logger.debug("Restored {} trials from simulation cache".format(times))
+            base = summary.base
+            deltas = summary.deltas
         else:
-            score_array = np.array([simulation_result[0] for simulation_result in random_simulation_results])
+            score_array = np.array(random_simulation_results)
             base = int(score_array.mean())
             deltas = score_array - base
 
+        if cache_key is not None and summary is None:
+            put_summary(cache_key, SimulationSummary.from_deltas(
+                base, deltas, perfect_score_array=perfect_score_array, abuse_score=abuse_score,
+                abuse_score_delta=abuse_data.score_delta, abuse_window_l=abuse_data.window_l,
+                abuse_window_r=abuse_data.window_r, abuse_judgements=[_.value for _ in abuse_data.judgements]))
+
         total_fans = 0
         if grand:
             base_fan = base / 3 * 0.001 * 1.1
@@ -224,7 +259,7 @@ class Simulator:
         else:
             total_fans = int(base * 0.001 * (1.1 + self.live.fan / 100)) * 5
 
-        logger.debug("Tensor size: {}".format(self.notes_data.shape))
+        logger.debug("Note count: {}".format(self.note_count))
         logger.debug("Appeal: {}".format(int(self.total_appeal)))
         logger.debug("Support: {}".format(int(self.live.get_support())))
         logger.debug("Support team: {}".format(self.live.print_support_team()))
@@ -245,27 +280,102 @@ class Simulator:
             fans=total_fans,
             abuse_score=int(abuse_score),
             abuse_data=abuse_data,
-            perfect_detail=perfect_detail
+            perfect_detail=perfect_detail,
+            seed=seed
         )
 
+    def _get_cache_parts(self, times: int, perfect_play: bool, doublelife: bool, perfect_only: bool) -> dict:
+        return {
+            "cards": [describe_card(card) for card in self.live.unit.all_cards()],
+            "chart": [self.live.score_id, self.live.difficulty, self.chart.mirror, self.chart.get_digest()],
+            "level": self.live.level,
+            "appeal": self.total_appeal,
+            "support": self.support,
+            "life": self.live.get_life(),
+            "extra_bonus": self.live.get_extra_bonuses(),
+            "special": [self.live.special_option, self.live.special_value],
+            "chara_bonus": [self.live.chara_bonus_set, self.live.chara_bonus_value],
+            "flags": [self.left_inclusive, self.right_inclusive, self.force_encore_amr_cache_to_encore_unit,
+                      self.force_encore_magic_to_encore_unit, self.allow_encore_magic_to_escape_max_agg,
+                      perfect_play, doublelife, perfect_only],
+            "times": times,
+        }
+
+    def _simulate_cached(self, grand: bool, doublelife: bool, summary: SimulationSummary) \
+            -> Optional[Tuple[int, List[int], List[int], float, int, AbuseData, LiveDetail]]:
+        # The perfect play is rerun for its live detail, a different perfect score means the entry is stale
+        impl = self.create_state_machine(grand=grand, doublelife=doublelife)
+        impl.reset_machine(perfect_play=True, perfect_only=True)
+        perfect_score, perfect_score_array, perfect_detail = impl.simulate_impl()
+        if not np.array_equal(perfect_score_array, summary.perfect_score_array):
+            logger.debug("Simulation cache entry does not match the perfect play, rerunning")
+            return None
+        abuse_data = AbuseData(summary.abuse_score_delta, summary.abuse_window_l.tolist(),
+                               summary.abuse_window_r.tolist(),
+                               [Judgement(_) for _ in summary.abuse_judgements.tolist()])
+        return perfect_score, perfect_score_array, list(), impl.get_full_roll_chance(), \
+            summary.abuse_score, abuse_data, perfect_detail
+
+    def get_state_machine_kwargs(self, grand: bool, doublelife: bool = False,
+                                 deact_skills: Dict[int, List[int]] = None, note_offsets: DefaultDict[int, int] = None,
+                                 note_misses: List[int] = None) -> dict:
+        """
+        Arguments of StateMachine, trial workers rebuild it from these in their own process.
+        """
+        return dict(grand=grand, difficulty=self.live.difficulty, doublelife=doublelife, live=self.live,
+                    chart=self.chart, left_inclusive=self.left_inclusive, right_inclusive=self.right_inclusive,
+                    base_score=self.base_score, helen_base_score=self.helen_base_score, weights=self.weight_range,
+                    force_encore_amr_cache_to_encore_unit=self.force_encore_amr_cache_to_encore_unit,
+                    force_encore_magic_to_encore_unit=self.force_encore_magic_to_encore_unit,
+                    allow_encore_magic_to_escape_max_agg=self.allow_encore_magic_to_escape_max_agg,
+                    custom_deact_skills=deact_skills, custom_note_offsets=note_offsets,
+                    custom_note_misses=note_misses)
+
+    def create_state_machine(self, grand: bool, doublelife: bool = False,
+                             deact_skills: Dict[int, List[int]] = None, note_offsets: DefaultDict[int, int] = None,
+                             note_misses: List[int] = None) -> StateMachine:
+        return StateMachine(**self.get_state_machine_kwargs(grand=grand, doublelife=doublelife,
+                                                            deact_skills=deact_skills, note_offsets=note_offsets,
+                                                            note_misses=note_misses))
+
+    @staticmethod
+    def _simulate_trials_parallel(times: int, seed: int, workers: int, state_machine_kwargs: dict,
+                                  perfect_only: bool, batch: bool) -> Optional[List[int]]:
+        chunk_count = min(workers, ceil(times / MIN_TRIALS_PER_WORKER))
+        chunk_sizes = [times // chunk_count + (1 if idx < times % chunk_count else 0) for idx in range(chunk_count)]
+        chunk_starts = np.cumsum([0] + chunk_sizes[:-1]).tolist()
+        logger.debug("Splitting {} trials into {} processes".format(times, chunk_count))
+        try:
+            pool = _get_process_pool(workers)
+            futures = [pool.submit(simulate_trials, state_machine_kwargs, chunk_size, seed, chunk_start,
+                                   perfect_only, batch)
+                       for chunk_size, chunk_start in zip(chunk_sizes, chunk_starts)]
+            scores = list()
+            for future in futures:
+                scores.extend(future.result())
+            return scores
+        except BrokenProcessPool as e:
+            logger.info("Process pool died, running trials in this process: {}".format(e))
+            _shutdown_process_pool()
+            return None
+        except (pickle.PicklingError, TypeError, AttributeError, OSError) as e:
+            logger.info("Trials cannot be sent to the process pool, running them in this process: {}".format(e))
+            return None
+
     def _simulate_internal(self, grand: bool, times: int, fail_simulate: bool = False, doublelife: bool = False,
                            perfect_only: bool = True, auto: bool = False, time_offset: int = 0,
                            deact_skills: Dict[int, List[int]] = None, note_offsets: DefaultDict[int, int] = None,
-                           note_misses: List[int] = None) \
+                           note_misses: List[int] = None, batch: bool = True, workers: int = None,
+                           seed: int = None) \
             -> Union[Tuple[np.ndarray, int, int, int, int, int, bool, int],
-                     Tuple[int, List[int], List[tuple], float, int, Optional[AbuseData], LiveDetail]]:
-        impl = StateMachine(grand=grand, difficulty=self.live.difficulty, doublelife=doublelife, live=self.live,
-                            notes_data=self.notes_data, left_inclusive=self.left_inclusive,
-                            right_inclusive=self.right_inclusive, base_score=self.base_score,
-                            helen_base_score=self.helen_base_score, weights=self.weight_range,
-                            force_encore_amr_cache_to_encore_unit=self.force_encore_amr_cache_to_encore_unit,
-                            force_encore_magic_to_encore_unit=self.force_encore_magic_to_encore_unit,
-                            allow_encore_magic_to_escape_max_agg=self.allow_encore_magic_to_escape_max_agg,
-                            custom_deact_skills=deact_skills, custom_note_offsets=note_offsets,
-                            custom_note_misses=note_misses)
+                     Tuple[int, List[int], List[int], float, int, Optional[AbuseData], LiveDetail]]:
+        state_machine_kwargs = self.get_state_machine_kwargs(grand=grand, doublelife=doublelife,
+                                                             deact_skills=deact_skills, note_offsets=note_offsets,
+                                                             note_misses=note_misses)
+        impl = StateMachine(**state_machine_kwargs)
 
         if auto:
-            impl.reset_machine(time_offset=time_offset, special_offset=self.special_offset, auto=True)
+            impl.reset_machine(time_offset=time_offset, special_offset=self.special_offset, auto=True, detail=False)
             return impl.simulate_impl_auto()
 
         impl.reset_machine(perfect_play=True, perfect_only=True)
@@ -275,17 +385,37 @@ class Simulator:
 
         scores = list()
         if fail_simulate:
-            for _ in range(times):
-                impl.reset_machine(perfect_play=False, perfect_only=perfect_only)
-                scores.append(impl.simulate_impl()[0:2])
-
-        impl.reset_machine(perfect_play=True, abuse=True, perfect_only=False)
+            if workers is None:
+                workers = get_default_workers()
+            if workers > 1 and times >= 2 * MIN_TRIALS_PER_WORKER:
+                scores = self._simulate_trials_parallel(times, seed, workers, state_machine_kwargs,
+                                                        perfect_only=perfect_only, batch=batch)
+            if not scores:
+                scores = simulate_trials(state_machine_kwargs, times, seed, perfect_only=perfect_only, batch=batch,
+                                         impl=impl)
+
+        impl.reset_machine(perfect_play=True, abuse=True, perfect_only=False, detail=False)
         abuse_result_score, abuse_data = impl.simulate_impl(skip_activation_initialization=True)
         logger.debug("Total abuse: {}".format(int(abuse_result_score)))
         logger.debug("Abuse deltas: " + " ".join(map(str, abuse_data.score_delta)))
         return perfect_score, perfect_score_array, scores, full_roll_chance, \
             abuse_result_score, abuse_data, perfect_detail
 
+    def replay_trial(self, seed: int, trial: int, appeals: int = None, extra_bonus: np.ndarray = None,
+                     support: int = None, chara_bonus_set: Set[int] = None, chara_bonus_value: int = 0,
+                     special_option: int = None, special_value: int = None, doublelife: bool = False,
+                     perfect_only: bool = True) -> Tuple[int, List[int], LiveDetail]:
+        """
+        Reruns a single trial of a previous simulation with full live detail.
+        Arguments other than seed and trial should be the same as the ones given to simulate.
+        """
+        self._setup_simulator(appeals=appeals, support=support, extra_bonus=extra_bonus,
+                              chara_bonus_set=chara_bonus_set, chara_bonus_value=chara_bonus_value,
+                              special_option=special_option, special_value=special_value)
+        impl = self.create_state_machine(grand=self.live.is_grand, doublelife=doublelife)
+        impl.reset_machine(perfect_play=False, perfect_only=perfect_only, rng=get_trial_rng(seed, trial))
+        return impl.simulate_impl()
+
     def _simulate_auto(self, appeals: int = None, extra_bonus: np.ndarray = None, support: int = None,
                        chara_bonus_set: Set[int] = None, chara_bonus_value: int = 0,
                        special_option: int = None, special_value: int = None,
@@ -308,7 +438,7 @@ class Simulator:
 
         auto_score = int(note_scores.sum())
 
-        logger.debug("Tensor size: {}".format(self.notes_data.shape))
+        logger.debug("Note count: {}".format(self.note_count))
         logger.debug("Appeal: {}".format(int(self.total_appeal)))
         logger.debug("Support: {}".format(int(self.live.get_support())))
         logger.debug("Support team: {}".format(self.live.print_support_team()))
@@ -345,13 +475,51 @@ class Simulator:
                                  "Cumulative Perfect Score", "Cumulative Max Score"])
             cumsum_pft = 0
             cumsum_max = 0
-            for idx, row in self.notes_data.iterrows():
-                idx = cast(int, idx)
+            for idx, (sec, note_type, lane) in enumerate(zip(self.chart.sec.tolist(), self.chart.note_types,
+                                                             self.chart.lane.tolist())):
                 l = abuse_data.window_l[idx]
                 r = abuse_data.window_r[idx]
                 window = r - l
                 delta = abuse_data.score_delta[idx]
                 cumsum_pft += perfect_scores[idx]
                 cumsum_max += perfect_scores[idx] + delta
-                csv_writer.writerow([idx, row['sec'], row['note_type'], row['finishPos'], perfect_scores[idx],
+                csv_writer.writerow([idx, sec, note_type, lane, perfect_scores[idx],
                                      l, r, delta, window, cumsum_pft, cumsum_max])
+
+
+def describe_card(card) -> list:
+    skill = card.sk
+    return [card.card_id, card.color, card.subcolor, card.vo, card.da, card.vi, card.li,
+            [card.vo_pots, card.da_pots, card.vi_pots, card.li_pots, card.sk_pots],
+            [skill.skill_type, skill.probability, skill.interval, skill.duration, skill.values, skill.offset,
+             skill.boost, skill.color_target, skill.act, skill.min_requirements, skill.max_requirements,
+             skill.life_requirement, skill.song_required, skill.skill_level],
+            sorted(vars(card.le).items())]
+
+
+def simulate_trials(state_machine_kwargs: dict, times: int, seed: int, start: int = 0, perfect_only: bool = True,
+                    batch: bool = True, impl: StateMachine = None) -> List[int]:
+    """
+    Runs trials start to start + times, also in the trial workers. impl is built from state_machine_kwargs if not given.
+    """
+    custom = any((state_machine_kwargs["custom_deact_skills"], state_machine_kwargs["custom_note_offsets"],
+                  state_machine_kwargs["custom_note_misses"]))
+    if batch and perfect_only and not custom:
+        batch_machine = BatchMachine(grand=state_machine_kwargs["grand"],
+                                     difficulty=state_machine_kwargs["difficulty"],
+                                     live=state_machine_kwargs["live"], chart=state_machine_kwargs["chart"],
+                                     left_inclusive=state_machine_kwargs["left_inclusive"],
+                                     right_inclusive=state_machine_kwargs["right_inclusive"],
+                                     base_score=state_machine_kwargs["base_score"],
+                                     weights=state_machine_kwargs["weights"])
+        if batch_machine.is_supported():
+            logger.debug("Running {} trials in batch".format(times))
+            return batch_machine.simulate(times, seed, start).tolist()
+    if impl is None:
+        impl = StateMachine(**state_machine_kwargs)
+    scores = list()
+    for trial in range(start, start + times):
+        impl.reset_machine(perfect_play=False, perfect_only=perfect_only, rng=get_trial_rng(seed, trial),
+                           detail=False)
+        scores.append(impl.simulate_impl()[0])
+    return scores
@@ -4,19 +4,21 @@ import copy
 from bisect import bisect
 from collections import defaultdict
 from math import ceil, floor
-from random import random
 from typing import cast, Union, Optional, Dict, List, DefaultDict, Tuple
 
 import cython
 import numpy as np
-import pandas as pd
 
+from db import db
+from logic.chart import CompiledChart
 from logic.live import BaseLive
+from logic.simulation_context import SimulationContext
 from logic.skill import Skill
+from settings import DEBUG_DB_GUARD
 from static.color import Color
 from static.judgement import Judgement
 from static.note_type import NoteType
-from static.skill import get_sparkle_bonus, SkillInact
+from static.skill import SkillInact
 from static.song_difficulty import PERFECT_TAP_RANGE, GREAT_TAP_RANGE, NICE_TAP_RANGE, BAD_TAP_RANGE, \
     Difficulty, FLICK_DRAIN, NONFLICK_DRAIN, FLICK_BAD_DRAIN, NONFLICK_BAD_DRAIN
 
@@ -359,14 +361,17 @@ class StateMachine:
     right_inclusive: bool
     fail_simulate: bool
     perfect_only: bool
+    detail: bool
 
     grand: bool
     difficulty: Difficulty
     doublelife: bool
     live: BaseLive
-    notes_data: pd.DataFrame
+    chart: CompiledChart
+    context: SimulationContext
     base_score: float
     helen_base_score: float
+    _weights: List[int]
     weights: List[int]
 
     _note_type_stack: List[NoteType]
@@ -379,6 +384,7 @@ class StateMachine:
     note_idx_stack: List[int]
     special_note_types: List[List[NoteType]]
     checkpoints: List[bool]
+    note_cursor: int
 
     unit_offset: int
     probabilities: List[float]
@@ -389,6 +395,9 @@ class StateMachine:
 
     skill_times: List[int]
     skill_indices: List[int]
+    skill_cursor: int
+    skill_pairs: List[int]
+    skill_cancelled: List[bool]
     skill_queue: Dict[int, Union[Skill, List[Skill]]]
     reference_skills: List[Optional[Skill]]
 
@@ -442,6 +451,7 @@ class StateMachine:
     cache_perfect_score_array: Optional[np.ndarray]
     note_time_deltas_backup: List[int]
     note_idx_stack_backup: List[int]
+    note_positions: Dict[int, int]
     is_abuse_backup: List[bool]
 
     auto: bool
@@ -468,7 +478,9 @@ class StateMachine:
     custom_note_offsets: Optional[DefaultDict[int, int]]
     custom_note_misses: Optional[DefaultDict[int, int]]
 
-    def __init__(self, grand, difficulty, doublelife, live, notes_data, left_inclusive, right_inclusive, base_score,
+    rng: np.random.Generator
+
+    def __init__(self, grand, difficulty, doublelife, live, chart, left_inclusive, right_inclusive, base_score,
                  helen_base_score, weights,
                  force_encore_amr_cache_to_encore_unit=False,
                  force_encore_magic_to_encore_unit=False,
@@ -481,31 +493,33 @@ class StateMachine:
         self.difficulty = difficulty
         self.doublelife = doublelife
         self.live = live
-        self.notes_data = notes_data
+        self.chart = chart
         self.base_score = base_score
         self.helen_base_score = helen_base_score
-        self.weights = weights
+        self._weights = list(weights)
+        self.weights = list(weights)
 
-        self._note_type_stack = self.notes_data.note_type.to_list()
-        self._note_idx_stack = self.notes_data.index.to_list()
-        self._special_note_types = list()
-        self._setup_special_note_types()
-        self.checkpoints = self.notes_data["checkpoints"].to_list()
+        self._note_type_stack = self.chart.note_types
+        self._note_idx_stack = list(range(self.chart.note_count))
+        self._special_note_types = self.chart.special_note_types
+        self.checkpoints = self.chart.checkpoints.tolist()
 
         self.unit_offset = 3 if grand else 1
+        # Everything read from master data is resolved here, trials must not query the database
+        self.context = SimulationContext(live, grand, doublelife)
         self.probabilities = list()
         self._setup_probabilities()
         self.has_cc = any([card.skill.is_cc for card in self.live.unit.all_cards()])
 
-        self._sparkle_bonus_ssr = get_sparkle_bonus(8, self.grand)
-        self._sparkle_bonus_sr = get_sparkle_bonus(6, self.grand)
+        self._sparkle_bonus_ssr = self.context.sparkle_bonus_ssr
+        self._sparkle_bonus_sr = self.context.sparkle_bonus_sr
 
         self.full_roll_chance = 1
 
         # Abuse stuff
         self.abuse = False
         self.cache_hps = list()
-        self.is_abuse = [False] * len(self.notes_data)
+        self.is_abuse = [False] * self.chart.note_count
         self.cache_perfect_score_array = None
 
         self.force_encore_amr_cache_to_encore_unit = force_encore_amr_cache_to_encore_unit
@@ -526,30 +540,27 @@ class StateMachine:
             self.custom_note_offsets = None
             self.custom_note_misses = None
 
-    def _setup_special_note_types(self):
-        for _, note in self.notes_data.iterrows():
-            temp = list()
-            if note.is_flick:
-                temp.append(NoteType.FLICK)
-            if note.is_long:
-                temp.append(NoteType.LONG)
-            if note.is_slide:
-                temp.append(NoteType.SLIDE)
-            self._special_note_types.append(temp)
+        self.rng = np.random.default_rng()
 
     def _setup_probabilities(self):
         for unit_idx, unit in enumerate(self.live.unit.all_units):
             for card_idx, card in enumerate(unit.all_cards()):
-                probability = self.live.get_probability(unit_idx * 5 + card_idx)
+                probability = self.context.probabilities[unit_idx * 5 + card_idx]
                 self.probabilities.append(probability)
                 card.skill.set_original_unit_idx(unit_idx)
                 card.skill.set_card_idx(unit_idx * 5 + card_idx)
                 card.skill.probability = probability
 
     def reset_machine(self, perfect_play=True, perfect_only=True, abuse=False, time_offset=0, special_offset=0,
-                      auto=False):
+                      auto=False, rng=None, detail=True):
         self.fail_simulate = not perfect_play
         self.perfect_only = perfect_only
+        # Per note details are only needed for display, trials that only need the score can skip them
+        self.detail = detail
+        if rng is not None:
+            self.rng = rng
+        # Weights are remapped by combo after every run, start each run from the chart weights
+        self.weights = self._weights.copy()
 
         # These 2 lists have the same length and should be mutated together.
         # List of all skill timestamps, contains activations and deactivations.
@@ -558,17 +569,22 @@ class StateMachine:
         # Positive = activation, negative = deactivation.
         # E.g. 4 means the skill in slot 4 (counting from 1) activation, -4 means its deactivation
         self.skill_indices = list()
+        # Events are consumed by moving the cursor instead of popping the head of the lists.
+        # Deactivations of skills that fail to activate are flagged as cancelled and skipped over.
+        self.skill_cursor = 0
+        self.skill_pairs = list()
+        self.skill_cancelled = list()
         self.skill_queue = dict()  # What skills are currently active
         # List of all skill objects. Should not mutate. Original sets.
         self.reference_skills = [None]
-        for _ in range(len(self.live.unit.all_cards())):
+        for _ in range(self.context.card_count):
             self.reference_skills.append(None)
 
         # Transient values of a state
-        self.life = self.live.get_start_life(doublelife=self.doublelife)
-        self.max_life = self.live.get_start_life(doublelife=True)
+        self.life = self.context.start_life
+        self.max_life = self.context.max_life
         self.combo = 0
-        self.combos = [0] * len(self.notes_data)
+        self.combos = [0] * self.chart.note_count
         self.judgements = list()
 
         # Metrics
@@ -612,7 +628,7 @@ class StateMachine:
 
         # Cache for AMR
         self.unit_caches = list()
-        for _ in range(len(self.live.unit.all_units)):
+        for _ in range(self.context.unit_count):
             self.unit_caches.append(UnitCacheBonus())
 
         self.abuse = abuse
@@ -622,46 +638,47 @@ class StateMachine:
         if self.auto:
             self.time_offset = int(time_offset * 1E3)
             self.special_offset = int(special_offset * 1E6)
-            self.finish_pos = self.notes_data["finishPos"].map(int).to_list()
-            self.status = self.notes_data["status"].map(int).to_list()
-            self.group_ids = self.notes_data["groupId"].map(int).to_list()
-            self.delayed = [False] * len(self.notes_data)
+            self.finish_pos = self.chart.lane.tolist()
+            self.status = self.chart.status.tolist()
+            self.group_ids = self.chart.group_id.tolist()
+            self.delayed = [False] * self.chart.note_count
             self.being_held = dict()
-            self.judgements = [Judgement.PERFECT for _ in range(len(self.notes_data))]
-            self.score_bonuses = [0] * len(self.notes_data)
-            self.score_great_bonuses = [0] * len(self.notes_data)
-            self.combo_bonuses = [0] * len(self.notes_data)
+            self.judgements = [Judgement.PERFECT for _ in range(self.chart.note_count)]
+            self.score_bonuses = [0] * self.chart.note_count
+            self.score_great_bonuses = [0] * self.chart.note_count
+            self.combo_bonuses = [0] * self.chart.note_count
             self.lowest_life = 9000
             self.lowest_life_time = -1
 
         # Initializing note data
         if perfect_play and not self.custom:
-            self.note_time_stack = self.notes_data.sec.map(lambda x: int(x * 1E6)).to_list()
+            self.note_time_stack = (self.chart.sec * 1E6).astype(np.int64).tolist()
             self.note_time_deltas = [0] * len(self.note_time_stack)
             self.note_type_stack = self._note_type_stack.copy()
             self.note_idx_stack = self._note_idx_stack.copy()
             self.special_note_types = self._special_note_types.copy()
         else:
             if self.custom:
-                temp = self.notes_data.sec.copy()
+                temp = self.chart.sec.copy()
                 for idx in self.custom_note_offsets:
                     temp[idx] += self.custom_note_offsets[idx] / 1000
             else:
                 random_range = PERFECT_TAP_RANGE[self.difficulty] / 2E6 \
                     if perfect_only else GREAT_TAP_RANGE[self.difficulty] / 2E6
-                temp = self.notes_data.sec + np.random.random(len(self.notes_data)) * 2 * random_range - random_range
-            temp[self.notes_data["checkpoints"]] = np.maximum(
-                temp[self.notes_data["checkpoints"]],
-                self.notes_data.loc[self.notes_data["checkpoints"], "sec"])
-            temp_note_time_deltas = (temp - self.notes_data.sec).map(lambda x: int(x * 1E6))
-            temp_note_time_stack = temp.map(lambda x: int(x * 1E6))
-            sorted_indices = np.argsort(temp_note_time_stack)
+                temp = self.chart.sec + self.rng.random(self.chart.note_count) * 2 * random_range - random_range
+            checkpoints = self.chart.checkpoints
+            temp[checkpoints] = np.maximum(temp[checkpoints], self.chart.sec[checkpoints])
+            temp_note_time_deltas = ((temp - self.chart.sec) * 1E6).astype(np.int64)
+            temp_note_time_stack = (temp * 1E6).astype(np.int64)
+            sorted_indices = np.argsort(temp_note_time_stack, kind='stable').tolist()
             self.note_time_stack = temp_note_time_stack[sorted_indices].tolist()
             self.note_time_deltas = temp_note_time_deltas[sorted_indices].tolist()
             self.note_type_stack = [self._note_type_stack[_] for _ in sorted_indices]
             self.note_idx_stack = [self._note_idx_stack[_] for _ in sorted_indices]
             self.special_note_types = [self._special_note_types[_] for _ in sorted_indices]
+        self.note_cursor = 0
         self.note_idx_stack_backup = self.note_idx_stack.copy()
+        self._setup_note_positions()
 
         if abuse:
             self.initialize_live_detail()
@@ -676,8 +693,10 @@ class StateMachine:
         self.note_details = self.live_detail.note_details
         self.skill_details = self.live_detail.skill_details
 
-        for index, row in self.notes_data.iterrows():
-            index = cast(int, index)
+        if not self.detail:
+            return
+
+        for index, (sec, checkpoint) in enumerate(zip(self.chart.sec.tolist(), self.chart.checkpoints.tolist())):
             offset = 0
             if self.custom and index in self.custom_note_offsets:
                 offset = self.custom_note_offsets[index]
@@ -685,12 +704,12 @@ class StateMachine:
                 note_type = NoteType.TAP
             else:
                 note_type = self._special_note_types[index][0]
-            note_detail = NoteDetail(index + 1, row['sec'], note_type, row['checkpoints'], offset)
+            note_detail = NoteDetail(index + 1, sec, note_type, checkpoint, offset)
             self.note_details.append(note_detail)
 
     def _helper_fill_abuse_dummies(self):
         # Abuse should be the last stage of a simulation pipeline
-        assert len(self.checkpoints) == len(self.notes_data)
+        assert len(self.checkpoints) == self.chart.note_count
 
         def get_range(note_type_internal, special_note_types_internal, checkpoint_internal, lane_fixed_internal):
             if note_type_internal == NoteType.TAP:
@@ -719,7 +738,7 @@ class StateMachine:
                 r_p = 200000
                 return (0, r_p), (r_p,)
 
-        lanes = self.notes_data["finishPos"].to_list()
+        lanes = self.chart.lane.tolist()
         previous_lanes = lanes.copy()
         previous_lanes.insert(0, 0)
         previous_lanes.pop()
@@ -787,6 +806,14 @@ class StateMachine:
         self.note_time_deltas_backup = self.note_time_deltas.copy()
         self.note_idx_stack_backup = self.note_idx_stack.copy()
         self.is_abuse_backup = self.is_abuse.copy()
+        self._setup_note_positions()
+
+    def _setup_note_positions(self):
+        # Position each note is handled at, first occurrence for abuse dummies sharing the same note
+        self.note_positions = dict()
+        for position, note_idx in enumerate(self.note_idx_stack_backup):
+            if note_idx not in self.note_positions:
+                self.note_positions[note_idx] = position
 
     def initialize_activation_arrays(self):
         skill_times = list()
@@ -825,7 +852,7 @@ class StateMachine:
                 idx = unit_idx * 5 + card_idx
                 self.reference_skills[idx + 1] = skill
 
-                total_activation = int((self.notes_data.iloc[-1].sec - 1e-8 - 3) // skill.interval)
+                total_activation = int((self.chart.song_duration - 1e-8 - 3) // skill.interval)
                 skill_range = list(range(skill.offset + 1, total_activation + 1, self.unit_offset))
 
                 not_active = 0
@@ -849,7 +876,7 @@ class StateMachine:
                         skill_detail.inact = SkillInact.NO_MAGIC_SKILL
 
                     if self.probabilities[idx] < 1 and self.fail_simulate:
-                        if random() > self.probabilities[idx]:
+                        if self.rng.random() > self.probabilities[idx]:
                             skill_detail.active = False
                             continue
 
@@ -865,28 +892,63 @@ class StateMachine:
         sorted_indices = np.argsort(np_skill_times, kind='stable')
         self.skill_times = np_skill_times[sorted_indices].tolist()
         self.skill_indices = np_skill_indices[sorted_indices].tolist()
+        self._setup_skill_pairs()
+
+    def _setup_skill_pairs(self):
+        # A skill cannot activate twice before deactivating once,
+        # so the n-th activation of a skill pairs with its n-th deactivation
+        activations = defaultdict(list)
+        deactivations = defaultdict(list)
+        for position, skill_idx in enumerate(self.skill_indices):
+            if skill_idx > 0:
+                activations[skill_idx].append(position)
+            else:
+                deactivations[-skill_idx].append(position)
+        self.skill_cursor = 0
+        self.skill_pairs = [-1] * len(self.skill_indices)
+        self.skill_cancelled = [False] * len(self.skill_indices)
+        for skill_idx, positions in activations.items():
+            for on_position, off_position in zip(positions, deactivations[skill_idx]):
+                self.skill_pairs[on_position] = off_position
+
+    def _advance_skill_cursor(self):
+        self.skill_cursor += 1
+        while self.skill_cursor < len(self.skill_times) and self.skill_cancelled[self.skill_cursor]:
+            self.skill_cursor += 1
+
+    def _cancel_skill_deactivation(self):
+        self.skill_cancelled[self.skill_pairs[self.skill_cursor]] = True
 
     def simulate_impl(self, skip_activation_initialization=False) \
             -> Union[Tuple[int, List[int], LiveDetail], Tuple[int, AbuseData]]:
+        if DEBUG_DB_GUARD:
+            with db.forbid_queries():
+                return self._simulate_impl(skip_activation_initialization)
+        return self._simulate_impl(skip_activation_initialization)
+
+    def _simulate_impl(self, skip_activation_initialization=False) \
+            -> Union[Tuple[int, List[int], LiveDetail], Tuple[int, AbuseData]]:
         if not skip_activation_initialization:
             self.initialize_activation_arrays()
 
         while True:
+            has_skill = self.skill_cursor < len(self.skill_times)
+            has_note = self.note_cursor < len(self.note_time_stack)
             # Terminal condition: No more skills and no more notes
-            if len(self.skill_times) == 0 and len(self.note_time_stack) == 0:
+            if not has_skill and not has_note:
                 break
 
-            if len(self.skill_times) == 0:
+            if not has_skill:
                 self.handle_note()
-            elif len(self.note_time_stack) == 0:
+            elif not has_note:
                 self.handle_skill()
-            elif self.note_time_stack[0] < self.skill_times[0]:
+            elif self.note_time_stack[self.note_cursor] < self.skill_times[self.skill_cursor]:
                 self.handle_note()
-            elif self.skill_times[0] < self.note_time_stack[0]:
+            elif self.skill_times[self.skill_cursor] < self.note_time_stack[self.note_cursor]:
                 self.handle_skill()
             else:
-                if (self.skill_indices[0] > 0 and self.left_inclusive) \
-                        or (self.skill_indices[0] < 0 and not self.right_inclusive):
+                if (self.skill_indices[self.skill_cursor] > 0 and self.left_inclusive) \
+                        or (self.skill_indices[self.skill_cursor] < 0 and not self.right_inclusive):
                     self.handle_skill()
                 else:
                     self.handle_note()
@@ -934,12 +996,22 @@ class StateMachine:
         if not self.fail_simulate and not self.abuse:
             self.cache_perfect_score_array = self.note_scores.copy()
 
+        if self.detail:
+            self._fill_note_detail_scores()
+
+        if self.abuse:
+            assert self.cache_perfect_score_array is not None
+            return self._handle_abuse_results()
+        else:
+            return int(self.note_scores.sum()), note_scores_list, self.live_detail
+
+    def _fill_note_detail_scores(self):
         for note_detail in self.note_details:
             weight = 1.0
             if note_detail.combo > 0:
                 weight = self.weights[note_detail.combo - 1]
             note_detail.weight = weight
-            note_detail.score = int(self.note_scores[self.note_idx_stack_backup.index(note_detail.number - 1)])
+            note_detail.score = int(self.note_scores[self.note_positions[note_detail.number - 1]])
 
         note_details_time_sort = self.note_details.copy()
         if self.custom:
@@ -951,35 +1023,37 @@ class StateMachine:
                 note_detail.cumulative_score = note_details_time_sort[note_idx - 1].cumulative_score + note_detail.score
             get_note_detail(self.note_details, note_detail.number).cumulative_score = note_detail.cumulative_score
 
-        if self.abuse:
-            assert self.cache_perfect_score_array is not None
-            return self._handle_abuse_results()
-        else:
-            return int(self.note_scores.sum()), note_scores_list, self.live_detail
-
     def simulate_impl_auto(self):
+        if DEBUG_DB_GUARD:
+            with db.forbid_queries():
+                return self._simulate_impl_auto()
+        return self._simulate_impl_auto()
+
+    def _simulate_impl_auto(self):
         self.initialize_activation_arrays()
         while True:
+            has_skill = self.skill_cursor < len(self.skill_times)
+            has_note = self.note_cursor < len(self.note_time_stack)
             # Terminal condition: No more skills and no more notes
-            if len(self.skill_times) == 0 and len(self.note_time_stack) == 0:
+            if not has_skill and not has_note:
                 break
 
-            if len(self.skill_times) == 0:
+            if not has_skill:
                 self.handle_note_auto()
-            elif len(self.note_time_stack) == 0:
-                temp = self.skill_times[0]
+            elif not has_note:
+                temp = self.skill_times[self.skill_cursor]
                 self.handle_skill()
                 self.break_hold(temp)
-            elif self.note_time_stack[0] < self.skill_times[0]:
+            elif self.note_time_stack[self.note_cursor] < self.skill_times[self.skill_cursor]:
                 self.handle_note_auto()
-            elif self.skill_times[0] < self.note_time_stack[0]:
-                temp = self.skill_times[0]
+            elif self.skill_times[self.skill_cursor] < self.note_time_stack[self.note_cursor]:
+                temp = self.skill_times[self.skill_cursor]
                 self.handle_skill()
                 self.break_hold(temp)
             else:
-                if (self.skill_indices[0] > 0 and self.left_inclusive) \
-                        or (self.skill_indices[0] < 0 and not self.right_inclusive):
-                    temp = self.skill_times[0]
+                if (self.skill_indices[self.skill_cursor] > 0 and self.left_inclusive) \
+                        or (self.skill_indices[self.skill_cursor] < 0 and not self.right_inclusive):
+                    temp = self.skill_times[self.skill_cursor]
                     self.handle_skill()
                     self.break_hold(temp)
                 else:
@@ -1041,7 +1115,9 @@ class StateMachine:
         if group_id not in self.being_held or not self.being_held[group_id]:
             remove_indices = list()
             last_was_slide = True
-            for idx, (check_note_idx, check_group_id) in enumerate(zip(self.note_idx_stack, self.group_ids)):
+            for idx, (check_note_idx, check_group_id) in enumerate(zip(self.note_idx_stack[self.note_cursor:],
+                                                                       self.group_ids[self.note_cursor:]),
+                                                                   start=self.note_cursor):
                 check_note_type = self.note_type_stack[check_note_idx]
                 if check_group_id == group_id:
                     if check_note_type is NoteType.SLIDE or last_was_slide:
@@ -1050,7 +1126,7 @@ class StateMachine:
                     if last_was_slide and check_note_type is not NoteType.SLIDE:
                         last_was_slide = False
             # Make sure there is a MISS between PERFECT and skipped notes
-            _ = self.notes_data["groupId"].map(int).to_list()
+            _ = self.chart.group_id.tolist()
             group_notes = [i for i in range(len(_)) if _[i] == group_id]
             judgements = [self.judgements[i] for i in group_notes]
             if Judgement.SKIPPED in judgements:
@@ -1067,13 +1143,13 @@ class StateMachine:
 
     def _handle_long_break(self, neg_finish_pos, is_long_start=False):
         if neg_finish_pos in self.being_held or is_long_start:
-            note_idx_stack = self.note_idx_stack.copy()
+            note_idx_stack = self.note_idx_stack[self.note_cursor:]
             note_idx_stack.sort()
             check_note_idx = note_idx_stack[0]
             for idx, check_note_idx in enumerate(note_idx_stack):
                 if self.finish_pos[check_note_idx] == -neg_finish_pos:
                     break
-            idx = self.note_idx_stack.index(check_note_idx)
+            idx = self.note_idx_stack.index(check_note_idx, self.note_cursor)
             self.note_idx_stack.pop(idx)
             self.note_time_stack.pop(idx)
             self.delayed.pop(idx)
@@ -1086,10 +1162,12 @@ class StateMachine:
                     self.life -= NONFLICK_DRAIN[self.difficulty]
 
     def handle_note_auto(self):
-        note_idx = self.note_idx_stack.pop(0)
-        note_time = self.note_time_stack.pop(0)
-        delayed = self.delayed.pop(0)
-        group_id = self.group_ids.pop(0)
+        cursor = self.note_cursor
+        self.note_cursor += 1
+        note_idx = self.note_idx_stack[cursor]
+        note_time = self.note_time_stack[cursor]
+        delayed = self.delayed[cursor]
+        group_id = self.group_ids[cursor]
         note_type = self.note_type_stack[note_idx]
         is_checkpoint = self.checkpoints[note_idx]
         finish_pos = self.finish_pos[note_idx]
@@ -1102,11 +1180,7 @@ class StateMachine:
             new_note_time = note_time + self.time_offset
             if note_type != NoteType.TAP:
                 new_note_time += self.special_offset
-            insert_idx = bisect(self.note_time_stack, new_note_time)
-            self.note_time_stack.insert(insert_idx, new_note_time)
-            self.note_idx_stack.insert(insert_idx, note_idx)
-            self.delayed.insert(insert_idx, True)
-            self.group_ids.insert(insert_idx, group_id)
+            self._requeue_note_auto(new_note_time, note_idx, group_id)
             return
 
         if self.has_skill_change:
@@ -1151,11 +1225,7 @@ class StateMachine:
             new_note_time = note_time + self.time_offset
             if note_type != NoteType.TAP:
                 new_note_time += self.special_offset
-            insert_idx = bisect(self.note_time_stack, new_note_time)
-            self.note_time_stack.insert(insert_idx, new_note_time)
-            self.note_idx_stack.insert(insert_idx, note_idx)
-            self.delayed.insert(insert_idx, True)
-            self.group_ids.insert(insert_idx, group_id)
+            self._requeue_note_auto(new_note_time, note_idx, group_id)
             return
         else:
             score_bonus = 0
@@ -1181,12 +1251,20 @@ class StateMachine:
             self.lowest_life = self.life
             self.lowest_life_time = note_time
 
+    def _requeue_note_auto(self, note_time, note_idx, group_id):
+        # Sorted insert into the pending part of the queue, handled notes before the cursor are left untouched
+        insert_idx = bisect(self.note_time_stack, note_time, lo=self.note_cursor)
+        self.note_time_stack.insert(insert_idx, note_time)
+        self.note_idx_stack.insert(insert_idx, note_idx)
+        self.delayed.insert(insert_idx, True)
+        self.group_ids.insert(insert_idx, group_id)
+
     def _handle_abuse_results(self):
-        left_windows = [2E9] * len(self.notes_data)
-        right_windows = [-2E9] * len(self.notes_data)
+        left_windows = [2E9] * self.chart.note_count
+        right_windows = [-2E9] * self.chart.note_count
         max_score = self.cache_perfect_score_array.copy()
-        is_abuses = [False] * len(self.notes_data)
-        judgements = [Judgement.PERFECT] * len(self.notes_data)
+        is_abuses = [False] * self.chart.note_count
+        judgements = [Judgement.PERFECT] * self.chart.note_count
         for _, (delta, note_idx, score, is_abuse, judgement) in enumerate(zip(
                 self.note_time_deltas_backup,
                 self.note_idx_stack_backup,
@@ -1215,7 +1293,7 @@ class StateMachine:
 
     def handle_skill(self):
         self.has_skill_change = True
-        if self.skill_indices[0] > 0:
+        if self.skill_indices[self.skill_cursor] > 0:
             if not self._expand_encore():
                 return
             self._expand_magic()
@@ -1226,12 +1304,9 @@ class StateMachine:
             self._evaluate_harmony()
             self._cache_skill_data()
             self._cache_amr()
-            self.skill_indices.pop(0)
-            self.skill_times.pop(0)
         else:
-            self.skill_queue.pop(-self.skill_indices[0])
-            self.skill_indices.pop(0)
-            self.skill_times.pop(0)
+            self.skill_queue.pop(-self.skill_indices[self.skill_cursor])
+        self._advance_skill_cursor()
 
     def handle_note(self):
         if self.abuse:
@@ -1240,11 +1315,12 @@ class StateMachine:
             self._handle_note_no_abuse()
 
     def _handle_note_no_abuse(self):
-        note_time = self.note_time_stack.pop(0)
-        note_delta = self.note_time_deltas.pop(0)
-        note_type = self.note_type_stack.pop(0)
-        note_idx = self.note_idx_stack.pop(0)
-        note_detail = get_note_detail(self.note_details, note_idx + 1)
+        cursor = self.note_cursor
+        self.note_cursor += 1
+        note_time = self.note_time_stack[cursor]
+        note_delta = self.note_time_deltas[cursor]
+        note_type = self.note_type_stack[cursor]
+        note_idx = self.note_idx_stack[cursor]
 
         score_bonus, score_great_bonus, combo_bonus, support_bonus, combo_support_bonus \
             = self.evaluate_bonuses(self.special_note_types[note_idx], note_time=note_time)
@@ -1261,23 +1337,15 @@ class StateMachine:
         else:
             judgement = Judgement.PERFECT
         self.judgements.append(judgement)
-        note_detail.judgement = judgement
 
-        if judgement == Judgement.PERFECT:
-            self.combo += 1
-            note_detail.score_bonus.extend(self.cache_score_bonus_skill)
-        elif judgement == Judgement.GREAT:
+        if judgement == Judgement.PERFECT or judgement == Judgement.GREAT:
             self.combo += 1
-            note_detail.score_great_bonus.extend(self.cache_score_great_bonus_skill)
         else:
             if judgement.value >= Judgement(combo_support_bonus + 2):
                 self.combo = 0
             else:
                 self.combo += 1
-        if self.combo > 1:
-            note_detail.combo_bonus.extend(self.cache_combo_bonus_skill)
         self.combos[note_idx] = self.combo
-        note_detail.combo = self.combo
 
         self.has_skill_change = False
 
@@ -1292,16 +1360,29 @@ class StateMachine:
                     self.life -= FLICK_DRAIN[self.difficulty]
                 else:
                     self.life -= NONFLICK_DRAIN[self.difficulty]
-        note_detail.life = int(self.life)
+
+        if self.detail:
+            note_detail = get_note_detail(self.note_details, note_idx + 1)
+            note_detail.judgement = judgement
+            if judgement == Judgement.PERFECT:
+                note_detail.score_bonus.extend(self.cache_score_bonus_skill)
+            elif judgement == Judgement.GREAT:
+                note_detail.score_great_bonus.extend(self.cache_score_great_bonus_skill)
+            if self.combo > 1:
+                note_detail.combo_bonus.extend(self.cache_combo_bonus_skill)
+            note_detail.combo = self.combo
+            note_detail.life = int(self.life)
 
     def _handle_note_abuse(self):
-        note_time = self.note_time_stack.pop(0)
-        note_delta = self.note_time_deltas.pop(0)
-        note_type = self.note_type_stack.pop(0)
-        note_idx = self.note_idx_stack.pop(0)
-        special_note_types = self.special_note_types.pop(0)
-        is_checkpoint = self.checkpoints.pop(0)
-        is_abuse = self.is_abuse.pop(0)
+        cursor = self.note_cursor
+        self.note_cursor += 1
+        note_time = self.note_time_stack[cursor]
+        note_delta = self.note_time_deltas[cursor]
+        note_type = self.note_type_stack[cursor]
+        note_idx = self.note_idx_stack[cursor]
+        special_note_types = self.special_note_types[cursor]
+        is_checkpoint = self.checkpoints[cursor]
+        is_abuse = self.is_abuse[cursor]
 
         if not is_abuse:
             self.combo += 1
@@ -1610,7 +1691,7 @@ class StateMachine:
                     magic_boosts[target[0]][1] = max(magic_boosts[target[0]][1], skill.values[1])
                     magic_boosts[target[1]][2] = max(magic_boosts[target[1]][2], skill.values[2])
             # All skill interval should be magic's interval here
-            num = int((self.skill_times[0] / 1E6 // skills[0].interval - 1) // self.unit_offset)
+            num = int((self.skill_times[self.skill_cursor] / 1E6 // skills[0].interval - 1) // self.unit_offset)
             magic_bonus = self.skill_details[magic_idx][num].magic_bonus
             target_texts = ("cu", "co", "pa")
             attr_texts = ("score", "combo", "life", "support")
@@ -1738,7 +1819,7 @@ class StateMachine:
                     temp_combo_support_results[magic_idx] = max(temp_combo_support_results[magic_idx], 2)
                     temp_combo_support_raw = max(temp_combo_support_raw, 2)
             # All skill interval should be magic's interval here
-            num = int((self.skill_times[0] / 1E6 // skills[0].interval - 1) // self.unit_offset)
+            num = int((self.skill_times[self.skill_cursor] / 1E6 // skills[0].interval - 1) // self.unit_offset)
             magic_bonus = self.skill_details[magic_idx + 1][num].magic_bonus
             magic_bonus['life'] = temp_life_raw
             magic_bonus['perfect_support'] = temp_support_raw
@@ -1938,7 +2019,7 @@ class StateMachine:
                         temp_sparkle_raw = max_none((temp_sparkle_raw, skill.v2))
                     else:
                         temp_combo_raw = max_none((temp_combo_raw, skill.v2))
-            num = int((self.skill_times[0] / 1E6 // skills[0].interval - 1) // self.unit_offset)
+            num = int((self.skill_times[self.skill_cursor] / 1E6 // skills[0].interval - 1) // self.unit_offset)
             magic_bonus = self.skill_details[magic_idx + 1][num].magic_bonus
             magic_bonus['tap'] = none_to_zero(temp_score_tap_raw)
             magic_bonus['long'] = none_to_zero(temp_score_long_raw)
@@ -2100,21 +2181,21 @@ class StateMachine:
         return self.cache_score_bonus, self.cache_score_great_bonus, self.cache_combo_bonus
 
     def _expand_magic(self):
-        skill = copy.deepcopy(self.reference_skills[self.skill_indices[0]])
-        if skill.is_magic or (skill.is_encore and self.skill_queue[self.skill_indices[0]].is_magic):
+        skill = copy.deepcopy(self.reference_skills[self.skill_indices[self.skill_cursor]])
+        if skill.is_magic or (skill.is_encore and self.skill_queue[self.skill_indices[self.skill_cursor]].is_magic):
             if skill.is_magic or self.force_encore_magic_to_encore_unit:
-                unit_idx = (self.skill_indices[0] - 1) // 5
+                unit_idx = (self.skill_indices[self.skill_cursor] - 1) // 5
             else:
-                unit_idx = (self.cache_enc[self.skill_indices[0]] - 1) // 5
+                unit_idx = (self.cache_enc[self.skill_indices[self.skill_cursor]] - 1) // 5
 
-            self.skill_queue[self.skill_indices[0]] = list()
+            self.skill_queue[self.skill_indices[self.skill_cursor]] = list()
             iterating_order = list()
             _cache_guard = list()
             _cache_alt = list()
             _cache_mut = list()
             _cache_ref = list()
-            magic_idx = self.skill_indices[0]
-            num = (int(self.skill_times[0] / 1E6 / skill.interval) - 1) // self.unit_offset
+            magic_idx = self.skill_indices[self.skill_cursor]
+            num = (int(self.skill_times[self.skill_cursor] / 1E6 / skill.interval) - 1) // self.unit_offset
             magic_bonus = self.skill_details[magic_idx][num].magic_bonus
             for idx in range(unit_idx * 5 + 1, unit_idx * 5 + 6):
                 copied_skill = copy.deepcopy(self.reference_skills[idx])
@@ -2138,7 +2219,7 @@ class StateMachine:
                         continue
                     # Else let magic copy the encored skill instead
 
-                copied_skill.set_card_idx(self.skill_indices[0] - 1)
+                copied_skill.set_card_idx(self.skill_indices[self.skill_cursor] - 1)
                 copied_skill.interval = skill.interval
                 copied_skill.duration = skill.duration
 
@@ -2165,22 +2246,19 @@ class StateMachine:
 
             iterating_order = _cache_guard + iterating_order + _cache_alt + _cache_mut + _cache_ref
             for _ in iterating_order:
-                self.skill_queue[self.skill_indices[0]].append(_)
+                self.skill_queue[self.skill_indices[self.skill_cursor]].append(_)
             if magic_bonus['guard']:
                 magic_bonus['overload'] = 0
 
     def _expand_encore(self):
-        skill = self.reference_skills[self.skill_indices[0]]
+        skill = self.reference_skills[self.skill_indices[self.skill_cursor]]
         if skill.is_encore:
-            idx = self.skill_indices[0]
-            num = (int(self.skill_times[0] / 1E6 / skill.interval) - 1) // self.unit_offset
+            idx = self.skill_indices[self.skill_cursor]
+            num = (int(self.skill_times[self.skill_cursor] / 1E6 / skill.interval) - 1) // self.unit_offset
             last_encoreable_skill = self._get_last_encoreable_skill()
             if last_encoreable_skill is None:
-                pop_skill_index = self.skill_indices.index(-self.skill_indices[0])
-                self.skill_times.pop(pop_skill_index)
-                self.skill_indices.pop(pop_skill_index)
-                self.skill_indices.pop(0)
-                self.skill_times.pop(0)
+                self._cancel_skill_deactivation()
+                self._advance_skill_cursor()
                 self.skill_details[idx][num].inact = SkillInact.NO_ENCOREABLE
                 return False
 
@@ -2189,9 +2267,9 @@ class StateMachine:
             encore_copy.duration = skill.duration
             encore_copy.cache_encore = True
 
-            self.skill_queue[self.skill_indices[0]] = encore_copy
-            self.cache_enc[self.skill_indices[0]] = last_encoreable_skill
-            if self.last_activated_time[-1] == self.skill_times[0]:
+            self.skill_queue[self.skill_indices[self.skill_cursor]] = encore_copy
+            self.cache_enc[self.skill_indices[self.skill_cursor]] = last_encoreable_skill
+            if self.last_activated_time[-1] == self.skill_times[self.skill_cursor]:
                 time = self.last_activated_time[-2] // 1E6
             else:
                 time = self.last_activated_time[-1] // 1E6
@@ -2201,7 +2279,7 @@ class StateMachine:
     def _get_last_encoreable_skill(self) -> Optional[int]:
         if len(self.last_activated_skill) == 0:
             return None
-        if self.skill_times[0] > self.last_activated_time[-1]:
+        if self.skill_times[self.skill_cursor] > self.last_activated_time[-1]:
             return self.last_activated_skill[-1]
         elif len(self.last_activated_time) == 1:
             return None
@@ -2210,10 +2288,10 @@ class StateMachine:
 
     def _evaluate_motif(self):
         skills_to_check = self._helper_get_current_skills()
-        unit_idx = (self.skill_indices[0] - 1) // 5
+        unit_idx = (self.skill_indices[self.skill_cursor] - 1) // 5
         for skill in skills_to_check:
             if skill.is_motif:
-                skill.v0 = self.live.unit.all_units[unit_idx].convert_motif(skill.skill_type, self.grand)
+                skill.v0 = self.context.motif_values[unit_idx][skill.skill_type]
                 skill.normalized = False
 
     def _evaluate_ls(self):
@@ -2232,11 +2310,10 @@ class StateMachine:
 
     def _evaluate_harmony(self):
         skills_to_check = self._helper_get_current_skills()
-        unit_idx = (self.skill_indices[0] - 1) // 5
+        unit_idx = (self.skill_indices[self.skill_cursor] - 1) // 5
         for skill in skills_to_check:
             if skill.is_harmony:
-                values = self.live.unit.all_units[unit_idx].convert_harmony(skill.targets_harmony[0],
-                                                                            skill.targets_harmony[1])
+                values = self.context.harmony_values[unit_idx][tuple(skill.targets_harmony)]
                 skill.values = (values[0], values[0], values[1], 0, 0)
 
     # noinspection PyTypeChecker
@@ -2245,13 +2322,13 @@ class StateMachine:
         for skill in skills_to_check:
             if skill.is_alternate or skill.is_mutual or skill.is_refrain:
                 if self.force_encore_amr_cache_to_encore_unit:
-                    unit_idx = (self.skill_indices[0] - 1) // 5
+                    unit_idx = (self.skill_indices[self.skill_cursor] - 1) // 5
                 else:
                     unit_idx = skill.original_unit_idx
                 self.unit_caches[unit_idx].update_amr(skill)
                 unit = self.unit_caches[unit_idx]
-                idx = self.skill_indices[0]
-                num = (int(self.skill_times[0] / 1E6 / skill.interval) - 1) // self.unit_offset
+                idx = self.skill_indices[self.skill_cursor]
+                num = (int(self.skill_times[self.skill_cursor] / 1E6 / skill.interval) - 1) // self.unit_offset
                 if skill.is_refrain:
                     bonuses = (unit.ref_tap[idx - 1], unit.ref_long[idx - 1], unit.ref_flick[idx - 1],
                                unit.ref_slide[idx - 1], unit.ref_great[idx - 1], unit.ref_combo[idx - 1])
@@ -2267,18 +2344,18 @@ class StateMachine:
                 amr_bonus['combo'] = (bonuses[5], unit.combo - 100) + unit.combo_update
 
     def _helper_get_current_skills(self) -> List[Skill]:
-        if self.skill_indices[0] not in self.skill_queue:
+        if self.skill_indices[self.skill_cursor] not in self.skill_queue:
             return []
-        skills_to_check = self.skill_queue[self.skill_indices[0]]
+        skills_to_check = self.skill_queue[self.skill_indices[self.skill_cursor]]
         if isinstance(skills_to_check, Skill):
             skills_to_check = [skills_to_check]
         return skills_to_check
 
     def _cache_skill_data(self):
         skills_to_check = self._helper_get_current_skills()
-        unit_idx = (self.skill_indices[0] - 1) // 5
+        unit_idx = (self.skill_indices[self.skill_cursor] - 1) // 5
         for skill in skills_to_check:
-            self.unit_caches[unit_idx].update(skill, self.skill_times[0] / 1E6)
+            self.unit_caches[unit_idx].update(skill, self.skill_times[self.skill_cursor] / 1E6)
 
     def _handle_skill_activation(self):
         def update_last_activated_skill(replace, skill_time):
@@ -2287,38 +2364,34 @@ class StateMachine:
             :type replace: True if new skill activates after the cached skill, False if same time
             :type skill_time: encore time to check for skills before that
             """
-            if self.reference_skills[self.skill_indices[0]].is_encore:
+            idx = self.skill_indices[self.skill_cursor]
+            if self.reference_skills[idx].is_encore:
                 return
             if replace:
-                self.last_activated_skill.append(self.skill_indices[0])
+                self.last_activated_skill.append(idx)
                 self.last_activated_time.append(skill_time)
             else:
-                self.last_activated_skill[-1] = min(self.last_activated_skill[-1], self.skill_indices[0])
+                self.last_activated_skill[-1] = min(self.last_activated_skill[-1], idx)
 
         # If skill is still not queued after self._expand_magic and self._expand_encore
-        if self.skill_indices[0] not in self.skill_queue:
-            self.skill_queue[self.skill_indices[0]] = copy.deepcopy(self.reference_skills[self.skill_indices[0]])
+        idx = self.skill_indices[self.skill_cursor]
+        if idx not in self.skill_queue:
+            self.skill_queue[idx] = copy.deepcopy(self.reference_skills[idx])
 
         # Pop deactivation out if skill cannot activate
         if not self._can_activate():
-            skill_id = self.skill_indices[0]
-            self.skill_queue.pop(self.skill_indices[0])
-            # First index of -skill_id should be the correct value
-            # because a skill cannot activate twice before deactivating once
-            pop_skill_index = self.skill_indices.index(-skill_id)
-            # Pop the deactivation first to avoid messing up the index
-            self.skill_times.pop(pop_skill_index)
-            self.skill_indices.pop(pop_skill_index)
-            # Don't need to pop the activation because it will be pop in the outer sub
+            self.skill_queue.pop(self.skill_indices[self.skill_cursor])
+            self._cancel_skill_deactivation()
+            # Don't need to advance past the activation because it will be done in the outer sub
             return
 
         # Update last activated skill for encore
         # If new skill is strictly after cached last skill, just replace it
-        if len(self.last_activated_time) == 0 or self.last_activated_time[-1] < self.skill_times[0]:
-            update_last_activated_skill(replace=True, skill_time=self.skill_times[0])
-        elif self.last_activated_time[-1] == self.skill_times[0]:
+        if len(self.last_activated_time) == 0 or self.last_activated_time[-1] < self.skill_times[self.skill_cursor]:
+            update_last_activated_skill(replace=True, skill_time=self.skill_times[self.skill_cursor])
+        elif self.last_activated_time[-1] == self.skill_times[self.skill_cursor]:
             # Else update taking skill index order into consideration
-            update_last_activated_skill(replace=False, skill_time=self.skill_times[0])
+            update_last_activated_skill(replace=False, skill_time=self.skill_times[self.skill_cursor])
 
     def _handle_life_drain(self, life_requirement) -> bool:
         if self.life > life_requirement:
@@ -2362,7 +2435,7 @@ class StateMachine:
         """
         Checks if a (list of) queued skill(s) can activate or not.
         """
-        skills_to_check = self.skill_queue[self.skill_indices[0]]
+        skills_to_check = self.skill_queue[self.skill_indices[self.skill_cursor]]
         is_magic = True
         magic_have_score_bonus = False
         magic_have_combo_bonus = False
@@ -2375,10 +2448,10 @@ class StateMachine:
         to_be_removed = list()
         magic_alt_mut_check = list()
         for skill in skills_to_check:
-            idx = self.skill_indices[0]
-            num = (int(self.skill_times[0] / 1E6 / skill.interval) - 1) // self.unit_offset
+            idx = self.skill_indices[self.skill_cursor]
+            num = (int(self.skill_times[self.skill_cursor] / 1E6 / skill.interval) - 1) // self.unit_offset
             if self.force_encore_amr_cache_to_encore_unit:
-                unit_idx = (self.skill_indices[0] - 1) // 5
+                unit_idx = (self.skill_indices[self.skill_cursor] - 1) // 5
             else:
                 unit_idx = skill.original_unit_idx
 
@@ -2469,15 +2542,15 @@ class StateMachine:
                 to_be_removed.append(skill)
                 continue
         if is_magic and len(skills_to_check) > len(to_be_removed):
-            idx = self.skill_indices[0]
+            idx = self.skill_indices[self.skill_cursor]
             interval = skills_to_check[0].interval
-            num = (int(self.skill_times[0] / 1E6 / interval) - 1) // self.unit_offset
+            num = (int(self.skill_times[self.skill_cursor] / 1E6 / interval) - 1) // self.unit_offset
             self.skill_details[idx][num].active = True
         for skill in to_be_removed:
             skills_to_check.remove(skill)
             if skill.probability > 0:
                 self.full_roll_chance /= skill.probability
-        self.skill_queue[self.skill_indices[0]] = skills_to_check
+        self.skill_queue[self.skill_indices[self.skill_cursor]] = skills_to_check
         return len(skills_to_check) > 0
 
     def get_note_scores(self) -> np.ndarray:
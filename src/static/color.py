@@ -17,20 +17,22 @@ CARD_GUI_COLORS = {
     "Passion": (252, 169, 38),
 }
 
-logger.debug("Creating chihiro.color_text...")
-
-db.cachedb.execute(""" DROP TABLE IF EXISTS color_text """)
-db.cachedb.execute("""
-    CREATE TABLE IF NOT EXISTS color_text (
-        "id" INTEGER UNIQUE PRIMARY KEY,
-        "text" TEXT UNIQUE
-    )
-""")
-for color in Color:
-    db.cachedb.execute("""
-        INSERT OR IGNORE INTO color_text ("id", "text")
-        VALUES (?,?)
-    """, [color.value + 1, color.name.capitalize()])
-db.cachedb.commit()
 
-logger.debug("chihiro.color_text created.")
+def create_color_text():
+    logger.debug("Creating chihiro.color_text...")
+
+    db.cachedb.execute(""" DROP TABLE IF EXISTS color_text """)
+    db.cachedb.execute("""
+        CREATE TABLE IF NOT EXISTS color_text (
+            "id" INTEGER UNIQUE PRIMARY KEY,
+            "text" TEXT UNIQUE
+        )
+    """)
+    for color in Color:
+        db.cachedb.execute("""
+            INSERT OR IGNORE INTO color_text ("id", "text")
+            VALUES (?,?)
+        """, [color.value + 1, color.name.capitalize()])
+    db.cachedb.commit()
+
+    logger.debug("chihiro.color_text created.")
@@ -149,20 +149,22 @@ _ = list(SKILL_BASE.keys())
 for l in _:
     SKILL_BASE[5000 + l] = SKILL_BASE[l]
 
-logger.debug("Creating chihiro.leader_keywords...")
 
-db.cachedb.execute(""" DROP TABLE IF EXISTS leader_keywords """)
-db.cachedb.execute("""
-    CREATE TABLE IF NOT EXISTS leader_keywords (
-        "id" INTEGER UNIQUE PRIMARY KEY,
-        "keywords" TEXT
-    )
-""")
-for skill_id, skill_data in SKILL_BASE.items():
+def create_leader_keywords():
+    logger.debug("Creating chihiro.leader_keywords...")
+
+    db.cachedb.execute(""" DROP TABLE IF EXISTS leader_keywords """)
     db.cachedb.execute("""
-        INSERT OR IGNORE INTO leader_keywords ("id", "keywords")
-        VALUES (?,?)
-    """, [skill_id, skill_data])
-db.cachedb.commit()
+        CREATE TABLE IF NOT EXISTS leader_keywords (
+            "id" INTEGER UNIQUE PRIMARY KEY,
+            "keywords" TEXT
+        )
+    """)
+    for skill_id, skill_data in SKILL_BASE.items():
+        db.cachedb.execute("""
+            INSERT OR IGNORE INTO leader_keywords ("id", "keywords")
+            VALUES (?,?)
+        """, [skill_id, skill_data])
+    db.cachedb.commit()
 
-logger.debug("chihiro.leader_keywords created.")
+    logger.debug("chihiro.leader_keywords created.")
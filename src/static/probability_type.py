@@ -9,21 +9,23 @@ PROBABILITY_BASE = {0: ("", ""),
                     4: ("High", "hi"),
                     5: ("Very High", "vh")}
 
-logger.debug("Creating chihiro.probability_keywords...")
 
-db.cachedb.execute(""" DROP TABLE IF EXISTS probability_keywords """)
-db.cachedb.execute("""
-    CREATE TABLE IF NOT EXISTS probability_keywords (
-        "id" INTEGER UNIQUE PRIMARY KEY,
-        "keywords" TEXT UNIQUE,
-        "short" TEXT UNIQUE
-    )
-""")
-for prob_id, (prob_name, prob_key) in PROBABILITY_BASE.items():
+def create_probability_keywords():
+    logger.debug("Creating chihiro.probability_keywords...")
+
+    db.cachedb.execute(""" DROP TABLE IF EXISTS probability_keywords """)
     db.cachedb.execute("""
-        INSERT OR IGNORE INTO probability_keywords ("id", "keywords", "short")
-        VALUES (?,?,?)
-    """, [prob_id, prob_name, prob_key])
-db.cachedb.commit()
+        CREATE TABLE IF NOT EXISTS probability_keywords (
+            "id" INTEGER UNIQUE PRIMARY KEY,
+            "keywords" TEXT UNIQUE,
+            "short" TEXT UNIQUE
+        )
+    """)
+    for prob_id, (prob_name, prob_key) in PROBABILITY_BASE.items():
+        db.cachedb.execute("""
+            INSERT OR IGNORE INTO probability_keywords ("id", "keywords", "short")
+            VALUES (?,?,?)
+        """, [prob_id, prob_name, prob_key])
+    db.cachedb.commit()
 
-logger.debug("chihiro.probability_keywords created.")
+    logger.debug("chihiro.probability_keywords created.")
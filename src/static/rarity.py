@@ -15,20 +15,21 @@ class Rarity(Enum):
     SSR = 8
 
 
-logger.debug("Creating chihiro.rarity_text...")
+def create_rarity_text():
+    logger.debug("Creating chihiro.rarity_text...")
 
-db.cachedb.execute(""" DROP TABLE IF EXISTS rarity_text """)
-db.cachedb.execute("""
-    CREATE TABLE IF NOT EXISTS rarity_text (
-        "id" INTEGER UNIQUE PRIMARY KEY,
-        "text" TEXT UNIQUE
-    )
-""")
-for rarity in Rarity:
+    db.cachedb.execute(""" DROP TABLE IF EXISTS rarity_text """)
     db.cachedb.execute("""
-        INSERT OR IGNORE INTO rarity_text ("id", "text")
-        VALUES (?,?)
-    """, [rarity.value, rarity.name.lower()])
-db.cachedb.commit()
+        CREATE TABLE IF NOT EXISTS rarity_text (
+            "id" INTEGER UNIQUE PRIMARY KEY,
+            "text" TEXT UNIQUE
+        )
+    """)
+    for rarity in Rarity:
+        db.cachedb.execute("""
+            INSERT OR IGNORE INTO rarity_text ("id", "text")
+            VALUES (?,?)
+        """, [rarity.value, rarity.name.lower()])
+    db.cachedb.commit()
 
-logger.debug("chihiro.rarity_text created.")
+    logger.debug("chihiro.rarity_text created.")
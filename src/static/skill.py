@@ -56,26 +56,29 @@ SKILL_COLOR_BY_NAME = {
     v['name']: v['color'] for v in SKILL_BASE.values()
 }
 
-logger.debug("Creating chihiro.skill_keywords...")
-
-db.cachedb.execute(""" DROP TABLE IF EXISTS skill_keywords """)
-db.cachedb.execute("""
-    CREATE TABLE IF NOT EXISTS skill_keywords (
-        "id" INTEGER UNIQUE PRIMARY KEY,
-        "skill_name" TEXT,
-        "keywords" TEXT
-    )
-""")
-for skill_id, skill_data in SKILL_BASE.items():
+
+def create_skill_keywords():
+    logger.debug("Creating chihiro.skill_keywords...")
+
+    db.cachedb.execute(""" DROP TABLE IF EXISTS skill_keywords """)
     db.cachedb.execute("""
-        INSERT OR IGNORE INTO skill_keywords ("id", "skill_name", "keywords")
-        VALUES (?,?,?)
-    """, [skill_id, skill_data['name'],
-          skill_data['name'] + " " + " ".join(skill_data['keywords'])
-          if 'keywords' in skill_data else skill_data['name']])
-db.cachedb.commit()
-
-logger.debug("chihiro.skill_keywords created.")
+        CREATE TABLE IF NOT EXISTS skill_keywords (
+            "id" INTEGER UNIQUE PRIMARY KEY,
+            "skill_name" TEXT,
+            "keywords" TEXT
+        )
+    """)
+    for skill_id, skill_data in SKILL_BASE.items():
+        db.cachedb.execute("""
+            INSERT OR IGNORE INTO skill_keywords ("id", "skill_name", "keywords")
+            VALUES (?,?,?)
+        """, [skill_id, skill_data['name'],
+              skill_data['name'] + " " + " ".join(skill_data['keywords'])
+              if 'keywords' in skill_data else skill_data['name']])
+    db.cachedb.commit()
+
+    logger.debug("chihiro.skill_keywords created.")
+
 
 SPARKLE_BONUS_SSR = OrderedDict({_[0]: _[1] for idx, _ in enumerate(db.masterdb.execute_and_fetchall(
     "SELECT life_value / 10, type_01_value FROM skill_life_value ORDER BY life_value"))})
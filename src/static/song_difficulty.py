@@ -130,20 +130,22 @@ PERFECT_TAP_RANGE = {
     Difficulty.FORTE: 60000,
 }
 
-logger.debug("Creating chihiro.difficulty_text...")
-
-db.cachedb.execute(""" DROP TABLE IF EXISTS difficulty_text """)
-db.cachedb.execute("""
-    CREATE TABLE IF NOT EXISTS difficulty_text (
-        "id" INTEGER UNIQUE PRIMARY KEY,
-        "text" TEXT UNIQUE
-    )
-""")
-for diff in Difficulty:
+
+def create_difficulty_text():
+    logger.debug("Creating chihiro.difficulty_text...")
+
+    db.cachedb.execute(""" DROP TABLE IF EXISTS difficulty_text """)
     db.cachedb.execute("""
-        INSERT OR IGNORE INTO difficulty_text ("id", "text")
-        VALUES (?,?)
-    """, [diff.value, diff.name.replace("MPLUS", "Master+").capitalize()])
-db.cachedb.commit()
+        CREATE TABLE IF NOT EXISTS difficulty_text (
+            "id" INTEGER UNIQUE PRIMARY KEY,
+            "text" TEXT UNIQUE
+        )
+    """)
+    for diff in Difficulty:
+        db.cachedb.execute("""
+            INSERT OR IGNORE INTO difficulty_text ("id", "text")
+            VALUES (?,?)
+        """, [diff.value, diff.name.replace("MPLUS", "Master+").capitalize()])
+    db.cachedb.commit()
 
-logger.debug("chihiro.difficulty_text created.")
+    logger.debug("chihiro.difficulty_text created.")
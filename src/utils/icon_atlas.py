@@ -0,0 +1,131 @@
+"""
+Card icons of each size packed into a few sprite sheets with a card ID -> position index.
+An atlas is rebuilt when the listing of its icon directory changes, custom cards are never packed.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+import customlogger as logger
+from settings import ATLAS_PATH, IMAGE_PATH, IMAGE_PATH32, IMAGE_PATH64
+from utils import storage
+
+# Bump when the sheet layout or the index format changes
+ATLAS_VERSION = 1
+SHEET_SIZE = 4096
+ICON_DIRS: Dict[int, Tuple[Path, str]] = {
+    32: (IMAGE_PATH32, "jpg"),
+    64: (IMAGE_PATH64, "jpg"),
+    124: (IMAGE_PATH, "png"),
+}
+
+
+def _is_custom(card_id: int) -> bool:
+    return 500000 < card_id < 600000
+
+
+def get_index_path(size: int, atlas_path: Path = ATLAS_PATH) -> Path:
+    return atlas_path / "atlas{}.json".format(size)
+
+
+def _get_sources(size: int, icon_dir: Path = None) -> Dict[int, os.DirEntry]:
+    if icon_dir is None:
+        icon_dir = ICON_DIRS[size][0]
+    extension = "." + ICON_DIRS[size][1]
+    sources = dict()
+    if not icon_dir.exists():
+        return sources
+    with os.scandir(icon_dir) as entries:
+        for entry in entries:
+            stem = entry.name[:-len(extension)]
+            if entry.name.endswith(extension) and stem.isdigit() and not _is_custom(int(stem)):
+                sources[int(stem)] = entry
+    return sources
+
+
+def _get_source_hash(sources: Dict[int, os.DirEntry]) -> str:
+    # Directory entries carry their stat on Windows, so this does not open any icon
+    digest = hashlib.sha256(str(ATLAS_VERSION).encode())
+    for card_id in sorted(sources):
+        stat = sources[card_id].stat()
+        digest.update("{}:{}:{};".format(card_id, stat.st_size, stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def load_index(size: int, atlas_path: Path = ATLAS_PATH) -> Optional[dict]:
+    try:
+        with storage.get_reader(get_index_path(size, atlas_path), 'r') as fr:
+            index = json.load(fr)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != ATLAS_VERSION:
+        return None
+    return index
+
+
+def build_atlas(size: int, icon_dir: Path = None, atlas_path: Path = ATLAS_PATH) -> bool:
+    """
+    Pack the icons of a size into sheets of at most SHEET_SIZE pixels a side, unless the atlas is up to date.
+    Returns whether the atlas was rebuilt.
+    """
+    sources = _get_sources(size, icon_dir)
+    source_hash = _get_source_hash(sources)
+    index = load_index(size, atlas_path)
+    if index is not None and index["hash"] == source_hash:
+        return False
+
+    mode = "RGBA" if ICON_DIRS[size][1] == "png" else "RGB"
+    per_row = SHEET_SIZE // size
+    per_sheet = per_row * per_row
+    card_ids = sorted(sources)
+    sheets = list()
+    icons = dict()
+    atlas_path.mkdir(parents=True, exist_ok=True)
+    for sheet_idx, start in enumerate(range(0, len(card_ids), per_sheet)):
+        sheet_card_ids = card_ids[start:start + per_sheet]
+        rows = (len(sheet_card_ids) + per_row - 1) // per_row
+        sheet = Image.new(mode, (min(len(sheet_card_ids), per_row) * size, rows * size))
+        for idx, card_id in enumerate(sheet_card_ids):
+            try:
+                with Image.open(sources[card_id].path) as icon:
+                    icon = icon.convert(mode)
+                    if icon.size != (size, size):
+                        icon = icon.resize((size, size), Image.LANCZOS)
+            except OSError as e:
+                logger.debug("Skipping unreadable icon {}: {}".format(sources[card_id].path, e))
+                continue
+            x, y = idx % per_row * size, idx // per_row * size
+            sheet.paste(icon, (x, y))
+            icons[str(card_id)] = [sheet_idx, x, y]
+        # Sheets are named after the hash so an atlas in use is never overwritten
+        sheet_name = "atlas{}_{}_{}.png".format(size, source_hash[:12], sheet_idx)
+        temp_path = atlas_path / "{}.part".format(sheet_name)
+        sheet.save(str(temp_path), format="PNG")
+        os.replace(temp_path, atlas_path / sheet_name)
+        sheets.append(sheet_name)
+
+    index_path = get_index_path(size, atlas_path)
+    temp_path = atlas_path / "{}.part".format(index_path.name)
+    with storage.get_writer(temp_path, 'w') as fw:
+        json.dump({"version": ATLAS_VERSION, "hash": source_hash, "size": size, "sheets": sheets, "icons": icons}, fw)
+    os.replace(temp_path, index_path)
+    for path in atlas_path.glob("atlas{}_*.png".format(size)):
+        if path.name not in sheets:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    logger.info("Built {}px icon atlas of {} icons in {} sheets".format(size, len(icons), len(sheets)))
+    return True
+
+
+def build_atlases():
+    for size in ICON_DIRS:
+        try:
+            build_atlas(size)
+        except OSError as e:
+            logger.error("Failed to build {}px icon atlas: {}".format(size, e))
@@ -0,0 +1,208 @@
+"""
+A priority queue of jobs run by a fixed number of worker threads.
+Jobs with the same key are run once for everyone waiting on them, and each group (a calculator row) waits on at most
+one job, so submitting again for a group replaces its stale request.
+"""
+import heapq
+import itertools
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import customlogger as logger
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class _Request:
+    group: Optional[Hashable]
+    on_done: Callable[[Any], None]
+    on_status: Optional[Callable[[str, int, int], None]]
+
+    def __init__(self, group: Optional[Hashable], on_done: Callable[[Any], None],
+                 on_status: Optional[Callable[[str, int, int], None]]):
+        self.group = group
+        self.on_done = on_done
+        self.on_status = on_status
+
+
+class Job:
+    key: Hashable
+    function: Callable[[], Any]
+    priority: int
+    status: str
+    requests: List[_Request]
+
+    def __init__(self, key: Hashable, function: Callable[[], Any], priority: int):
+        self.key = key
+        self.function = function
+        self.priority = priority
+        self.status = QUEUED
+        self.requests = list()
+
+
+class JobScheduler:
+    """
+    Higher priorities run first, equal priorities in submission order. Callbacks are called from the worker threads,
+    a running job cannot be interrupted so cancelling it only discards its result.
+    """
+
+    def __init__(self, workers: int, name: str = "jobs"):
+        self._condition = threading.Condition()
+        self._queue: List[Tuple[int, int, Job]] = list()
+        self._counter = itertools.count()
+        self._jobs: Dict[Hashable, Job] = dict()
+        self._groups: Dict[Hashable, Job] = dict()
+        self._done = 0
+        self._total = 0
+        self._shutdown = False
+        self._workers = [threading.Thread(target=self._work, name="{}-{}".format(name, idx), daemon=True)
+                         for idx in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    @staticmethod
+    def _notify(notifications: List[Tuple[_Request, str]], progress: Tuple[int, int]):
+        done, total = progress
+        for request, status in notifications:
+            if request.on_status is None:
+                continue
+            try:
+                request.on_status(status, done, total)
+            except Exception as e:
+                logger.error("Job status callback failed: {}".format(e))
+
+    def _detach(self, group: Hashable, notifications: List[Tuple[_Request, str]]):
+        # Caller holds the lock
+        job = self._groups.pop(group, None)
+        if job is None:
+            return
+        for request in [_ for _ in job.requests if _.group == group]:
+            job.requests.remove(request)
+            notifications.append((request, CANCELLED))
+        if not job.requests and job.status in (QUEUED, RUNNING):
+            self._done += 1
+            job.status = CANCELLED
+            self._jobs.pop(job.key, None)
+
+    def _reset_progress(self):
+        # Caller holds the lock
+        if not self._jobs:
+            self._done = 0
+            self._total = 0
+
+    def submit(self, key: Hashable, function: Callable[[], Any], on_done: Callable[[Any], None],
+               group: Hashable = None, priority: int = 0,
+               on_status: Callable[[str, int, int], None] = None) -> Job:
+        """
+        on_done(result) is called once the job succeeds, on_status(status, done, total) whenever the request is queued,
+        starts running, finishes, fails or is cancelled, with the number of jobs done out of those submitted since
+        the scheduler was last idle.
+        """
+        notifications = list()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            request = _Request(group, on_done, on_status)
+            if group is not None:
+                previous = self._groups.get(group)
+                if previous is not None and previous.key == key:
+                    # Same inputs, the outstanding job answers the new request instead
+                    previous.requests = [_ for _ in previous.requests if _.group != group]
+                    self._groups.pop(group)
+                else:
+                    self._detach(group, notifications)
+            self._reset_progress()
+            job = self._jobs.get(key)
+            if job is None:
+                job = Job(key, function, priority)
+                self._jobs[key] = job
+                self._total += 1
+                heapq.heappush(self._queue, (-priority, next(self._counter), job))
+                self._condition.notify()
+            elif job.status == QUEUED and priority > job.priority:
+                # The old entry is skipped when popped
+                job.priority = priority
+                heapq.heappush(self._queue, (-priority, next(self._counter), job))
+            job.requests.append(request)
+            if group is not None:
+                self._groups[group] = job
+            notifications.append((request, job.status))
+            progress = self._done, self._total
+        self._notify(notifications, progress)
+        return job
+
+    def cancel(self, group: Hashable):
+        notifications = list()
+        with self._condition:
+            self._detach(group, notifications)
+            progress = self._done, self._total
+            self._reset_progress()
+        self._notify(notifications, progress)
+
+    def cancel_all(self):
+        notifications = list()
+        with self._condition:
+            for group in list(self._groups):
+                self._detach(group, notifications)
+            progress = self._done, self._total
+            self._reset_progress()
+        self._notify(notifications, progress)
+
+    def _next_job(self) -> Optional[Job]:
+        with self._condition:
+            while True:
+                while self._queue:
+                    priority, _, job = heapq.heappop(self._queue)
+                    if job.status == QUEUED and -priority == job.priority:
+                        job.status = RUNNING
+                        return job
+                if self._shutdown:
+                    return None
+                self._condition.wait()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            with self._condition:
+                notifications = [(request, RUNNING) for request in job.requests]
+                progress = self._done, self._total
+            self._notify(notifications, progress)
+            result, failed = None, False
+            try:
+                result = job.function()
+            except Exception as e:
+                failed = True
+                logger.error("Job {} failed: {}".format(job.key, e))
+            with self._condition:
+                requests = list(job.requests) if job.status == RUNNING else list()
+                if job.status == RUNNING:
+                    self._done += 1
+                    job.status = FAILED if failed else DONE
+                    self._jobs.pop(job.key, None)
+                    for request in requests:
+                        if request.group is not None and self._groups.get(request.group) is job:
+                            self._groups.pop(request.group)
+                progress = self._done, self._total
+                self._reset_progress()
+            if not failed:
+                for request in requests:
+                    try:
+                        request.on_done(result)
+                    except Exception as e:
+                        logger.error("Job callback failed: {}".format(e))
+            self._notify([(request, FAILED if failed else DONE) for request in requests], progress)
+
+    def shutdown(self, wait: bool = True):
+        self.cancel_all()
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -1,3 +1,4 @@
+import mmap
 import os
 from itertools import chain, combinations
 from math import ceil, log2
@@ -18,6 +19,22 @@ def decompress(bytes):
     return lz4.block.decompress(bytes[16:], length, True)
 
 
+def decompress_file(source, destination):
+    """
+    Decompress the asset at source into destination through a temporary file, destination stays intact until the
+    new content is complete. The compressed data is memory mapped instead of read into memory.
+    """
+    temp_path = destination.parent / "{}.part".format(destination.name)
+    with open(source, 'rb') as fr, mmap.mmap(fr.fileno(), 0, access=mmap.ACCESS_READ) as compressed:
+        length = int.from_bytes(compressed[4:8], "little")
+        with memoryview(compressed) as view, view[16:] as block:
+            data = lz4.block.decompress(block, length, True)
+    with open(temp_path, 'wb') as fwb:
+        fwb.write(data)
+    del data
+    os.replace(temp_path, destination)
+
+
 def sortbased_randn(N, notes):
     bins = np.zeros((N, notes, 3))
     simulated_play = np.digitize(np.random.randn(N, notes), bins=[-1, 1])
@@ -26,6 +43,11 @@ def sortbased_randn(N, notes):
     return bins
 
 
+def get_trial_rng(seed: int, trial: int) -> np.random.Generator:
+    # Same stream as the trial-th child of SeedSequence(seed).spawn(), so any trial can be rebuilt on its own
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(trial,)))
+
+
 def powerset(iterable):
     s = list(iterable)
     return chain.from_iterable(combinations(s, r) for r in range(len(s) + 1))
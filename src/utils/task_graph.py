@@ -0,0 +1,106 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, List, Dict, Set
+
+import customlogger as logger
+
+
+class Task:
+    name: str
+    function: Callable[[], None]
+    dependencies: List[str]
+    deferred: bool
+    main_thread: bool
+
+    def __init__(self, name: str, function: Callable[[], None], dependencies: Iterable[str] = (),
+                 deferred: bool = False, main_thread: bool = False):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.deferred = deferred
+        self.main_thread = main_thread
+
+
+class TaskGraph:
+    """
+    Tasks run as soon as their dependencies are done, independent tasks run concurrently.
+    Deferred tasks are left out of run() and run later by run_deferred(), nothing else may depend on them.
+    Main thread tasks run on the thread calling run() while the pool works on the others, they cannot be deferred.
+    """
+
+    def __init__(self, tasks: List[Task]):
+        self.tasks = {task.name: task for task in tasks}
+        self.timings: Dict[str, float] = dict()
+        if len(self.tasks) != len(tasks):
+            raise ValueError("Duplicate task names")
+        for task in tasks:
+            if task.deferred and task.main_thread:
+                raise ValueError("Deferred task {} cannot run on the main thread".format(task.name))
+            for dependency in task.dependencies:
+                if dependency not in self.tasks:
+                    raise ValueError("Task {} depends on unknown task {}".format(task.name, dependency))
+                if self.tasks[dependency].deferred and not task.deferred:
+                    raise ValueError("Task {} depends on deferred task {}".format(task.name, dependency))
+        self._check_cycles()
+
+    def _check_cycles(self):
+        done = set()
+        remaining = dict(self.tasks)
+        while remaining:
+            ready = [name for name, task in remaining.items() if all(_ in done for _ in task.dependencies)]
+            if not ready:
+                raise ValueError("Cyclic dependencies between {}".format(sorted(remaining)))
+            for name in ready:
+                done.add(name)
+                remaining.pop(name)
+
+    def _run_task(self, task: Task) -> float:
+        start_time = time.perf_counter()
+        task.function()
+        return time.perf_counter() - start_time
+
+    def _finish(self, name: str, get_timing: Callable[[], float], running: Dict[Future, str], done: Set[str]):
+        try:
+            self.timings[name] = get_timing()
+        except Exception:
+            logger.error("Startup task {} failed".format(name))
+            for other in running:
+                other.cancel()
+            raise
+        done.add(name)
+        logger.debug("Startup task {} finished in {:.3f}s".format(name, self.timings[name]))
+
+    def _run(self, tasks: List[Task], workers: int):
+        names = {task.name for task in tasks}
+        pending = {task.name: task for task in tasks}
+        done = set()
+        running = dict()
+        main_tasks = list()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="startup") as executor:
+            while pending or running or main_tasks:
+                # Dependencies outside this run already ran in an earlier one
+                for name, task in list(pending.items()):
+                    if all(_ in done or _ not in names for _ in task.dependencies):
+                        if task.main_thread:
+                            main_tasks.append(task)
+                        else:
+                            running[executor.submit(self._run_task, task)] = name
+                        pending.pop(name)
+                if main_tasks:
+                    # One at a time, tasks it unblocks are submitted before the next one
+                    task = main_tasks.pop(0)
+                    self._finish(task.name, lambda: self._run_task(task), running, done)
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._finish(running.pop(future), future.result, running, done)
+
+    def run(self, workers: int = 4):
+        start_time = time.perf_counter()
+        self._run([task for task in self.tasks.values() if not task.deferred], workers)
+        logger.info("Startup tasks finished in {:.3f}s".format(time.perf_counter() - start_time))
+
+    def run_deferred(self, workers: int = 4):
+        start_time = time.perf_counter()
+        self._run([task for task in self.tasks.values() if task.deferred], workers)
+        logger.info("Deferred startup tasks finished in {:.3f}s".format(time.perf_counter() - start_time))
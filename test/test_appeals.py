@@ -1,5 +1,6 @@
 import unittest
 
+import initializer
 from logic.card import Card
 from logic.live import Live
 from logic.unit import Unit
@@ -8,6 +9,10 @@ from static.appeal_presets import APPEAL_PRESETS
 from static.song_difficulty import Difficulty
 
 
+def setUpModule():
+    initializer.load_cache_tables()
+
+
 class TestAppeal(unittest.TestCase):
     def test_bonus_chara(self):
         sae4 = Card.from_query("sae4", custom_pots=(0, 10, 10, 0, 10))
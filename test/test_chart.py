@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logic.chart import CompiledChart
+from static.note_type import NoteType
+from static.song_difficulty import Difficulty
+
+
+def _get_notes() -> pd.DataFrame:
+    notes = pd.DataFrame({
+        "sec": [1.0, 1.5, 2.0, 3.0, 3.5, 4.0],
+        "type": [2, 1, 1, 3, 3, 3],
+        "finishPos": [1, 2, 1, 3, 3, 3],
+        "status": [0, 0, 1, 0, 0, 0],
+        "groupId": [0, 0, 0, 1, 1, 1],
+    })
+    notes["note_type"] = [NoteType.LONG, NoteType.TAP, NoteType.FLICK,
+                          NoteType.SLIDE, NoteType.SLIDE, NoteType.SLIDE]
+    return notes
+
+
+class TestCompiledChart(unittest.TestCase):
+    def test_compile(self):
+        chart = CompiledChart.compile(1, Difficulty.MASTER, _get_notes())
+        self.assertEqual(chart.is_long.tolist(), [True, False, True, False, False, False])
+        self.assertEqual(chart.checkpoints.tolist(), [False, False, False, False, True, False])
+        self.assertEqual(chart.special_note_types[2], [NoteType.FLICK, NoteType.LONG])
+        self.assertEqual(len(chart.weights), chart.note_count)
+        self.assertFalse(chart.sec.flags.writeable)
+
+        mirrored = CompiledChart.compile(1, Difficulty.PIANO, _get_notes(), mirror=True)
+        self.assertEqual(mirrored.lane.tolist(), [16, 15, 15, 14, 14, 14])
+
+    def test_save_load(self):
+        chart = CompiledChart.compile(1, Difficulty.MASTER, _get_notes())
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "m001_4.npz"
+            chart.save(path)
+            loaded = CompiledChart.load(path, 1, Difficulty.MASTER, False)
+        for field in ("sec", "note_type", "lane", "checkpoints", "weights"):
+            self.assertTrue(np.array_equal(getattr(chart, field), getattr(loaded, field)))
+        self.assertEqual(chart.note_types, loaded.note_types)
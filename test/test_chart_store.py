@@ -0,0 +1,55 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from db.chart_store import ChartStore, build_chart_store
+
+CHART_CSV = """id,sec,type,startPos,finishPos,status,sync,groupId
+1,1.5,1,3,3,0,0,0
+2,2.25,2,1,1,0,0,0
+3,3.0,2,1,1,1,0,0
+"""
+
+WITCH_CSV = """id,sec,type,startPos,finishPos,status,sync,groupId,visible
+1,1.0,1,3,3,0,0,0,
+2,2.0,8,1,1,0,0,0,-1
+"""
+
+
+class TestChartStore(unittest.TestCase):
+    def test_build_load(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            conn = sqlite3.connect(temp_dir / "musicscores_m001.db")
+            conn.execute("CREATE TABLE blobs (name TEXT, data BLOB)")
+            conn.execute("INSERT INTO blobs VALUES (?, ?)", ["musicscores/m001/1_4.csv", CHART_CSV.encode()])
+            conn.execute("INSERT INTO blobs VALUES (?, ?)", ["musicscores/m001/1_6.csv", WITCH_CSV.encode()])
+            conn.commit()
+            conn.close()
+
+            build_chart_store(temp_dir / "charts.bin", temp_dir)
+            store = ChartStore(temp_dir / "charts.bin")
+            master = store.load_chart(1, 4)
+            witch = store.load_chart(1, 6)
+            self.assertIsNone(store.load_chart(1, 5))
+            self.assertNotIn("visible", master)
+            self.assertEqual(list(master), ["id", "sec", "type", "startPos", "finishPos", "status", "sync", "groupId"])
+            self.assertEqual(master["sec"].tolist(), [1.5, 2.25, 3.0])
+            self.assertEqual(master["finishPos"].tolist(), [3, 1, 1])
+            self.assertTrue(np.isnan(witch["visible"][0]))
+            self.assertEqual(witch["visible"][1], -1)
+            store.close()
+
+    def test_unexpected_type(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            conn = sqlite3.connect(temp_dir / "musicscores_m001.db")
+            conn.execute("CREATE TABLE blobs (name TEXT, data BLOB)")
+            conn.execute("INSERT INTO blobs VALUES (?, ?)",
+                         ["musicscores/m001/1_4.csv", CHART_CSV.replace("1,1.5,1,3", "1,1.5,a,3").encode()])
+            conn.commit()
+            conn.close()
+            self.assertRaises(ValueError, build_chart_store, temp_dir / "charts.bin", temp_dir)
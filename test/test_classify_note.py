@@ -1,10 +1,13 @@
+import multiprocessing
 import unittest
+from concurrent.futures import ProcessPoolExecutor
 from io import StringIO
 
 import pandas as pd
 
 from db import db
-from logic.live import classify_note, classify_note_vectorized
+from logic.chart_features import classify_note_vectorized, extract_chart_features
+from logic.live import classify_note
 from network.chart_cache_updater import _get_song_list, _expand_song_list
 from settings import MUSICSCORES_PATH
 import customlogger as logger
@@ -38,3 +41,12 @@ class ClassifyNote(unittest.TestCase):
             self.assertTrue((note_types == note_types_vectorized).all(),
                             msg=f'Failed for ldid={ldid} (live_id={live_data["live_id"]}, diff={live_data["diff"]}')
 
+    def test_spawned_features(self):
+        # Chart features are extracted in spawned workers, which must not rebuild chihiro.db tables on import
+        live_detail_id, live_id, difficulty = db.cachedb.execute_and_fetchone(
+            "SELECT live_detail_id, live_id, difficulty FROM live_detail_cache")
+        data_version = db.cachedb.execute_and_fetchone("PRAGMA data_version")[0]
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            features = pool.submit(extract_chart_features, live_id, difficulty).result()
+        self.assertEqual(features, extract_chart_features(live_id, difficulty), msg="ldid={}".format(live_detail_id))
+        self.assertEqual(db.cachedb.execute_and_fetchone("PRAGMA data_version")[0], data_version)
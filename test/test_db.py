@@ -0,0 +1,72 @@
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from db.db import CustomDB
+
+
+class TestCustomDB(unittest.TestCase):
+    def test_thread_connections(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "test.db"
+            with CustomDB(path, wal=True) as conn:
+                self.assertEqual(conn.execute_and_fetchone("PRAGMA journal_mode")[0], "wal")
+                conn.execute("CREATE TABLE test (value INTEGER)")
+                conn.execute("INSERT INTO test VALUES (?)", [1])
+                conn.commit()
+
+                connections = list()
+                thread = threading.Thread(target=lambda: connections.append(conn.get_connection()))
+                thread.start()
+                thread.join()
+                self.assertIsNot(connections[0], conn.get_connection())
+                # Closed once the thread has ended, while a thread that is still running keeps its connection
+                self.assertRaises(sqlite3.ProgrammingError, connections[0].execute, "SELECT 1")
+                started, release = threading.Event(), threading.Event()
+
+                def hold():
+                    connections.append(conn.get_connection())
+                    started.set()
+                    release.wait(5)
+                    connections[-1].execute("SELECT 1")
+
+                holder = threading.Thread(target=hold)
+                holder.start()
+                started.wait(5)
+                conn.get_connection()
+                other = threading.Thread(target=conn.get_connection)
+                other.start()
+                other.join()
+                release.set()
+                holder.join()
+                self.assertEqual(conn.execute_and_fetchone("SELECT 1"), (1,))
+
+            with CustomDB(path, read_only=True) as conn:
+                self.assertEqual(conn.execute_and_fetchall("SELECT value FROM test"), [(1,)])
+                self.assertRaises(sqlite3.OperationalError, conn.execute, "INSERT INTO test VALUES (2)")
+
+    def test_transaction(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with CustomDB(Path(temp_dir) / "test.db", wal=True) as conn:
+                conn.execute("CREATE TABLE test (value INTEGER)")
+                conn.commit()
+                with conn.transaction():
+                    conn.executemany("INSERT INTO test VALUES (?)", [[1], [2]])
+                    conn.commit()
+                    with conn.transaction():
+                        conn.execute("INSERT INTO test VALUES (?)", [3])
+                with self.assertRaises(ValueError):
+                    with conn.transaction():
+                        conn.execute("INSERT INTO test VALUES (?)", [4])
+                        raise ValueError
+                self.assertEqual(conn.execute_and_fetchall("SELECT value FROM test ORDER BY value"),
+                                 [(1,), (2,), (3,)])
+                with self.assertRaises(sqlite3.IntegrityError):
+                    with conn.transaction():
+                        conn.execute("DROP TABLE test")
+                        conn.execute("CREATE TABLE test (value INTEGER PRIMARY KEY)")
+                        conn.executemany("INSERT INTO test VALUES (?)", [[5], [5]])
+                self.assertEqual(conn.execute_and_fetchall("SELECT value FROM test ORDER BY value"),
+                                 [(1,), (2,), (3,)])
@@ -0,0 +1,48 @@
+import unittest
+
+from gui.events.utils.eventbus_stats import EventBusStats
+
+
+class _Pool:
+    def __init__(self, active):
+        self.active = active
+
+    def activeThreadCount(self):
+        return self.active
+
+    def maxThreadCount(self):
+        return 4
+
+
+class _Event:
+    pass
+
+
+def handle_event(registrant, event):
+    pass
+
+
+class TestEventBusStats(unittest.TestCase):
+    def test_counters(self):
+        stats = EventBusStats()
+        key = stats.get_key(handle_event, _Event())
+        self.assertEqual(key, "_Event:handle_event")
+
+        stats.record_submit(False, stats.sample_pool(_Pool(2)))
+        stats.record_submit(True, stats.sample_pool(_Pool(4)))
+        stats.record_submit(False, stats.sample_pool(_Pool(4)))
+        stats.record_drop()
+        stats.record_start()
+        stats.record_handler(key, 0.003, False, asynchronous=True)
+        stats.record_handler(key, 2.0, True, asynchronous=False)
+
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot["submitted"], snapshot["dropped"], snapshot["queued"]), (3, 1, 1))
+        self.assertEqual((snapshot["pending"], snapshot["max_pending"], snapshot["running"]), (1, 3, 0))
+        self.assertAlmostEqual(snapshot["occupancy_mean"], 2.5 / 3)
+        self.assertEqual(snapshot["occupancy_max"], 1)
+        handler = snapshot["handlers"][key]
+        self.assertEqual((handler["count"], handler["errors"]), (2, 1))
+        self.assertEqual(handler["buckets"]["5"], 1)
+        self.assertEqual(handler["buckets"]["5000"], 1)
+        self.assertIn(key, stats.format(snapshot))
@@ -0,0 +1,38 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from utils.icon_atlas import build_atlas, load_index
+
+
+class TestIconAtlas(unittest.TestCase):
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            icon_dir = temp_dir / "img32"
+            atlas_path = temp_dir / "atlas"
+            icon_dir.mkdir()
+            colors = {100001: (255, 0, 0), 100002: (0, 0, 255), 300123: (0, 255, 0)}
+            for card_id, color in colors.items():
+                Image.new("RGB", (32, 32), color).save(str(icon_dir / "{:06d}.jpg".format(card_id)), format="JPEG")
+            # Custom cards are not packed
+            Image.new("RGB", (32, 32)).save(str(icon_dir / "500001.jpg"), format="JPEG")
+
+            self.assertTrue(build_atlas(32, icon_dir, atlas_path))
+            self.assertFalse(build_atlas(32, icon_dir, atlas_path))
+            index = load_index(32, atlas_path)
+            self.assertEqual(sorted(index["icons"]), ["100001", "100002", "300123"])
+            self.assertEqual(len(index["sheets"]), 1)
+            with Image.open(str(atlas_path / index["sheets"][0])) as sheet:
+                for card_id, color in colors.items():
+                    _, x, y = index["icons"][str(card_id)]
+                    pixel = sheet.getpixel((x + 16, y + 16))
+                    self.assertTrue(all(abs(a - b) < 8 for a, b in zip(pixel, color)))
+
+            Image.new("RGB", (32, 32)).save(str(icon_dir / "100003.jpg"), format="JPEG")
+            self.assertTrue(build_atlas(32, icon_dir, atlas_path))
+            index = load_index(32, atlas_path)
+            self.assertIn("100003", index["icons"])
+            self.assertEqual(sorted(_.name for _ in atlas_path.glob("*.png")), index["sheets"])
@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+from utils.job_scheduler import JobScheduler, CANCELLED, DONE, QUEUED, RUNNING
+
+
+class TestJobScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = JobScheduler(workers=1, name="test-jobs")
+        # Keeps the only worker busy so the queue can be arranged
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+        def block():
+            self.started.set()
+            self.release.wait(5)
+            return "blocker"
+
+        self.scheduler.submit("blocker", block, lambda _: None)
+        self.assertTrue(self.started.wait(5))
+
+    def tearDown(self):
+        self.release.set()
+        self.scheduler.shutdown()
+
+    def test_priority_and_coalescing(self):
+        order = list()
+        results = dict()
+        finished = threading.Event()
+
+        def job(name):
+            def inner():
+                order.append(name)
+                return name
+
+            return inner
+
+        def collect(group):
+            def inner(result):
+                results[group] = result
+                if len(results) == 4:
+                    finished.set()
+
+            return inner
+
+        self.scheduler.submit("low", job("low"), collect("row0"), group="row0")
+        self.scheduler.submit("same", job("same"), collect("row1"), group="row1")
+        # Coalesced into the job above, which takes the higher priority
+        self.scheduler.submit("same", job("duplicate"), collect("row2"), group="row2", priority=5)
+        self.scheduler.submit("clicked", job("clicked"), collect("row3"), group="row3", priority=10)
+        self.release.set()
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(order, ["clicked", "same", "low"])
+        self.assertEqual(results, {"row0": "low", "row1": "same", "row2": "same", "row3": "clicked"})
+
+    def test_cancel(self):
+        statuses = list()
+        results = list()
+        finished = threading.Event()
+
+        def on_status(status, done, total):
+            statuses.append(status)
+            if status == DONE:
+                finished.set()
+
+        self.scheduler.submit("stale", lambda: "stale", results.append, group="row0", on_status=on_status)
+        # Inputs of the row changed before the stale job started
+        self.scheduler.submit("fresh", lambda: "fresh", results.append, group="row0", on_status=on_status)
+        self.scheduler.submit("deleted", lambda: "deleted", results.append, group="row1")
+        self.scheduler.cancel("row1")
+        self.release.set()
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(results, ["fresh"])
+        self.assertEqual(statuses, [QUEUED, CANCELLED, QUEUED, RUNNING, DONE])
@@ -1,12 +1,18 @@
 import unittest
 
 from exceptions import NoLiveFoundException
+import initializer
 from logic.card import Card
+from logic.grandlive import GrandLive
 from logic.live import Live
 from logic.unit import Unit
 from static.song_difficulty import Difficulty
 
 
+def setUpModule():
+    initializer.load_cache_tables()
+
+
 class TestLive(unittest.TestCase):
     def test_master(self):
         c1 = Card.from_query("karen4", custom_pots=(0, 6, 10, 0, 10))
@@ -42,3 +48,11 @@ class TestLive(unittest.TestCase):
         live = Live()
         self.assertRaises(NoLiveFoundException, lambda: live.set_music(music_name="印象", difficulty=Difficulty.TRICK))
         self.assertRaises(NoLiveFoundException, lambda: live.set_music(music_name="not found", difficulty=Difficulty.REGULAR))
+
+    def test_grand_shared_chart(self):
+        live = GrandLive()
+        live.set_music(music_name="Starry-Go-Round", difficulty=Difficulty.PIANO)
+        for unit_live in live.unit_lives:
+            self.assertIs(unit_live.notes, live.notes)
+            self.assertEqual(unit_live.color, live.color)
+            self.assertEqual(unit_live.difficulty, Difficulty.PIANO)
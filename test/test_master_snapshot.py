@@ -0,0 +1,17 @@
+import unittest
+
+from db import db
+from db.master_snapshot import get_master_snapshot
+
+
+class TestMasterSnapshot(unittest.TestCase):
+    def test_potential_value(self):
+        snapshot = get_master_snapshot()
+        expected = db.masterdb.execute_and_fetchone(
+            "SELECT value_rare_7 FROM potential_value_vo WHERE potential_level = 10")[0]
+        self.assertEqual(snapshot.get_potential_value("vo", 7, 10), expected)
+        self.assertEqual(snapshot.get_potential_value("vo", 8, 10), expected)
+        self.assertEqual(snapshot.get_potential_value("vo", 8, 0), 0)
+
+    def test_reuse(self):
+        self.assertIs(get_master_snapshot(), get_master_snapshot())
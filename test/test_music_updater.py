@@ -0,0 +1,88 @@
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+import lz4.block
+
+from db.db import CustomDB
+from network.music_updater import download_musicscores
+from utils.misc import decompress_file
+
+
+def _compress(data: bytes) -> bytes:
+    return b"\x64\x00\x00\x00" + len(data).to_bytes(4, "little") + bytes(8) + lz4.block.compress(data,
+                                                                                                 store_size=False)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    blobs = dict()
+
+    def do_GET(self):
+        resource_hash = self.path.split("/")[-1]
+        if resource_hash not in self.blobs:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.blobs[resource_hash])))
+        self.end_headers()
+        self.wfile.write(self.blobs[resource_hash])
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloadMusicscores(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.asset_url = "http://127.0.0.1:{}/dl".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_download_resume(self):
+        musicscores = dict()
+        for score_id in range(1, 5):
+            blob = _compress("score {}".format(score_id).encode() * 100)
+            blob_hash = hashlib.md5(blob).hexdigest()
+            _StubHandler.blobs[blob_hash] = blob
+            musicscores["musicscores_m{:03d}".format(score_id)] = blob_hash
+        # Served content does not match its hash
+        musicscores["musicscores_m005"] = "0" * 32
+        _StubHandler.blobs["0" * 32] = _compress(b"corrupted")
+        # Not on the server
+        musicscores["musicscores_m006"] = "1" * 32
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            with CustomDB(temp_dir / "cache.db") as conn:
+                failed = download_musicscores(musicscores, temp_dir, conn, self.asset_url, max_workers=3)
+                self.assertEqual(sorted(failed), ["musicscores_m005", "musicscores_m006"])
+                self.assertEqual(dict(conn.execute_and_fetchall("SELECT score_id, score_hash FROM score_cache")),
+                                 {k: v for k, v in musicscores.items() if k not in failed})
+                self.assertEqual((temp_dir / "musicscores_m002.db").read_bytes(), b"score 2" * 100)
+                self.assertFalse((temp_dir / "musicscores_m005.db").exists())
+                self.assertEqual(list(temp_dir.glob("*.part")), list())
+
+                blob = _compress(b"late")
+                musicscores["musicscores_m006"] = hashlib.md5(blob).hexdigest()
+                _StubHandler.blobs[musicscores["musicscores_m006"]] = blob
+                failed = download_musicscores({"musicscores_m006": musicscores["musicscores_m006"]},
+                                              temp_dir, conn, self.asset_url)
+                self.assertEqual(failed, list())
+                self.assertEqual((temp_dir / "musicscores_m006.db").read_bytes(), b"late")
+
+
+class TestDecompressFile(unittest.TestCase):
+    def test_replace(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            (temp_dir / "master.db").write_bytes(b"old")
+            (temp_dir / "master.mdb").write_bytes(_compress(b"new" * 1000))
+            decompress_file(temp_dir / "master.mdb", temp_dir / "master.db")
+            self.assertEqual((temp_dir / "master.db").read_bytes(), b"new" * 1000)
+            self.assertEqual(sorted(_.name for _ in temp_dir.iterdir()), ["master.db", "master.mdb"])
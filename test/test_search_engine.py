@@ -1,5 +1,9 @@
 import unittest
 
+import initializer
+
+# The search engine builds its indices on import, from tables load_cache_tables creates
+initializer.load_cache_tables()
 from logic.search import card_query
 from logic.search.search_engine import engine, song_engine
 
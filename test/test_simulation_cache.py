@@ -0,0 +1,28 @@
+import unittest
+
+import numpy as np
+
+from db.simulation_cache import SimulationSummary, get_simulation_key
+from static.song_difficulty import Difficulty
+
+
+class TestSimulationCache(unittest.TestCase):
+    def test_key(self):
+        parts = {"chart": [1, Difficulty.MASTER, False], "extra_bonus": np.zeros((5, 3)), "times": 100}
+        reordered = {"times": 100, "extra_bonus": np.zeros((5, 3)), "chart": [1, Difficulty.MASTER, False]}
+        self.assertEqual(get_simulation_key(parts), get_simulation_key(reordered))
+        parts["times"] = 1000
+        self.assertNotEqual(get_simulation_key(parts), get_simulation_key(reordered))
+
+    def test_summary_round_trip(self):
+        deltas = np.array([3, -2, 3, 0, -2, 3])
+        summary = SimulationSummary.from_deltas(
+            1000, deltas, perfect_score_array=np.array([10, 20]), abuse_score=1050,
+            abuse_score_delta=np.array([0, 50]), abuse_window_l=[0, -60000], abuse_window_r=[0, 40000],
+            abuse_judgements=[0, 1])
+        loaded = SimulationSummary.from_bytes(summary.to_bytes())
+        self.assertEqual(loaded.base, 1000)
+        self.assertEqual(loaded.deltas.tolist(), sorted(deltas.tolist()))
+        self.assertEqual(loaded.perfect_score_array.tolist(), [10, 20])
+        self.assertEqual(loaded.abuse_window_l.tolist(), [0, -60000])
+        self.assertEqual(loaded.abuse_judgements.tolist(), [0, 1])
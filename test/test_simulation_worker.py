@@ -0,0 +1,75 @@
+import multiprocessing
+import pickle
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from db import db
+import initializer
+from logic.card import Card
+from logic.live import Live
+from logic.unit import Unit
+from simulation_worker import SimulationJob, SimulationWorkerPool, card_from_spec, get_card_spec, \
+    run_simulation_job
+from simulator import Simulator, get_default_workers
+from static.color import Color
+from static.song_difficulty import Difficulty
+
+
+def setUpModule():
+    initializer.load_cache_tables()
+
+
+def _get_score_id(music_name: str, difficulty: Difficulty) -> int:
+    return db.masterdb.execute_and_fetchone(
+        """
+        SELECT live_data.id FROM live_data, live_detail, music_data
+        WHERE music_data.name = ? AND live_data.music_data_id = music_data.id
+        AND live_detail.live_data_id = live_data.id AND live_detail.difficulty_type = ?
+        """, [music_name, difficulty.value])[0]
+
+
+class TestSimulationWorker(unittest.TestCase):
+    def test_card_spec(self):
+        card = Card.from_query("sae4", custom_pots=(2, 10, 0, 0, 10))
+        card.base_vo += 100
+        card.sk.skill_level = 8
+        card.subcolor = Color.PASSION if card.subcolor != Color.PASSION else Color.CUTE
+        card.refresh_values()
+        rebuilt = card_from_spec(pickle.loads(pickle.dumps(get_card_spec(card))))
+        self.assertEqual(get_card_spec(rebuilt), get_card_spec(card))
+        self.assertEqual(rebuilt.subcolor, card.subcolor)
+        card.subcolor = None
+        self.assertIsNone(card_from_spec(get_card_spec(card)).subcolor)
+        self.assertEqual((rebuilt.vo, rebuilt.da, rebuilt.vi, rebuilt.li), (card.vo, card.da, card.vi, card.li))
+        self.assertEqual(rebuilt.sk.probability, card.sk.probability)
+
+    def test_job(self):
+        unit = Unit.from_query("sae4 chieri4 yoshino3 rika4 mio4 kaede2", custom_pots=(8, 10, 0, 0, 10))
+        live = Live()
+        live.set_music(score_id=_get_score_id("Starry-Go-Round", Difficulty.MPLUS), difficulty=Difficulty.MPLUS)
+        job = SimulationJob(cards=[get_card_spec(card) for card in unit.all_cards(guest=True)],
+                            score_id=live.score_id, difficulty=live.difficulty.value, color=live.color.value,
+                            appeals=None, support=None, extra_bonus=None, special_option=None, special_value=None,
+                            times=1, autoplay=False, autoplay_offset=0, doublelife=False, mirror=False,
+                            perfect_play=True, allow_great=False, left_inclusive=False, right_inclusive=True,
+                            force_encore_amr_cache_to_encore_unit=False, force_encore_magic_to_encore_unit=False,
+                            allow_encore_magic_to_escape_max_agg=True, abuse_load=False)
+        live.set_unit(unit)
+        expected = Simulator(live).simulate(perfect_play=True).perfect_score
+
+        self.assertEqual(run_simulation_job(job).perfect_score, expected)
+        pool = SimulationWorkerPool(1)
+        try:
+            result = pool.run(job)
+        finally:
+            pool.shutdown()
+        self.assertEqual(result.perfect_score, expected)
+        self.assertIsNone(result.abuse_data)
+
+    def test_spawned_imports(self):
+        # Workers started with spawn, the default on Windows, import everything again and must leave chihiro.db alone
+        data_version = db.cachedb.execute_and_fetchone("PRAGMA data_version")[0]
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            self.assertIsNone(pool.submit(get_card_spec, None).result())
+            self.assertEqual(pool.submit(get_default_workers).result(), get_default_workers())
+        self.assertEqual(db.cachedb.execute_and_fetchone("PRAGMA data_version")[0], data_version)
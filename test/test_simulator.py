@@ -1,8 +1,13 @@
+import multiprocessing
 import os
 import unittest
+from concurrent.futures import ProcessPoolExecutor
 
 import pyximport
 
+from db import db
+from exceptions import QueryInSimulation
+import initializer
 from logic.card import Card
 from logic.grandlive import GrandLive
 from logic.grandunit import GrandUnit
@@ -13,12 +18,16 @@ pyximport.install(language_level=3)
 os.environ["DEBUG_MODE"] = "1"
 import customlogger as logger
 from logic.unit import Unit
-from simulator import Simulator
+from simulator import Simulator, simulate_trials
 from static.song_difficulty import Difficulty
 
 logger.print_debug()
 
 
+def setUpModule():
+    initializer.load_cache_tables()
+
+
 class TestPerfect(unittest.TestCase):
     def test_reso_7(self):
         sae4 = Card.from_query("sae4", custom_pots=(2, 10, 0, 0, 10))
@@ -235,3 +244,98 @@ class TestAbuse(unittest.TestCase):
         sim = Simulator(live)
         res = sim.simulate(appeals=243551, perfect_play=True, abuse=True)
         self.assertEqual(res.abuse_score - res.perfect_score, 47441)
+
+
+class TestBatch(unittest.TestCase):
+    def test_focus(self):
+        unit = Unit.from_list([200896, 200968, 200314, 200734, 200460, 200844], custom_pots=(5, 10, 10, 0, 10))
+        live = Live()
+        live.set_music(score_id=303, difficulty=Difficulty.MPLUS)
+        live.set_unit(unit)
+        batch_res = Simulator(live).simulate(times=2000, support=113290, seed=1234)
+        loop_res = Simulator(live).simulate(times=2000, support=113290, seed=1234, batch=False)
+        self.assertEqual(batch_res.perfect_score, loop_res.perfect_score)
+        self.assertEqual((batch_res.base + batch_res.deltas).tolist(), (loop_res.base + loop_res.deltas).tolist())
+
+    def test_act(self):
+        # Act bonuses depend on the type of the note hit, which jitter reorders on close notes
+        act_card = db.masterdb.execute_and_fetchone("""
+            SELECT card_data.id FROM card_data INNER JOIN skill_data ON card_data.skill_id = skill_data.id
+            WHERE skill_data.skill_type = 29 AND card_data.rarity = 8 ORDER BY card_data.id
+        """)[0]
+        unit = Unit.from_list([act_card, 200968, 200314, 200734, 200460, 200844], custom_pots=(5, 10, 10, 0, 10))
+        live = Live()
+        live.set_music(score_id=303, difficulty=Difficulty.MPLUS)
+        live.set_unit(unit)
+        batch_res = Simulator(live).simulate(times=500, support=113290, seed=1234)
+        loop_res = Simulator(live).simulate(times=500, support=113290, seed=1234, batch=False)
+        self.assertEqual((batch_res.base + batch_res.deltas).tolist(), (loop_res.base + loop_res.deltas).tolist())
+
+
+class TestSeed(unittest.TestCase):
+    def test_replay(self):
+        unit = Unit.from_list([200896, 200968, 200314, 200734, 200460, 200844], custom_pots=(5, 10, 10, 0, 10))
+        live = Live()
+        live.set_music(score_id=303, difficulty=Difficulty.MPLUS)
+        live.set_unit(unit)
+        res = Simulator(live).simulate(times=50, support=113290, seed=1234, batch=False)
+        again = Simulator(live).simulate(times=50, support=113290, seed=1234, batch=False, workers=1)
+        self.assertTrue((res.deltas == again.deltas).all())
+        trial = int(res.deltas.argmax())
+        score, _, detail = Simulator(live).replay_trial(1234, trial, support=113290)
+        self.assertEqual(score, res.base + res.deltas[trial])
+        self.assertEqual(len(detail.note_details), len(live.notes))
+
+    def test_spawned_workers(self):
+        # Trial workers started with spawn, the default on Windows, import the simulator again
+        unit = Unit.from_list([200896, 200968, 200314, 200734, 200460, 200844], custom_pots=(5, 10, 10, 0, 10))
+        live = Live()
+        live.set_music(score_id=303, difficulty=Difficulty.MPLUS)
+        live.set_unit(unit)
+        sim = Simulator(live)
+        sim._setup_simulator(support=113290)
+        state_machine_kwargs = sim.get_state_machine_kwargs(grand=False)
+        data_version = db.cachedb.execute_and_fetchone("PRAGMA data_version")[0]
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            scores = pool.submit(simulate_trials, state_machine_kwargs, 100, 1234).result()
+        self.assertEqual(db.cachedb.execute_and_fetchone("PRAGMA data_version")[0], data_version)
+        self.assertEqual(scores, simulate_trials(state_machine_kwargs, 100, 1234))
+
+    def test_replay_batch(self):
+        act_card = db.masterdb.execute_and_fetchone("""
+            SELECT card_data.id FROM card_data INNER JOIN skill_data ON card_data.skill_id = skill_data.id
+            WHERE skill_data.skill_type = 29 AND card_data.rarity = 8 ORDER BY card_data.id
+        """)[0]
+        unit = Unit.from_list([act_card, 200968, 200314, 200734, 200460, 200844], custom_pots=(5, 10, 10, 0, 10))
+        live = Live()
+        live.set_music(score_id=303, difficulty=Difficulty.MPLUS)
+        live.set_unit(unit)
+        res = Simulator(live).simulate(times=500, support=113290, seed=1234)
+        for trial in (int(res.deltas.argmax()), int(res.deltas.argmin())):
+            score, _, _ = Simulator(live).replay_trial(1234, trial, support=113290)
+            self.assertEqual(score, res.base + res.deltas[trial])
+
+    def test_workers(self):
+        unit = Unit.from_list([200896, 200968, 200314, 200734, 200460, 200844], custom_pots=(5, 10, 10, 0, 10))
+        live = Live()
+        live.set_music(score_id=303, difficulty=Difficulty.MPLUS)
+        live.set_unit(unit)
+        for batch in (True, False):
+            serial = Simulator(live).simulate(times=1000, support=113290, seed=1234, batch=batch, workers=1)
+            parallel = Simulator(live).simulate(times=1000, support=113290, seed=1234, batch=batch, workers=2)
+            self.assertTrue((serial.deltas == parallel.deltas).all())
+
+
+class TestQueryGuard(unittest.TestCase):
+    def test_perfect_without_queries(self):
+        unit = Unit.from_query("nao4 yukimi2 haru2 mizuki4 rin2 ranko3", custom_pots=(0, 0, 0, 0, 10))
+        live = Live()
+        live.set_music(music_name="in fact", difficulty=Difficulty.MPLUS)
+        live.set_unit(unit)
+        sim = Simulator(live)
+        sim._setup_simulator(appeals=302495)
+        impl = sim.create_state_machine(grand=False)
+        impl.reset_machine(perfect_play=True)
+        with db.forbid_queries():
+            self.assertEqual(impl._simulate_impl()[0], 1366223)
+            self.assertRaises(QueryInSimulation, db.masterdb.execute_and_fetchone, "SELECT 1")
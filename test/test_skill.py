@@ -1,9 +1,14 @@
 import unittest
 
+import initializer
 from logic.skill import Skill
 from logic.unit import Unit
 
 
+def setUpModule():
+    initializer.load_cache_tables()
+
+
 class TestSkill(unittest.TestCase):
     def test_score_bonus(self):
         su_4s_hi = Skill.from_id(300327)
@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+
+from utils.task_graph import Task, TaskGraph
+
+
+class TestTaskGraph(unittest.TestCase):
+    def test_order(self):
+        order = list()
+        lock = threading.Lock()
+
+        def record(name):
+            def function():
+                time.sleep(0.01)
+                with lock:
+                    order.append(name)
+
+            return function
+
+        graph = TaskGraph([
+            Task("d", record("d"), ["b", "c"]),
+            Task("a", record("a")),
+            Task("b", record("b"), ["a"]),
+            Task("c", record("c"), ["a"]),
+            Task("e", record("e"), ["d"], deferred=True),
+        ])
+        graph.run()
+        self.assertEqual(order[0], "a")
+        self.assertEqual(sorted(order[1:3]), ["b", "c"])
+        self.assertEqual(order[3], "d")
+        self.assertNotIn("e", order)
+        graph.run_deferred()
+        self.assertEqual(order[-1], "e")
+        self.assertEqual(sorted(graph.timings), ["a", "b", "c", "d", "e"])
+
+    def test_main_thread(self):
+        threads = dict()
+
+        def record(name):
+            def function():
+                threads[name] = threading.current_thread()
+
+            return function
+
+        graph = TaskGraph([
+            Task("a", record("a")),
+            Task("b", record("b"), ["a"], main_thread=True),
+            Task("c", record("c"), ["b"]),
+        ])
+        graph.run()
+        self.assertIs(threads["b"], threading.current_thread())
+        self.assertIsNot(threads["a"], threading.current_thread())
+        self.assertIsNot(threads["c"], threading.current_thread())
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, TaskGraph, [Task("a", lambda: None, ["b"]), Task("b", lambda: None, ["a"])])
+        self.assertRaises(ValueError, TaskGraph, [Task("a", lambda: None, ["b"]),
+                                                  Task("b", lambda: None, deferred=True)])
+        self.assertRaises(ValueError, TaskGraph, [Task("a", lambda: None, deferred=True, main_thread=True)])
+
+    def test_failure(self):
+        def fail():
+            raise RuntimeError
+
+        ran = list()
+        graph = TaskGraph([Task("a", fail), Task("b", lambda: ran.append("b"), ["a"])])
+        self.assertRaises(RuntimeError, graph.run)
+        self.assertEqual(ran, list())
@@ -2,10 +2,15 @@ import unittest
 
 import numpy as np
 
+import initializer
 from logic.unit import Unit
 from static.color import Color
 
 
+def setUpModule():
+    initializer.load_cache_tables()
+
+
 class TestSkill(unittest.TestCase):
 
     def test_duo_ens(self):